@@ -0,0 +1,381 @@
+from _functools import reduce
+import asyncio
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from nltk import pos_tag
+from nltk.stem import WordNetLemmatizer
+from nltk.stem.porter import PorterStemmer
+from nltk.tokenize import word_tokenize
+import pandas as pd
+import pysolr
+
+from pkg.CompressedIndex import CompressedIndex
+from pkg.FeatureStore import FeatureStore
+from pkg.HeadWordParser import HeadWordParser
+from pkg.IndexCreation import IndexCreation
+from pkg.InvertedIndex import InvertedIndex
+from pkg.NLPResources import NLPResources
+from pkg.SemanticSearchEngine import SemanticSearchEngine
+from pkg.VectorIndex import VectorIndex
+
+
+class Benchmark:
+
+    def measure(self, name, function, *args, **kwargs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(name.ljust(40), "%.2f s" % elapsed, "  peak %.1f MiB" % (peak / 2 ** 20))
+        return result, elapsed, peak
+
+    def extractImprovisedFeaturesWithMerge(self, ic, indexWordsMap, indexSentenceMap):
+        indexPOSWithWordsMap = ic.tagPOSWithWords(indexWordsMap)
+        featureMaps = [(indexWordsMap, 'words'),
+                       (ic.improvedLemmatizeWords(indexPOSWithWordsMap), 'lemmas'),
+                       (ic.stemWords(indexWordsMap), 'stems'),
+                       (indexPOSWithWordsMap, 'POSWithWords'),
+                       (ic.findImprovisedHeadWord(indexSentenceMap), 'head'),
+                       (ic.extractImprovisedHypernyms(indexPOSWithWordsMap), 'hypernyms'),
+                       (ic.extractImprovisedHyponyms(indexPOSWithWordsMap), 'hyponyms'),
+                       (ic.extractImprovisedMeronyms(indexPOSWithWordsMap), 'meronyms'),
+                       (ic.extractImprovisedHolonyms(indexPOSWithWordsMap), 'holonyms')]
+        dfList = [pd.DataFrame(list(featureMap.items()), columns=['id', column]) for featureMap, column in featureMaps]
+        return reduce(lambda left, right: pd.merge(left, right, on='id'), dfList)
+
+    def extractImprovisedFeaturesInSinglePass(self, ic, indexWordsMap, indexSentenceMap):
+        records = ic.extractImprovisedFeatureRecords(indexWordsMap, indexSentenceMap)
+        return pd.DataFrame.from_records(records, columns=ic.taskFourColumns)
+
+    def loadCorpus(self, path):
+        ic = IndexCreation()
+        data = ic.removeArticleTitle(ic.readArticles(path))
+        indexWordsMap, indexSentenceMap = ic.createIndexMap(data, ic.listArticleIds(path))
+        print("Sentences:", str(len(indexWordsMap)))
+        return ic, indexWordsMap, indexSentenceMap
+
+    def compareFeatureExtraction(self, path):
+        ic, indexWordsMap, indexSentenceMap = self.loadCorpus(path)
+        mergedDFrame, _, _ = self.measure("Per-feature sweeps + merge", self.extractImprovisedFeaturesWithMerge, ic, indexWordsMap, indexSentenceMap)
+        fusedDFrame, _, _ = self.measure("Single-pass records", self.extractImprovisedFeaturesInSinglePass, ic, indexWordsMap, indexSentenceMap)
+        print("Identical output:", mergedDFrame.to_json(orient='records') == fusedDFrame.to_json(orient='records'))
+
+    def tagWordsIndividually(self, indexWordsMap):
+        # The improvised relation extractors used to tag every word on its own,
+        # once per relation
+        for v in indexWordsMap.values():
+            for _ in range(4):
+                for word in v:
+                    pos_tag([word])
+
+    def tagSentencesInBatches(self, ic, indexWordsMap, batchSize):
+        return list(ic.tagPOSSentences(indexWordsMap, batchSize))
+
+    def comparePOSTagging(self, path, batchSize=1000):
+        ic, indexWordsMap, _ = self.loadCorpus(path)
+        _, perWordTime, _ = self.measure("Per-word tagging, four relation passes", self.tagWordsIndividually, indexWordsMap)
+        _, batchedTime, _ = self.measure("Batched sentence tagging", self.tagSentencesInBatches, ic, indexWordsMap, batchSize)
+        print("Sentences per second: %.1f -> %.1f" % (len(indexWordsMap) / perWordTime, len(indexWordsMap) / batchedTime))
+
+    def measureHeadWordLatency(self, parser, sentences):
+        headWords = []
+        latencies = []
+        for sentence in sentences:
+            start = time.perf_counter()
+            headWords.append(parser.findHeadWord(sentence))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return headWords, latencies
+
+    def compareHeadWordParsers(self, path, sampleSize=1000):
+        _, _, indexSentenceMap = self.loadCorpus(path)
+        sentences = list(indexSentenceMap.values())[:sampleSize]
+        results = {}
+        for backend in ['corenlp', 'heuristic']:
+            headWords, latencies = self.measureHeadWordLatency(HeadWordParser.create(backend), sentences)
+            results[backend] = headWords
+            print(backend.ljust(10), "mean %.2f ms" % (1000 * sum(latencies) / len(latencies)),
+                  "  p50 %.2f ms" % (1000 * latencies[len(latencies) // 2]),
+                  "  p99 %.2f ms" % (1000 * latencies[int(len(latencies) * 0.99)]))
+        agreements = sum(1 for a, b in zip(results['corenlp'], results['heuristic']) if a is not None and b is not None and a.lower() == b.lower())
+        print("Head word agreement with CoreNLP: %.1f%% of %d sentences" % (100.0 * agreements / len(sentences), len(sentences)))
+
+    def compareStreamingMemory(self, path, inputChoice="1"):
+        ic = IndexCreation()
+        self.measure("In-memory preprocessCorpus", ic.preprocessCorpus, path)
+        self.measure("Streaming Task" + str(int(inputChoice) + 1) + " records", ic.streamFeatures, path, inputChoice)
+
+    def loadJsonIndex(self, sse, path, jsonFileName):
+        return sse.getArticleAndWordCount(path), InvertedIndex.fromJson(jsonFileName)
+
+    def compareIndexColdStart(self, path, jsonFileName='Task4.json'):
+        sse = SemanticSearchEngine()
+        indexFileName = os.path.splitext(jsonFileName)[0] + '.idx'
+        if not os.path.exists(indexFileName):
+            indexSentenceMap = sse.getArticleAndWordCount(path)
+            sse.indexCreation.writeCompressedIndex(jsonFileName, indexSentenceMap)
+        print("Index size: %.1f MiB JSON -> %.1f MiB compressed" % (os.path.getsize(jsonFileName) / 2 ** 20, os.path.getsize(indexFileName) / 2 ** 20))
+        (_, jsonIndex), _, _ = self.measure("JSON + getArticleAndWordCount", self.loadJsonIndex, sse, path, jsonFileName)
+        compressedIndex, _, _ = self.measure("Memory-mapped compressed index", CompressedIndex, indexFileName)
+        print("Documents:", str(jsonIndex.getDocumentCount()), "->", str(compressedIndex.getDocumentCount()))
+        compressedIndex.close()
+
+    def processQueriesConstructingPerCall(self, queries):
+        # What every query used to pay: a lemmatizer per lemmatization call,
+        # a stemmer and a fresh Solr client with its own session
+        for query in queries:
+            words = list(set(word_tokenize(query)))
+            [WordNetLemmatizer().lemmatize(word) for word in words]
+            [WordNetLemmatizer().lemmatize(word) for word in words]
+            [PorterStemmer().stem(word) for word in words]
+            pysolr.Solr('http://localhost:8983/solr/task4')
+
+    def processQueriesWithSharedResources(self, queries, resources):
+        for query in queries:
+            words = list(set(word_tokenize(query)))
+            [resources.lemmatizer.lemmatize(word) for word in words]
+            [resources.lemmatizer.lemmatize(word) for word in words]
+            [resources.stemmer.stem(word) for word in words]
+            resources.getSolrClient('task4')
+
+    def compareResourceReuse(self, path, sampleSize=1000):
+        _, _, indexSentenceMap = self.loadCorpus(path)
+        queries = list(indexSentenceMap.values())[:sampleSize]
+        resources = NLPResources()
+        # Warm both paths so WordNet loading is not charged to either one
+        self.processQueriesWithSharedResources(queries[:1], resources)
+        _, perCallTime, _ = self.measure("Objects constructed per call", self.processQueriesConstructingPerCall, queries)
+        _, sharedTime, _ = self.measure("Shared NLPResources", self.processQueriesWithSharedResources, queries, resources)
+        print("Per query: %.1f us -> %.1f us" % (1e6 * perCallTime / len(queries), 1e6 * sharedTime / len(queries)))
+
+    def extractQueryFeatures(self, sse, queries, concurrently):
+        features = []
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            features.append(sse.improvisationTaskConcurrently(query, sse.headWordTimeout) if concurrently else sse.improvisationTask(query))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return features, latencies
+
+    def compareConcurrentFeatures(self, path, sampleSize=200, headWordTimeout=None):
+        _, _, indexSentenceMap = self.loadCorpus(path)
+        queries = list(indexSentenceMap.values())[:sampleSize]
+        sse = SemanticSearchEngine(headWordTimeout=headWordTimeout)
+        sse.improvisationTask(queries[0])
+        results = {}
+        for name, concurrently in [("Sequential improvisationTask", False), ("Head word in the background", True)]:
+            features, latencies = self.extractQueryFeatures(sse, queries, concurrently)
+            results[concurrently] = features
+            print(name.ljust(30), "mean %.1f ms" % (1000 * sum(latencies) / len(latencies)),
+                  "  p50 %.1f ms" % (1000 * latencies[len(latencies) // 2]),
+                  "  p99 %.1f ms" % (1000 * latencies[int(len(latencies) * 0.99)]))
+        droppedHeads = sum(1 for a, b in zip(results[False], results[True]) if a[4] is not None and b[4] is None)
+        print("Identical features:", str(sum(1 for a, b in zip(results[False], results[True]) if a == b)), "of", str(len(queries)),
+              "  head words dropped by the timeout:", str(droppedHeads))
+
+    async def sendQueries(self, host, port, requests, latencies):
+        reader, writer = await asyncio.open_connection(host, port)
+        errors = 0
+        for request in requests:
+            start = time.perf_counter()
+            writer.write((json.dumps(request) + '\n').encode('utf-8'))
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            errors += 'error' in response
+        writer.close()
+        return errors
+
+    async def runLoadTest(self, host, port, requests, concurrency):
+        latencies = []
+        connections = [requests[i::concurrency] for i in range(concurrency)]
+        start = time.perf_counter()
+        errors = await asyncio.gather(*[self.sendQueries(host, port, connectionRequests, latencies) for connectionRequests in connections])
+        return latencies, time.perf_counter() - start, sum(errors)
+
+    def loadTestQueryServer(self, queries, inputChoice="3", concurrency=8, host='localhost', port=8990):
+        requests = [{'task': inputChoice, 'query': query} for query in queries]
+        latencies, elapsed, errors = asyncio.run(self.runLoadTest(host, port, requests, concurrency))
+        latencies.sort()
+        print("Queries:", str(len(latencies)), "  concurrency:", str(concurrency), "  errors:", str(errors))
+        print("p50 %.1f ms" % (1000 * latencies[len(latencies) // 2]),
+              "  p99 %.1f ms" % (1000 * latencies[int(len(latencies) * 0.99)]),
+              "  %.1f QPS" % (len(latencies) / elapsed))
+        return latencies, elapsed
+
+    def scaleVectors(self, vectors, multiple, noise=0.05, seed=0):
+        # Stands in for a corpus multiple times the size: every copy after the
+        # first is the original vectors plus a little noise, renormalized
+        random = np.random.RandomState(seed)
+        copies = [np.asarray(vectors)]
+        for _ in range(multiple - 1):
+            copy = copies[0] + random.normal(0, noise, copies[0].shape).astype(np.float32)
+            copies.append(copy / np.maximum(np.linalg.norm(copy, axis=1), 1e-12)[:, None])
+        return np.concatenate(copies)
+
+    def searchVectors(self, vectorIndex, queryVectors, rows, **kwargs):
+        start = time.perf_counter()
+        results = [set(docId for docId, _ in vectorIndex.searchVector(vector, rows, **kwargs)) for vector in queryVectors]
+        return results, len(queryVectors) / (time.perf_counter() - start)
+
+    def compareVectorSearch(self, path, multiples=(1, 2, 4, 8), probesList=(4, 16, 32, 64), sampleSize=200, rows=10):
+        _, _, indexSentenceMap = self.loadCorpus(path)
+        vectorIndex = VectorIndex()
+        if vectorIndex.exists():
+            vectorIndex.load()
+        else:
+            vectorIndex.build(indexSentenceMap.items())
+        # Queries are sampled sentences with every other word dropped
+        sentences = list(indexSentenceMap.values())
+        queries = [' '.join(sentence.split()[::2]) for sentence in sentences[::max(len(sentences) // sampleSize, 1)][:sampleSize]]
+        queryVectors = [vector for vector in (vectorIndex.embed(query) for query in queries) if vector is not None]
+        print("Vectors".rjust(10), "probes".rjust(8), "recall@" + str(rows), "QPS".rjust(10))
+        for multiple in multiples:
+            scaledIndex = VectorIndex()
+            scaledIndex.vectors = self.scaleVectors(vectorIndex.vectors, multiple)
+            scaledIndex.docIds = list(range(len(scaledIndex.vectors)))
+            exactResults, exactQPS = self.searchVectors(scaledIndex, queryVectors, rows, exact=True)
+            print(str(len(scaledIndex.docIds)).rjust(10), "exact".rjust(8), "%9.3f" % 1.0, "%10.1f" % exactQPS)
+            self.measure("IVF build", scaledIndex.buildIVF)
+            for probes in probesList:
+                results, qps = self.searchVectors(scaledIndex, queryVectors, rows, probes=probes)
+                recall = sum(len(result & exact) for result, exact in zip(results, exactResults)) / float(rows * len(results))
+                print(str(len(scaledIndex.docIds)).rjust(10), str(probes).rjust(8), "%9.3f" % recall, "%10.1f" % qps)
+
+    def getRSS(self):
+        gc.collect()
+        with open('/proc/self/statm', 'r') as statmFile:
+            return int(statmFile.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def createIndexMapWithLists(self, data, articleIds):
+        # createIndexMap before interning: a list of str objects per sentence
+        indexWordsMap = collections.OrderedDict()
+        indexSentenceMap = collections.OrderedDict()
+        for i in range(0, len(data)):
+            for j in range(0, len(data[i])):
+                index = 'A' + str(articleIds[i]) + 'S' + str(j + 1)
+                indexSentenceMap[index] = data[i][j]
+                indexWordsMap[index] = list(set(word_tokenize(data[i][j])))
+        return indexWordsMap, indexSentenceMap
+
+    def measureTokenMemory(self, path, interned):
+        # Runs in a fresh process so the two layouts do not share an arena
+        ic = IndexCreation(headWordParser=HeadWordParser.create('heuristic'))
+        data = ic.removeArticleTitle(ic.readArticles(path))
+        articleIds = ic.listArticleIds(path)
+        start = self.getRSS()
+        if interned:
+            indexWordsMap, indexSentenceMap = ic.createIndexMap(data, articleIds)
+        else:
+            indexWordsMap, indexSentenceMap = self.createIndexMapWithLists(data, articleIds)
+        mapsRSS = self.getRSS()
+        if interned:
+            records = ic.extractImprovisedFeatureRecords(indexWordsMap, indexSentenceMap)
+        else:
+            records = list(ic.iterImprovisedFeatureRecords(indexWordsMap, indexSentenceMap))
+        recordsRSS = self.getRSS()
+        return len(records), mapsRSS - start, recordsRSS - mapsRSS
+
+    def compareTokenMemory(self, path):
+        results = {}
+        for name, interned in [("Lists of str", False), ("Interned token arrays", True)]:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                results[name] = executor.submit(self.measureTokenMemory, path, interned).result()
+        print("Layout".ljust(24), "sentences".rjust(10), "indexWordsMap MiB".rjust(18), "Task4 records MiB".rjust(18))
+        for name, (sentences, mapsBytes, recordsBytes) in results.items():
+            print(name.ljust(24), str(sentences).rjust(10), ("%.1f" % (mapsBytes / 2 ** 20)).rjust(18), ("%.1f" % (recordsBytes / 2 ** 20)).rjust(18))
+
+    def timeCall(self, name, function, *args):
+        # Plain wall time; tracemalloc would slow the Python decoding far more
+        # than the C JSON parser
+        start = time.perf_counter()
+        result = function(*args)
+        print(name.ljust(40), "%.2f s" % (time.perf_counter() - start))
+        return result
+
+    def compareFeatureStorage(self, jsonFileName='Task4.json', column='words'):
+        ic = IndexCreation()
+        jsonRecords = list(InvertedIndex.iterJsonRecords(jsonFileName))
+        columns = list(jsonRecords[0].keys())
+        records = [tuple(record[name] for name in columns) for record in jsonRecords]
+        del jsonRecords
+        print("Records:", str(len(records)))
+        self.timeCall("Write JSON", ic.writeRecordsJson, records, columns, 'BenchmarkFeatures.json')
+        featureStore = self.timeCall("Write feature store", FeatureStore('BenchmarkFeatures.features').write, records, columns)
+        print("Size: %.1f MiB JSON, %.1f MiB feature store" % (os.path.getsize('BenchmarkFeatures.json') / 2 ** 20,
+                                                             (os.path.getsize(featureStore.fileName) + os.path.getsize(featureStore.metadataFileName)) / 2 ** 20))
+        self.timeCall("Read JSON", lambda: list(InvertedIndex.iterJsonRecords('BenchmarkFeatures.json')))
+        self.timeCall("Read feature store", lambda: list(FeatureStore(featureStore.fileName).iterRecords()))
+        self.timeCall("Read JSON, " + column + " only", lambda: [(record['id'], record[column]) for record in InvertedIndex.iterJsonRecords('BenchmarkFeatures.json')])
+        self.timeCall("Read feature store, " + column + " only", lambda: list(FeatureStore(featureStore.fileName).iterRecords([column])))
+        featureStore.close()
+        for fileName in ['BenchmarkFeatures.json', featureStore.fileName, featureStore.metadataFileName]:
+            os.remove(fileName)
+
+    def measureNativeLatency(self, sampleSize=200, queryLengths=(3, 5, 8, 30), rows=10, repeats=3):
+        # Top-10 latency of the in-memory native backend on Task4 queries made
+        # from the stored features of sampled sentences, every field cut to
+        # queryLengths terms. Agreed target, relaxed from sub-millisecond for
+        # every query: p50 of about 1 ms for 3-term queries. The cost grows with
+        # the posting lists scanned, so sentence-length queries take a few ms;
+        # dropping low-idf terms to go faster lost too much of the top 10
+        sse = SemanticSearchEngine(backend='native')
+        index = sse.loadNativeIndex('task4')
+        records = list(sse.indexCreation.iterIndexRecords(sse.nativeIndexFiles['task4']))
+        records = records[::max(1, len(records) // sampleSize)][:sampleSize]
+        print("Documents:", str(index.getDocumentCount()), " queries:", str(len(records)))
+        print("Terms per field".ljust(16), "p50 ms".rjust(8), "p95 ms".rjust(8), "p99 ms".rjust(8))
+        for queryLength in queryLengths:
+            queries = [sse.buildQueryClauses([record[field][:queryLength] if isinstance(record[field], list) else record[field]
+                                              for field in sse.taskFourFields], sse.taskFourFields, sse.taskFourBoosts) for record in records]
+            latencies = []
+            for _ in range(repeats):
+                for clauses in queries:
+                    start = time.perf_counter()
+                    index.search(clauses, rows)
+                    latencies.append(time.perf_counter() - start)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            print(str(queryLength).ljust(16), ("%.3f" % p50).rjust(8), ("%.3f" % p95).rjust(8), ("%.3f" % p99).rjust(8))
+
+
+if __name__ == '__main__':
+    benchmark = Benchmark()
+    path = '/Users/deepaks/Documents/workspace/Semantic_Search_Engine/Data/'
+    inputChoice = input("Enter the benchmark to run\n 1. Feature extraction\n 2. POS tagging\n 3. Head word backends\n 4. Streaming memory\n 5. Index cold start\n 6. Query server load test\n 7. Shared NLP resources\n 8. Concurrent query features\n 9. Vector search recall and QPS\n 10. Interned token memory\n 11. Feature storage\n 12. Native search latency\n ")
+    if inputChoice == "1":
+        benchmark.compareFeatureExtraction(path)
+    elif inputChoice == "2":
+        benchmark.comparePOSTagging(path)
+    elif inputChoice == "3":
+        benchmark.compareHeadWordParsers(path)
+    elif inputChoice == "4":
+        benchmark.compareStreamingMemory(path)
+    elif inputChoice == "5":
+        benchmark.compareIndexColdStart(path)
+    elif inputChoice == "6":
+        # Sample sentences from the corpus as queries against a running
+        # QueryServer
+        _, _, indexSentenceMap = benchmark.loadCorpus(path)
+        benchmark.loadTestQueryServer(list(indexSentenceMap.values())[::100])
+    elif inputChoice == "7":
+        benchmark.compareResourceReuse(path)
+    elif inputChoice == "8":
+        benchmark.compareConcurrentFeatures(path, headWordTimeout=2.0)
+    elif inputChoice == "9":
+        benchmark.compareVectorSearch(path)
+    elif inputChoice == "10":
+        benchmark.compareTokenMemory(path)
+    elif inputChoice == "11":
+        benchmark.compareFeatureStorage()
+    elif inputChoice == "12":
+        benchmark.measureNativeLatency()
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import shutil
+
+from pkg.FeatureStore import FeatureStore
+
+
+class BuildCheckpoint:
+
+    # Per-stage, per-shard results of the feature extraction, so a build that
+    # fails part way (CoreNLP going away during the head words, say) resumes
+    # from the shards it already finished. Every checkpoint is a small
+    # FeatureStore under
+    #   <directory>/<stage key>/<shard key>.features
+    # The shard key hashes the shard's sentence ids and text. The stage key
+    # hashes the stage's version and the keys of the stages it reads, so
+    # bumping one feature's version recomputes only that feature and the
+    # stages built on it
+    def __init__(self, directory='Checkpoints'):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        # (stage key, shard key) of every checkpoint this build has read or
+        # written, which prune keeps
+        self.usedKeys = set()
+
+    def getShardKey(self, ids, sentences):
+        digest = hashlib.sha1()
+        for sentenceId, sentence in zip(ids, sentences):
+            digest.update(sentenceId.encode('utf-8') + b'\x00' + sentence.encode('utf-8') + b'\x00')
+        return digest.hexdigest()
+
+    def getStageKey(self, stage, version):
+        return stage + '-' + hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]
+
+    def getStageName(self, stageKey):
+        return stageKey.rsplit('-', 1)[0]
+
+    def getFeatureStore(self, stageKey, shardKey):
+        return FeatureStore(os.path.join(self.directory, stageKey, shardKey + '.features'))
+
+    def load(self, stageKey, shardKey):
+        featureStore = self.getFeatureStore(stageKey, shardKey)
+        if not featureStore.exists():
+            return None
+        try:
+            return [value for _, value in featureStore.iterRecords()]
+        finally:
+            featureStore.close()
+
+    def save(self, stageKey, shardKey, column, ids, values):
+        # Written under temporary names and moved into place metadata last, so
+        # a checkpoint only exists once it is complete
+        featureStore = self.getFeatureStore(stageKey, shardKey)
+        os.makedirs(os.path.dirname(featureStore.fileName), exist_ok=True)
+        temporaryStore = FeatureStore(featureStore.fileName + '.tmp')
+        temporaryStore.create(['id', column]).append(zip(ids, values))
+        temporaryStore.close()
+        os.replace(temporaryStore.fileName, featureStore.fileName)
+        os.replace(temporaryStore.metadataFileName, featureStore.metadataFileName)
+
+    def run(self, stageKey, shardKey, column, ids, compute):
+        # Returns the stage's values for the shard, computing and saving them
+        # only when there is no checkpoint yet
+        self.usedKeys.add((stageKey, shardKey))
+        values = self.load(stageKey, shardKey)
+        if values is not None:
+            self.hits += 1
+            return values
+        self.misses += 1
+        values = compute()
+        self.save(stageKey, shardKey, column, ids, values)
+        return values
+
+    def takeCounters(self):
+        counters = {'hits': self.hits, 'misses': self.misses, 'usedKeys': self.usedKeys}
+        self.hits = 0
+        self.misses = 0
+        self.usedKeys = set()
+        return counters
+
+    def mergeCounters(self, counters):
+        self.hits += counters['hits']
+        self.misses += counters['misses']
+        self.usedKeys.update(counters['usedKeys'])
+
+    def prune(self):
+        # Called once a build has run every shard. For each stage the build
+        # ran, removes the checkpoints of its other versions, of shards the
+        # corpus no longer has (changed or removed sentences) and of saves
+        # interrupted part way. Stages the build did not run, Task3's when
+        # building Task4 say, are left alone
+        if not os.path.isdir(self.directory):
+            return 0
+        usedStageKeys = set(stageKey for stageKey, _ in self.usedKeys)
+        usedStages = set(self.getStageName(stageKey) for stageKey in usedStageKeys)
+        removed = 0
+        for stageKey in sorted(os.listdir(self.directory)):
+            stageDirectory = os.path.join(self.directory, stageKey)
+            if self.getStageName(stageKey) not in usedStages:
+                continue
+            if stageKey not in usedStageKeys:
+                removed += len(os.listdir(stageDirectory))
+                shutil.rmtree(stageDirectory)
+                continue
+            for fileName in os.listdir(stageDirectory):
+                if '.tmp' in fileName or (stageKey, fileName.split('.', 1)[0]) not in self.usedKeys:
+                    os.remove(os.path.join(stageDirectory, fileName))
+                    removed += 1
+        print("Build checkpoints: removed", str(removed), "stale files")
+        return removed
+
+    def getStats(self):
+        runs = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / runs if runs > 0 else 0.0}
+
+    def printStats(self):
+        stats = self.getStats()
+        print("Build checkpoints: reused", str(stats['hits']), "computed", str(stats['misses']),
+              "hit rate %.2f%%" % (100 * stats['hitRate']))
@@ -0,0 +1,221 @@
+import mmap
+import struct
+
+import numpy as np
+
+from pkg.InvertedIndex import InvertedIndex
+
+
+class CompressedIndex(InvertedIndex):
+
+    # Layout, all integers little-endian:
+    #   header   magic, documents, fields, terms, then the byte offset of every
+    #            section below
+    #   fields   field names joined by \x00
+    #   docs     uint64 offsets (documents + 1) into "id\x00sentence" records,
+    #            followed by uint32 doc numbers sorted by id for getSentence
+    #   lengths  uint32 field lengths, one row of documents per field
+    #   terms    uint64 key offsets (terms + 1), uint64 postings offsets
+    #            (terms + 1), uint32 document frequencies, then the sorted
+    #            "field\x00term" keys
+    #   postings per term the delta-encoded doc numbers followed by the term
+    #            counts, all as variable-byte integers
+    magic = b'CIX1'
+    headerFormat = '<4sIII7Q'
+
+    def __init__(self, fileName, k1=1.2, b=0.75):
+        InvertedIndex.__init__(self, k1, b)
+        self.fileName = fileName
+        self.file = open(fileName, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = struct.unpack_from(self.headerFormat, self.buffer, 0)
+        if header[0] != self.magic:
+            raise ValueError("Not a compressed index: " + fileName)
+        self.documents, fieldCount, self.terms = header[1:4]
+        fieldsStart, docsStart, lengthsStart, termsStart, keysStart, postingsStart, end = header[4:]
+        self.fields = self.buffer[fieldsStart:docsStart].decode('utf-8').split('\x00') if fieldCount > 0 else []
+        self.docOffsets = np.frombuffer(self.buffer, dtype='<u8', count=self.documents + 1, offset=docsStart)
+        self.docRecordsStart = docsStart + 8 * (self.documents + 1)
+        self.docOrder = np.frombuffer(self.buffer, dtype='<u4', count=self.documents, offset=self.docRecordsStart + int(self.docOffsets[-1]))
+        self.lengths = np.frombuffer(self.buffer, dtype='<u4', count=fieldCount * self.documents, offset=lengthsStart).reshape(fieldCount, self.documents)
+        self.keyOffsets = np.frombuffer(self.buffer, dtype='<u8', count=self.terms + 1, offset=termsStart)
+        self.postingsOffsets = np.frombuffer(self.buffer, dtype='<u8', count=self.terms + 1, offset=termsStart + 8 * (self.terms + 1))
+        self.documentFrequencies = np.frombuffer(self.buffer, dtype='<u4', count=self.terms, offset=termsStart + 16 * (self.terms + 1))
+        self.keysStart = keysStart
+        self.postingsStart = postingsStart
+        self.norms = {}
+        self.loaded = False
+
+    def getDocumentCount(self):
+        return self.documents
+
+    def readDocument(self, docNumber):
+        start = self.docRecordsStart + int(self.docOffsets[docNumber])
+        record = self.buffer[start:self.docRecordsStart + int(self.docOffsets[docNumber + 1])]
+        separator = record.index(b'\x00')
+        return record[:separator].decode('utf-8'), record[separator + 1:].decode('utf-8')
+
+    def getDocId(self, docNumber):
+        return self.readDocument(docNumber)[0]
+
+    def getSentence(self, docId, default=None):
+        low, high = 0, self.documents
+        while low < high:
+            middle = (low + high) // 2
+            middleId, sentence = self.readDocument(int(self.docOrder[middle]))
+            if middleId < docId:
+                low = middle + 1
+            elif middleId > docId:
+                high = middle
+            else:
+                return sentence
+        return default
+
+    def readKey(self, i):
+        return self.buffer[self.keysStart + int(self.keyOffsets[i]):self.keysStart + int(self.keyOffsets[i + 1])]
+
+    def findTerm(self, field, term):
+        key = (field + '\x00' + term).encode('utf-8')
+        low, high = 0, self.terms
+        while low < high:
+            middle = (low + high) // 2
+            middleKey = self.readKey(middle)
+            if middleKey < key:
+                low = middle + 1
+            elif middleKey > key:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def getFieldNorms(self, field):
+        if field not in self.norms:
+            self.norms[field] = self.getNorms(self.lengths[self.fields.index(field)])
+        return self.norms[field]
+
+    def getPostings(self, field, term):
+        if self.loaded:
+            return InvertedIndex.getPostings(self, field, term)
+        if field not in self.fields:
+            return None
+        i = self.findTerm(field, term)
+        if i is None:
+            return None
+        return self.decodePostings(i, field)
+
+    def decodePostings(self, i, field):
+        documentFrequency = int(self.documentFrequencies[i])
+        start = self.postingsStart + int(self.postingsOffsets[i])
+        values = self.decodeVarints(self.buffer, start, self.postingsStart + int(self.postingsOffsets[i + 1]), 2 * documentFrequency)
+        docNumbers = np.cumsum(values[:documentFrequency]).astype(np.int32)
+        counts = values[documentFrequency:].astype(np.float32)
+        return docNumbers, self.getImpacts(counts, self.getFieldNorms(field)[docNumbers]), documentFrequency
+
+    def loadPostings(self, denseFraction=0.125):
+        # For long-running processes: decode every posting list once into the
+        # in-memory InvertedIndex layout, trading the instant start for the
+        # faster in-memory search
+        print("Loading compressed postings into memory...")
+        self.denseFraction = denseFraction
+        for i in range(self.terms):
+            field, term = self.readKey(i).decode('utf-8').split('\x00', 1)
+            docNumbers, impacts, _ = self.decodePostings(i, field)
+            self.addPostings(field, term, docNumbers, impacts)
+        self.loaded = True
+        return self
+
+    @staticmethod
+    def decodeVarints(buffer, start, end, count):
+        # Vectorised variable-byte decode: the high bit marks a continuation
+        # byte, so every value ends at the first byte below 0x80
+        data = np.frombuffer(buffer, dtype=np.uint8, count=end - start, offset=start)
+        if len(data) == count:
+            # Every value fit in a single byte, the common case for doc gaps
+            # and term counts
+            return data.astype(np.int64)
+        ends = data < 0x80
+        valueNumbers = np.cumsum(ends) - ends
+        valueStarts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+        shifts = 7 * (np.arange(len(data)) - valueStarts[valueNumbers])
+        parts = (data & 0x7f).astype(np.int64) << shifts
+        return np.bincount(valueNumbers, weights=parts, minlength=count).astype(np.int64)
+
+    @staticmethod
+    def encodeVarints(values):
+        encoded = bytearray()
+        for value in values:
+            while value >= 0x80:
+                encoded.append((value & 0x7f) | 0x80)
+                value >>= 7
+            encoded.append(value)
+        return encoded
+
+    def close(self):
+        self.docOffsets = self.docOrder = self.lengths = None
+        self.keyOffsets = self.postingsOffsets = self.documentFrequencies = None
+        self.norms = {}
+        self.postings = {}
+        self.loaded = False
+        self.buffer.close()
+        self.file.close()
+
+    @classmethod
+    def write(cls, fileName, records, indexSentenceMap):
+        print("Writing compressed index...")
+        docIds, fieldPostings, fieldLengths = InvertedIndex().countTerms(records)
+        fields = sorted(fieldPostings)
+        fieldsBlob = '\x00'.join(fields).encode('utf-8')
+
+        docRecords = [(docId.encode('utf-8') + b'\x00' + indexSentenceMap.get(docId, '').encode('utf-8')) for docId in docIds]
+        docOffsets = np.zeros(len(docIds) + 1, dtype='<u8')
+        docOffsets[1:] = np.cumsum([len(record) for record in docRecords])
+        docOrder = np.array(sorted(range(len(docIds)), key=lambda doc: docIds[doc].encode('utf-8')), dtype='<u4')
+
+        lengths = np.zeros((len(fields), len(docIds)), dtype='<u4')
+        for i, field in enumerate(fields):
+            lengths[i] = fieldLengths[field]
+
+        keys = []
+        postings = []
+        documentFrequencies = []
+        for field in fields:
+            for term, docs in fieldPostings[field].items():
+                keys.append((field + '\x00' + term).encode('utf-8'))
+                docNumbers = [doc for doc, _ in docs]
+                gaps = [docNumbers[0]] + [docNumbers[j] - docNumbers[j - 1] for j in range(1, len(docNumbers))]
+                postings.append(bytes(cls.encodeVarints(gaps + [count for _, count in docs])))
+                documentFrequencies.append(len(docs))
+        order = sorted(range(len(keys)), key=lambda i: keys[i])
+        keys = [keys[i] for i in order]
+        postings = [postings[i] for i in order]
+        keyOffsets = np.zeros(len(keys) + 1, dtype='<u8')
+        keyOffsets[1:] = np.cumsum([len(key) for key in keys])
+        postingsOffsets = np.zeros(len(postings) + 1, dtype='<u8')
+        postingsOffsets[1:] = np.cumsum([len(posting) for posting in postings])
+        documentFrequencies = np.array([documentFrequencies[i] for i in order], dtype='<u4')
+
+        fieldsStart = struct.calcsize(cls.headerFormat)
+        docsStart = fieldsStart + len(fieldsBlob)
+        lengthsStart = docsStart + docOffsets.nbytes + int(docOffsets[-1]) + docOrder.nbytes
+        termsStart = lengthsStart + lengths.nbytes
+        keysStart = termsStart + keyOffsets.nbytes + postingsOffsets.nbytes + documentFrequencies.nbytes
+        postingsStart = keysStart + int(keyOffsets[-1])
+        end = postingsStart + int(postingsOffsets[-1])
+        with open(fileName, 'wb') as f:
+            f.write(struct.pack(cls.headerFormat, cls.magic, len(docIds), len(fields), len(keys),
+                                fieldsStart, docsStart, lengthsStart, termsStart, keysStart, postingsStart, end))
+            f.write(fieldsBlob)
+            f.write(docOffsets.tobytes())
+            for record in docRecords:
+                f.write(record)
+            f.write(docOrder.tobytes())
+            f.write(lengths.tobytes())
+            f.write(keyOffsets.tobytes())
+            f.write(postingsOffsets.tobytes())
+            f.write(documentFrequencies.tobytes())
+            for key in keys:
+                f.write(key)
+            for posting in postings:
+                f.write(posting)
+        print("Wrote", str(len(docIds)), "documents and", str(len(keys)), "terms to", fileName)
+        return fileName
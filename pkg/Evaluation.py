@@ -0,0 +1,130 @@
+import collections
+import io
+import time
+
+from pkg.HeadWordParser import HeadWordParser
+from pkg.SemanticSearchEngine import SemanticSearchEngine
+from pkg.SentenceStore import SentenceStore
+
+
+class Evaluation:
+
+    stages = ['tokenize', 'POS', 'lemma', 'stem', 'WordNet', 'head word', 'features', 'search']
+    # The SemanticSearchEngine instrumentation stages making up each stage
+    stageNames = {'query tokenize': 'tokenize', 'query POS tag': 'POS',
+                  'query lemmatize': 'lemma', 'query improvised lemmatize': 'lemma', 'query stem': 'stem',
+                  'query WordNet relations': 'WordNet', 'query improvised WordNet relations': 'WordNet',
+                  'query head word': 'head word', 'query improvised head word': 'head word'}
+    taskNames = {"1": 'Task2', "2": 'Task3', "3": 'Task4'}
+
+    def __init__(self, sse, rows=10, ks=(1, 5, 10)):
+        self.sse = sse
+        self.rows = rows
+        self.ks = ks
+
+    def readGoldPairs(self, goldFileName):
+        # One "A<i>S<j><TAB>query" pair per line
+        goldPairs = []
+        with io.open(goldFileName, 'r', encoding='utf-8') as goldFile:
+            for line in goldFile:
+                if len(line.strip()) == 0:
+                    continue
+                expectedId, query = line.rstrip('\n').split('\t', 1)
+                goldPairs.append((query, expectedId))
+        return goldPairs
+
+    def writeGoldPairs(self, goldFileName, goldPairs):
+        with io.open(goldFileName, 'w', encoding='utf-8') as goldFile:
+            for query, expectedId in goldPairs:
+                goldFile.write(expectedId + '\t' + ' '.join(query.split()) + '\n')
+        return goldFileName
+
+    def sampleGoldPairs(self, sentenceStore, sampleSize=500):
+        # Known-item pairs: every sampled sentence is the query for its own id,
+        # as in the README's rank-of-the-query-sentence evaluation
+        items = list(sentenceStore.items())
+        step = max(len(items) // sampleSize, 1)
+        return [(sentence, sentenceId) for sentenceId, sentence in items[::step][:sampleSize]]
+
+    def timed(self, stage, timings, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    def extractFeaturesWithTimings(self, inputChoice, query, timings):
+        # Runs the engine's own extractQueryFeatures, so caching, the
+        # concurrent head word and the Task 3/4 pipelines are what gets
+        # measured. 'features' is its wall time; the instrumentation timers on
+        # every query step split it into stages
+        instrumentation = self.sse.resources.instrumentation
+        before = instrumentation.getStageSeconds()
+        features = self.timed('features', timings, self.sse.extractQueryFeatures, inputChoice, query)
+        stageSeconds = collections.Counter()
+        for name, seconds in instrumentation.getStageSeconds().items():
+            if name in self.stageNames and seconds > before.get(name, 0.0):
+                stageSeconds[self.stageNames[name]] += seconds - before.get(name, 0.0)
+        for stage, seconds in stageSeconds.items():
+            timings[stage].append(seconds)
+        return features
+
+    def getRank(self, ids, expectedId):
+        return ids.index(expectedId) + 1 if expectedId in ids else None
+
+    def evaluateTask(self, inputChoice, goldPairs):
+        timings = collections.defaultdict(list)
+        ranks = []
+        for query, expectedId in goldPairs:
+            features = self.extractFeaturesWithTimings(inputChoice, query, timings)
+            core, clauses, joinedQuery = self.sse.buildQuery(inputChoice, features)
+            ids = self.timed('search', timings, self.sse.search, core, clauses, joinedQuery, self.rows)
+            ranks.append(self.getRank(ids, expectedId))
+        return ranks, timings
+
+    def getMRR(self, ranks):
+        return sum(1.0 / rank for rank in ranks if rank is not None) / len(ranks) if len(ranks) > 0 else 0.0
+
+    def getHitRate(self, ranks, k):
+        return sum(1 for rank in ranks if rank is not None and rank <= k) / len(ranks) if len(ranks) > 0 else 0.0
+
+    def getPercentile(self, values, percentile):
+        values = sorted(values)
+        return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+    def printReport(self, inputChoice, ranks, timings):
+        print()
+        print(self.taskNames[inputChoice], "-", str(len(ranks)), "queries")
+        print("MRR: %.3f" % self.getMRR(ranks), "  " + "  ".join("hit@%d: %.3f" % (k, self.getHitRate(ranks, k)) for k in self.ks))
+        print("Stage".ljust(12), "p50 ms".rjust(9), "p90 ms".rjust(9), "p99 ms".rjust(9), "mean ms".rjust(9))
+        for stage in self.stages:
+            if stage not in timings:
+                continue
+            values = timings[stage]
+            print(stage.ljust(12), *["%9.3f" % (1000 * self.getPercentile(values, p)) for p in [50, 90, 99]], "%9.3f" % (1000 * sum(values) / len(values)))
+
+    def evaluate(self, goldPairs, inputChoices=("1", "2", "3")):
+        results = {}
+        for inputChoice in inputChoices:
+            # Load the index first so its start-up cost is not counted as search
+            if self.sse.backend == 'native' and self.sse.loadNativeIndex('task' + str(int(inputChoice) + 1)) is None:
+                continue
+            ranks, timings = self.evaluateTask(inputChoice, goldPairs)
+            self.printReport(inputChoice, ranks, timings)
+            results[self.taskNames[inputChoice]] = (ranks, timings)
+        return results
+
+
+if __name__ == '__main__':
+    # Runs offline against the in-process index files and the heuristic head
+    # word parser, so neither Solr nor CoreNLP is needed
+    goldFileName = input("Enter the gold file (blank to sample the sentence store): ")
+    # The query caches are off so repeated gold queries are measured uncached
+    sse = SemanticSearchEngine(headWordParser=HeadWordParser.create('heuristic'), backend='native', queryCacheSize=0)
+    evaluation = Evaluation(sse)
+    if len(goldFileName.strip()) > 0:
+        goldPairs = evaluation.readGoldPairs(goldFileName)
+    else:
+        goldPairs = evaluation.sampleGoldPairs(SentenceStore())
+        evaluation.writeGoldPairs('Gold.tsv', goldPairs)
+    evaluation.evaluate(goldPairs)
+    sse.wordNetCache.printStats()
@@ -0,0 +1,178 @@
+import io
+import itertools
+import json
+import mmap
+import os
+
+import numpy as np
+
+from pkg.FeatureTable import FeatureTable
+from pkg.Vocabulary import Vocabulary
+
+
+class FeatureStore:
+
+    # Chunked columnar store for sentence feature records, in two files:
+    #   <name>.features       chunks appended back to back. Each chunk holds
+    #                         its own vocabulary and its sentence ids (both
+    #                         "\x00"-joined UTF-8), then for every feature
+    #                         column uint64 offsets (rows + 1) followed by the
+    #                         uint32 token ids, as in FeatureTable
+    #   <name>.features.json  the columns and, per chunk, its row count, the
+    #                         byte range of every section and the sentence ids
+    #                         it deletes from earlier chunks
+    # A reader only touches the sections of the columns it asks for. New
+    # articles are appended as new chunks; rows whose id reappears in a later
+    # chunk are superseded by it
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.metadataFileName = fileName + '.json'
+        self.metadata = None
+        self.file = None
+        self.buffer = None
+
+    @classmethod
+    def forJsonFile(cls, jsonFileName):
+        # Task4.json and Task4.jsonl both have their records in Task4.features
+        return cls(os.path.splitext(jsonFileName)[0] + '.features')
+
+    def exists(self):
+        return os.path.exists(self.fileName) and os.path.exists(self.metadataFileName)
+
+    def isCurrentFor(self, jsonFileName):
+        # Readers take the store instead of the JSON unless the JSON was
+        # written after it
+        return self.exists() and (not os.path.exists(jsonFileName) or self.getModifiedTime() >= os.path.getmtime(jsonFileName))
+
+    def getModifiedTime(self):
+        return os.path.getmtime(self.metadataFileName)
+
+    def getMetadata(self):
+        if self.metadata is None:
+            with io.open(self.metadataFileName, 'r', encoding='utf-8') as metadataFile:
+                self.metadata = json.load(metadataFile)
+        return self.metadata
+
+    def getColumns(self):
+        return self.getMetadata()['columns']
+
+    def writeMetadata(self, metadata):
+        with io.open(self.metadataFileName + '.tmp', 'w', encoding='utf-8') as metadataFile:
+            json.dump(metadata, metadataFile)
+        os.replace(self.metadataFileName + '.tmp', self.metadataFileName)
+        self.metadata = metadata
+
+    def write(self, records, columns, chunkSize=5000):
+        print("Writing feature store", self.fileName, "...")
+        return self.create(columns).append(records, chunkSize=chunkSize)
+
+    def create(self, columns):
+        # Starts an empty store, replacing any existing one
+        self.close()
+        open(self.fileName, 'wb').close()
+        self.writeMetadata({'columns': columns, 'chunks': []})
+        return self
+
+    def append(self, records, deletedIds=(), chunkSize=5000):
+        # records are tuples in column order. The metadata is replaced only
+        # after the chunks are on disk, so readers never see a partial chunk
+        metadata = self.getMetadata()
+        columns = metadata['columns']
+        chunks = list(metadata['chunks'])
+        recordIterator = iter(records)
+        deletedIds = list(deletedIds)
+        with open(self.fileName, 'ab') as dataFile:
+            position = dataFile.tell()
+            while True:
+                chunk = FeatureTable(columns)
+                chunk.extend(itertools.islice(recordIterator, chunkSize))
+                # Deletions alone still get an empty chunk to carry them
+                if len(chunk) == 0 and len(deletedIds) == 0:
+                    break
+                sections = self.encodeChunk(chunk)
+                chunkMetadata = {'rows': len(chunk), 'vocabulary': len(chunk.vocabulary), 'deleted': deletedIds, 'sections': {}}
+                for name, data in sections:
+                    dataFile.write(data)
+                    chunkMetadata['sections'][name] = [position, position + len(data)]
+                    position += len(data)
+                chunks.append(chunkMetadata)
+                deletedIds = []
+            dataFile.flush()
+            os.fsync(dataFile.fileno())
+        self.writeMetadata({'columns': columns, 'chunks': chunks})
+        return self
+
+    def encodeChunk(self, chunk):
+        sections = [('vocabulary', '\x00'.join(chunk.vocabulary.tokens).encode('utf-8')),
+                    ('ids', '\x00'.join(chunk.sentenceIds).encode('utf-8'))]
+        for column, tokenIds, offsets in zip(chunk.columns[1:], chunk.tokenIds, chunk.offsets):
+            sections.append((column, np.asarray(offsets, dtype='<u8').tobytes() + np.asarray(tokenIds, dtype='<u4').tobytes()))
+        return sections
+
+    def getBuffer(self):
+        # Appends grow the file, so the mapping is renewed when it is too short
+        end = max([section[1] for chunk in self.getMetadata()['chunks'] for section in chunk['sections'].values()] or [0])
+        if self.buffer is None or len(self.buffer) < end:
+            self.close()
+            if end == 0:
+                return b''
+            self.file = open(self.fileName, 'rb')
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.buffer
+
+    def readStrings(self, chunk, section, count):
+        if count == 0:
+            return []
+        start, end = chunk['sections'][section]
+        return self.getBuffer()[start:end].decode('utf-8').split('\x00')
+
+    def readColumn(self, chunk, column):
+        # Returns the row offsets and token ids of one column as lists
+        start, end = chunk['sections'][column]
+        buffer = self.getBuffer()
+        offsets = np.frombuffer(buffer, dtype='<u8', count=chunk['rows'] + 1, offset=start)
+        tokenIds = np.frombuffer(buffer, dtype='<u4', count=(end - start - 8 * (chunk['rows'] + 1)) // 4, offset=start + 8 * (chunk['rows'] + 1))
+        return offsets.tolist(), tokenIds.tolist()
+
+    def getLiveRows(self):
+        # Per chunk, the rows not superseded or deleted by a later chunk
+        chunks = self.getMetadata()['chunks']
+        superseded = set()
+        liveRows = [None] * len(chunks)
+        for chunkNumber in range(len(chunks) - 1, -1, -1):
+            chunk = chunks[chunkNumber]
+            ids = self.readStrings(chunk, 'ids', chunk['rows'])
+            liveRows[chunkNumber] = [row for row, sentenceId in enumerate(ids) if sentenceId not in superseded]
+            superseded.update(ids)
+            superseded.update(chunk['deleted'])
+        return liveRows
+
+    def iterRecords(self, columns=None):
+        # Yields (id, value, ...) tuples with the requested feature columns,
+        # all of them by default, in the order they were written
+        metadata = self.getMetadata()
+        columns = [column for column in (columns if columns is not None else metadata['columns']) if column != 'id']
+        kinds = [FeatureTable.columnKinds.get(column, 'list') for column in columns]
+        for chunk, rows in zip(metadata['chunks'], self.getLiveRows()):
+            if len(rows) == 0:
+                continue
+            vocabulary = Vocabulary.fromTokens(self.readStrings(chunk, 'vocabulary', chunk['vocabulary']))
+            ids = self.readStrings(chunk, 'ids', chunk['rows'])
+            columnData = [self.readColumn(chunk, column) for column in columns]
+            for row in rows:
+                yield (ids[row],) + tuple(vocabulary.decode(tokenIds, offsets[row], offsets[row + 1], kind)
+                                          for kind, (offsets, tokenIds) in zip(kinds, columnData))
+
+    def iterRecordDicts(self, columns=None):
+        # Same records as dicts, the shape InvertedIndex and the indexers read
+        # from the JSON files
+        names = ['id'] + [column for column in (columns if columns is not None else self.getColumns()) if column != 'id']
+        for record in self.iterRecords(columns):
+            yield dict(zip(names, record))
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.file.close()
+        self.buffer = None
+        self.file = None
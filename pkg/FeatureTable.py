@@ -0,0 +1,41 @@
+from array import array
+
+from pkg.Vocabulary import Vocabulary
+
+
+class FeatureTable:
+
+    # Columnar store for feature records (id, words, lemmas, ...): the ids
+    # in a list and every other column as interned token ids in an
+    # array('I') with array('Q') offsets. Iterating yields the record tuples
+    columnKinds = {'POSWithWords': 'pairs', 'head': 'value'}
+
+    def __init__(self, columns, vocabulary=None):
+        self.columns = columns
+        self.kinds = [self.columnKinds.get(column, 'list') for column in columns[1:]]
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.sentenceIds = []
+        self.tokenIds = [array('I') for _ in self.kinds]
+        self.offsets = [array('Q', [0]) for _ in self.kinds]
+
+    def append(self, record):
+        self.sentenceIds.append(record[0])
+        for value, kind, tokenIds, offsets in zip(record[1:], self.kinds, self.tokenIds, self.offsets):
+            self.vocabulary.encode(value, kind, tokenIds)
+            offsets.append(len(tokenIds))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.sentenceIds)
+
+    def __getitem__(self, row):
+        decode = self.vocabulary.decode
+        return (self.sentenceIds[row],) + tuple(decode(tokenIds, offsets[row], offsets[row + 1], kind)
+                                                for kind, tokenIds, offsets in zip(self.kinds, self.tokenIds, self.offsets))
+
+    def __iter__(self):
+        for row in range(len(self.sentenceIds)):
+            yield self[row]
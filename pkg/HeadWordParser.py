@@ -0,0 +1,153 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from nltk import pos_tag_sents
+from nltk.parse.corenlp import CoreNLPDependencyParser
+from nltk.tokenize import word_tokenize
+import requests
+
+
+class HeadWordParser:
+
+    @classmethod
+    def create(cls, backend='corenlp', **kwargs):
+        if backend == 'corenlp':
+            return CoreNLPHeadWordParser(**kwargs)
+        elif backend == 'heuristic':
+            return HeuristicHeadWordParser(**kwargs)
+        raise ValueError("Unknown head word backend: " + str(backend))
+
+    def findHeadWord(self, sentence):
+        return self.findHeadWords([sentence])[0]
+
+    def findHeadWords(self, sentences):
+        raise NotImplementedError
+
+    def getFirstLine(self, sentence):
+        for line in sentence.split('\n'):
+            if len(line.strip()) > 0:
+                return line
+        return None
+
+
+class CoreNLPHeadWordParser(HeadWordParser):
+
+    def __init__(self, url='http://localhost:9000', batchSize=50, maxInFlight=4, retries=3, backoff=0.5, timeout=60):
+        self.url = url
+        self.batchSize = batchSize
+        self.maxInFlight = maxInFlight
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.dependency_parser = CoreNLPDependencyParser(url)
+
+    def findHeadWords(self, sentences):
+        batches = [sentences[start:start + self.batchSize] for start in range(0, len(sentences), self.batchSize)]
+        if len(batches) <= 1 or self.maxInFlight <= 1:
+            batchHeadWords = map(self.parseBatch, batches)
+        else:
+            # At most maxInFlight requests are outstanding; map keeps batch order
+            with ThreadPoolExecutor(max_workers=self.maxInFlight) as executor:
+                batchHeadWords = list(executor.map(self.parseBatch, batches))
+        headWords = []
+        for batch in batchHeadWords:
+            headWords.extend(batch)
+        return headWords
+
+    def parseBatch(self, sentences):
+        # raw_parse splits on newlines only and keeps the first parse, so sending
+        # the first non-empty line of every sentence, one per line, gives the
+        # same root as parsing the sentences one request at a time
+        lines = [self.getFirstLine(sentence) for sentence in sentences]
+        toParse = [line for line in lines if line is not None]
+        parsedSentences = self.parseLinesWithRetry(toParse) if len(toParse) > 0 else []
+        parsedSentences = iter(parsedSentences)
+        headWords = []
+        for line in lines:
+            headWords.append(self.getRootWord(next(parsedSentences)) if line is not None else None)
+        return headWords
+
+    def parseLinesWithRetry(self, lines):
+        properties = {'tokenize.whitespace': 'false', 'ssplit.eolonly': 'true'}
+        for attempt in range(self.retries + 1):
+            try:
+                data = self.dependency_parser.api_call('\n'.join(lines), properties=properties, timeout=self.timeout)
+                parsedSentences = [self.dependency_parser.make_tree(parse) for parse in data['sentences']]
+                if len(parsedSentences) != len(lines):
+                    raise ValueError("CoreNLP returned " + str(len(parsedSentences)) + " parses for " + str(len(lines)) + " sentences")
+                return parsedSentences
+            except (requests.exceptions.RequestException, ValueError) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                print("CoreNLP request failed (" + str(e) + "), retrying in", str(delay), "s...")
+                time.sleep(delay)
+
+    def getRootWord(self, parsedSentence):
+        rootValue = list(list(parsedSentence.nodes.values())[0]['deps']['ROOT'])[0]
+        for n in parsedSentence.nodes.values():
+            if n['address'] == rootValue:
+                return n['word']
+        return None
+
+
+class HeuristicHeadWordParser(HeadWordParser):
+
+    finiteVerbTags = ('VBD', 'VBZ', 'VBP', 'MD')
+    verbTags = ('VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ')
+    copulas = ('be', 'is', 'are', 'was', 'were', "'s", "'re", "'m", 'am', 'been', 'being')
+    predicateSkipTags = ('DT', 'PDT', 'RB', 'RBR', 'RBS', 'PRP$')
+
+    def __init__(self, batchSize=1000):
+        self.batchSize = batchSize
+
+    def findHeadWords(self, sentences):
+        # Mirror CoreNLP's newline splitting so both backends see the same text
+        lines = [self.getFirstLine(sentence) for sentence in sentences]
+        headWords = []
+        for start in range(0, len(lines), self.batchSize):
+            batch = lines[start:start + self.batchSize]
+            taggedSentences = pos_tag_sents([word_tokenize(line) if line is not None else [] for line in batch])
+            headWords.extend(self.findRoot(tagged) for tagged in taggedSentences)
+        return headWords
+
+    def findRoot(self, tagged):
+        if len(tagged) == 0:
+            return None
+        for i, (word, tag) in enumerate(tagged):
+            if tag in self.finiteVerbTags:
+                return self.resolveVerbGroup(tagged, i)
+        for word, tag in tagged:
+            if tag.startswith('VB'):
+                return word
+        return self.findNominalHead(tagged, 0) or tagged[0][0]
+
+    def resolveVerbGroup(self, tagged, i):
+        # Auxiliaries and copulas are not roots in CoreNLP's universal
+        # dependencies: the following verb or the predicate nominal is
+        head = tagged[i][0]
+        isCopula = head.lower() in self.copulas
+        for word, tag in tagged[i + 1:]:
+            if tag in self.verbTags:
+                if word.lower() in self.copulas:
+                    isCopula = True
+                    continue
+                return word
+            if tag in ('RB', 'RBR', 'RBS', 'MD', 'TO'):
+                continue
+            break
+        if isCopula:
+            predicate = self.findNominalHead(tagged, i + 1)
+            if predicate is not None:
+                return predicate
+        return head
+
+    def findNominalHead(self, tagged, start):
+        # The last word of the first noun or adjective phrase
+        head = None
+        for word, tag in tagged[start:]:
+            if tag.startswith('NN') or tag.startswith('JJ') or tag == 'CD':
+                head = word
+            elif head is not None or tag not in self.predicateSkipTags:
+                break
+        return head
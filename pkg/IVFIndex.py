@@ -0,0 +1,124 @@
+import io
+import os
+
+import numpy as np
+
+
+class IVFIndex:
+
+    # Inverted-file index over unit vectors: spherical k-means centroids
+    # partition the vectors into lists, and a query only scores the vectors in
+    # the probes lists whose centroids are closest to it. Only doc numbers are
+    # kept, grouped by list; the vectors themselves stay in the caller's
+    # matrix, so updated rows are always scored with their current values.
+    # Saved as one .npz of centroids, list offsets (lists + 1) and doc numbers
+    def __init__(self, fileName='SentenceVectorsIVF', lists=None, probes=32, iterations=10, trainingSize=65536, seed=0):
+        self.fileName = fileName
+        self.lists = lists
+        self.probes = probes
+        self.iterations = iterations
+        self.trainingSize = trainingSize
+        self.seed = seed
+        self.centroids = None
+        self.offsets = None
+        self.docNumbers = None
+        # Insertions since the last merge, scanned alongside the lists
+        self.pendingDocNumbers = np.zeros(0, dtype=np.int64)
+        self.pendingLists = np.zeros(0, dtype=np.int64)
+
+    def getFileName(self):
+        return self.fileName + '.npz'
+
+    def exists(self):
+        return os.path.exists(self.getFileName())
+
+    def load(self):
+        with np.load(self.getFileName()) as arrays:
+            self.centroids = arrays['centroids']
+            self.offsets = arrays['offsets']
+            self.docNumbers = arrays['docNumbers']
+        return self
+
+    def write(self):
+        self.merge()
+        # Written aside and renamed so readers never see a partial file
+        temporaryFileName = self.getFileName() + '.tmp'
+        with io.open(temporaryFileName, 'wb') as indexFile:
+            np.savez(indexFile, centroids=self.centroids, offsets=self.offsets, docNumbers=self.docNumbers)
+        os.replace(temporaryFileName, self.getFileName())
+        return self
+
+    def getListCount(self, vectorCount):
+        # About 4 * sqrt(n) lists keeps each list short without making the
+        # centroid scan dominate
+        if self.lists is not None:
+            return max(min(self.lists, vectorCount), 1)
+        return max(min(int(4 * np.sqrt(vectorCount)), vectorCount), 1)
+
+    def assign(self, vectors, centroids=None, chunkSize=16384):
+        centroids = centroids if centroids is not None else self.centroids
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunkSize):
+            assignments[start:start + chunkSize] = np.argmax(np.asarray(vectors[start:start + chunkSize]) @ centroids.T, axis=1)
+        return assignments
+
+    def train(self, vectors):
+        random = np.random.RandomState(self.seed)
+        lists = self.getListCount(len(vectors))
+        sample = np.asarray(vectors[np.sort(random.choice(len(vectors), min(self.trainingSize, len(vectors)), replace=False))], dtype=np.float32)
+        centroids = sample[random.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self.assign(sample, centroids)
+            order = np.argsort(assignments, kind='stable')
+            counts = np.bincount(assignments, minlength=lists)
+            nonEmpty = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonEmpty]
+            centroids[nonEmpty] = np.add.reduceat(sample[order], starts, axis=0)
+            # Empty lists are reseeded from random sample vectors
+            empty = np.flatnonzero(counts == 0)
+            if len(empty) > 0:
+                centroids[empty] = sample[random.choice(len(sample), len(empty), replace=False)]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1), 1e-12)[:, None]
+        self.centroids = centroids
+        return self
+
+    def build(self, vectors):
+        print("Building IVF index...")
+        self.train(vectors)
+        self.setLists(np.arange(len(vectors), dtype=np.int64), self.assign(vectors))
+        sizes = np.diff(self.offsets)
+        print("Partitioned", str(len(vectors)), "vectors into", str(len(sizes)), "lists (largest", str(int(sizes.max())) + ")")
+        return self
+
+    def setLists(self, docNumbers, assignments):
+        order = np.argsort(assignments, kind='stable')
+        self.docNumbers = docNumbers[order].astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))]).astype(np.int64)
+        self.pendingDocNumbers = np.zeros(0, dtype=np.int64)
+        self.pendingLists = np.zeros(0, dtype=np.int64)
+
+    def add(self, vectors, docNumbers):
+        # New or changed vectors go to their nearest list. Until the next merge
+        # a changed vector also sits in its old list; search drops the duplicate
+        self.pendingDocNumbers = np.concatenate([self.pendingDocNumbers, np.asarray(docNumbers, dtype=np.int64)])
+        self.pendingLists = np.concatenate([self.pendingLists, self.assign(vectors)])
+
+    def merge(self):
+        if len(self.pendingDocNumbers) == 0:
+            return
+        listNumbers = np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets))
+        kept = ~np.isin(self.docNumbers, self.pendingDocNumbers)
+        # The last insertion of a doc number wins
+        last = len(self.pendingDocNumbers) - 1 - np.unique(self.pendingDocNumbers[::-1], return_index=True)[1]
+        self.setLists(np.concatenate([self.docNumbers[kept], self.pendingDocNumbers[last]]), np.concatenate([listNumbers[kept], self.pendingLists[last]]))
+
+    def getCandidates(self, vector, probes=None):
+        # Doc numbers in the probes lists nearest to vector
+        probes = max(min(probes if probes is not None else self.probes, len(self.centroids)), 1)
+        centroidScores = self.centroids @ vector
+        probed = np.argpartition(-centroidScores, probes - 1)[:probes] if probes < len(self.centroids) else np.arange(len(self.centroids))
+        candidates = [self.docNumbers[self.offsets[listNumber]:self.offsets[listNumber + 1]] for listNumber in probed]
+        if len(self.pendingDocNumbers) > 0:
+            candidates.append(self.pendingDocNumbers[np.isin(self.pendingLists, probed)])
+            return np.unique(np.concatenate(candidates))
+        return np.concatenate(candidates)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+from pkg.FeatureStore import FeatureStore
+from pkg.SentenceStore import SentenceStore
+from pkg.VectorIndex import VectorIndex
+
+
+class IncrementalIndexer:
+
+    def __init__(self, indexCreation, inputChoice, manifestFileName=None, sentenceStore=None, vectorIndex=None):
+        self.indexCreation = indexCreation
+        self.sentenceStore = sentenceStore if sentenceStore is not None else SentenceStore()
+        self.vectorIndex = vectorIndex if vectorIndex is not None else VectorIndex()
+        self.inputChoice = inputChoice
+        self.taskName = 'Task' + str(int(inputChoice) + 1)
+        self.manifestFileName = manifestFileName if manifestFileName is not None else self.taskName + 'Manifest.json'
+        self.core = 'task' + str(int(inputChoice) + 1)
+
+    def loadManifest(self):
+        if not os.path.exists(self.manifestFileName):
+            return {}
+        with open(self.manifestFileName, 'r') as manifestFile:
+            return json.load(manifestFile)
+
+    def writeManifest(self, manifest):
+        with open(self.manifestFileName, 'w') as manifestFile:
+            json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+
+    def saveManifest(self, path, data):
+        # Called after a full rebuild: data holds the title-stripped sentences
+        # of every article in listArticles order
+        manifest = {}
+        for f, sentences in zip(self.indexCreation.listArticles(path), data):
+            manifest[f] = {'hash': self.hashText(self.indexCreation.readArticle(path, f)), 'sentences': len(sentences)}
+        self.writeManifest(manifest)
+
+    def hashText(self, text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def getArticleId(self, fileName):
+        return self.indexCreation.getArticleId(fileName)
+
+    def getSentenceIds(self, fileName, start, end):
+        articleId = self.getArticleId(fileName)
+        return ['A' + str(articleId) + 'S' + str(j) for j in range(start, end + 1)]
+
+    def findChanges(self, path, manifest):
+        changed = []
+        for f in self.indexCreation.listArticles(path):
+            text = self.indexCreation.readArticle(path, f)
+            textHash = self.hashText(text)
+            if f not in manifest or manifest[f]['hash'] != textHash:
+                changed.append((f, text, textHash))
+        removed = sorted(set(manifest.keys()) - set(self.indexCreation.listArticles(path)))
+        return changed, removed
+
+    def extractRecords(self, indexWordsMap, indexSentenceMap):
+        columns = self.indexCreation.getTaskColumns(self.inputChoice)
+        records = self.indexCreation.iterTaskRecords(self.inputChoice, indexWordsMap, indexSentenceMap)
+        return [dict(zip(columns, record)) for record in records]
+
+    def update(self, path):
+        print("Checking for new or modified articles...")
+        manifest = self.loadManifest()
+        changed, removed = self.findChanges(path, manifest)
+        print("New or modified articles:", str(len(changed)), " Removed articles:", str(len(removed)))
+        if len(changed) == 0 and len(removed) == 0:
+            return manifest
+
+        data = self.indexCreation.removeArticleTitle([text for _, text, _ in changed])
+        articleIds = [self.getArticleId(f) for f, _, _ in changed]
+        indexWordsMap, indexSentenceMap = self.indexCreation.createIndexMap(data, articleIds)
+        records = self.extractRecords(indexWordsMap, indexSentenceMap)
+
+        deletedIds = []
+        for (f, _, textHash), sentences in zip(changed, data):
+            if f in manifest and manifest[f]['sentences'] > len(sentences):
+                deletedIds.extend(self.getSentenceIds(f, len(sentences) + 1, manifest[f]['sentences']))
+            manifest[f] = {'hash': textHash, 'sentences': len(sentences)}
+        for f in removed:
+            deletedIds.extend(self.getSentenceIds(f, 1, manifest.pop(f)['sentences']))
+
+        # Documents are replaced in place by id and nothing is wiped, so the
+        # index keeps serving the previous version until the single commit
+        print("Indexing", str(len(records)), "sentences and deleting", str(len(deletedIds)), "...")
+        solr = self.indexCreation.resources.getSolrClient(self.core)
+        if len(records) > 0:
+            solr.add(records, commit=False)
+        if len(deletedIds) > 0:
+            solr.delete(id=deletedIds, commit=False)
+        solr.commit()
+        # The feature store gets the changed articles as a new chunk, which
+        # supersedes their old rows
+        featureStore = FeatureStore(self.taskName + '.features')
+        if featureStore.exists():
+            columns = featureStore.getColumns()
+            featureStore.append([tuple(record[column] for column in columns) for record in records], deletedIds)
+        self.indexCreation.resources.indexVersion.bump(self.core)
+        if self.sentenceStore.exists():
+            self.sentenceStore.update(indexSentenceMap, articleIds + [self.getArticleId(f) for f in removed])
+        if self.vectorIndex.exists():
+            self.vectorIndex.load().update(indexSentenceMap.items(), deletedIds).write()
+            self.indexCreation.resources.indexVersion.bump('vectors')
+        self.writeManifest(manifest)
+        return manifest
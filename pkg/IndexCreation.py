@@ -1,342 +1,578 @@
-from _functools import reduce
 import collections
-import csv
+from concurrent.futures import ProcessPoolExecutor
 import io
+import itertools
 import json
 import os
 
 from nltk import pos_tag
+from nltk import pos_tag_sents
 from nltk import tokenize
-from nltk.corpus import wordnet as wn
-from nltk.parse.corenlp import CoreNLPDependencyParser
-from nltk.stem import WordNetLemmatizer
-from nltk.stem.porter import PorterStemmer
+from nltk.corpus.reader.wordnet import ADJ, ADV, NOUN, VERB
 from nltk.tokenize import word_tokenize
-import pysolr
 
 import pandas as pd
 
+from pkg.BuildCheckpoint import BuildCheckpoint
+from pkg.CompressedIndex import CompressedIndex
+from pkg.FeatureStore import FeatureStore
+from pkg.FeatureTable import FeatureTable
+from pkg.IncrementalIndexer import IncrementalIndexer
+from pkg.Instrumentation import Instrumentation, instrumented
+from pkg.NLPResources import NLPResources
+from pkg.SentenceStore import SentenceStore
+from pkg.SolrBulkIndexer import SolrBulkIndexer
+from pkg.TokenTable import TokenTable
+from pkg.VectorIndex import VectorIndex
+
+
+workerIndexCreation = None
+
+
+def initWorker(resources):
+    global workerIndexCreation
+    # One IndexCreation per worker process, so its WordNet cache and
+    # resources are unpickled once and kept across every chunk it extracts
+    workerIndexCreation = IndexCreation(resources=resources)
+    # Drop the counts copied from the parent, so each chunk reports only its own
+    resources.instrumentation.takeCounters()
+
+
+def extractChunkRecords(inputChoice, chunk):
+    # The chunk's stage timings and cache counters go back with its records
+    records = list(workerIndexCreation.iterTaskRecords(inputChoice, *chunk))
+    return records, workerIndexCreation.resources.instrumentation.takeCounters()
+
 
 class IndexCreation():
 
+    # Sentences per checkpoint shard, and per chunk sent to a worker, so the
+    # serial, parallel and streaming builds share their shard keys
+    shardSize = 1000
+
+    def __init__(self, wordNetCache=None, headWordParser=None, resources=None):
+        self.resources = resources if resources is not None else NLPResources(wordNetCache, headWordParser)
+        self.wordNetCache = self.resources.wordNetCache
+        self.headWordParser = self.resources.headWordParser
+        self.buildCheckpoint = self.resources.buildCheckpoint
+
+    @instrumented('preprocess corpus', lambda result: len(result[1]))
     def preprocessCorpus(self, path):
         print("Pre-processing and Tokenizing...")
         data = self.readArticles(path)
         data = self.removeArticleTitle(data)
 
-        indexWordsMap, indexSentenceMap = self.createIndexMap(data)
-        with io.open('MainData.csv', 'w', encoding='utf-8', errors='ignore') as f:
-            w = csv.writer(f)
-            w.writerows(indexWordsMap.items())
+        indexWordsMap, indexSentenceMap = self.createIndexMap(data, self.listArticleIds(path))
         wordsDFrame = pd.DataFrame(list(indexWordsMap.items()), columns=['id', 'words'])
 
+        # The JSON is what Solr is fed; the feature store replaces the old
+        # MainData.csv dump for everything read back in-process
         jsonFileName = 'Task2.json'
         wordsDFrame.to_json(jsonFileName, orient='records')
+        self.getFeatureStore(jsonFileName).write(indexWordsMap.items(), self.taskTwoColumns)
         return data, indexWordsMap, indexSentenceMap, wordsDFrame, jsonFileName
 
+    def listArticles(self, path):
+        return sorted(os.listdir(path), key=self.getArticleId)
+
+    def getArticleId(self, fileName):
+        # Sentence ids A<n>S<j> take n from the file name, not the position in
+        # listArticles, so they stay put when articles are removed
+        return int(fileName.split('.')[0])
+
+    def listArticleIds(self, path):
+        return [self.getArticleId(f) for f in self.listArticles(path)]
+
+    @instrumented('read articles', len)
     def readArticles(self, path):
         data = []
-        for f in sorted(os.listdir(path), key=lambda x: int(x.split('.')[0])):
-            with io.open(path + f, 'r', encoding='utf-8', errors='ignore') as dataFile:
-                data.append(dataFile.read())
+        for f in self.listArticles(path):
+            data.append(self.readArticle(path, f))
         return data
 
+    def readArticle(self, path, fileName):
+        with io.open(path + fileName, 'r', encoding='utf-8', errors='ignore') as dataFile:
+            return dataFile.read()
+
+    @instrumented('sentence split', len)
     def removeArticleTitle(self, data):
         for i in range(len(data)):
-            sentences = tokenize.sent_tokenize(data.pop(i).strip())
-            temp = sentences.pop(0).split('\n\n')
-            if len(temp) == 2:
-                sentences.insert(0, temp[1])
-            data.insert(i, sentences)
+            data[i] = self.stripArticleTitle(data[i])
         return data
 
-    def createIndexMap(self, data):
-        indexWordsMap = collections.OrderedDict()
+    def stripArticleTitle(self, article):
+        sentences = tokenize.sent_tokenize(article.strip())
+        temp = sentences[0].split('\n\n')
+        if len(temp) == 2:
+            sentences[0] = temp[1]
+        else:
+            sentences.pop(0)
+        return sentences
+
+    @instrumented('tokenize', lambda result: len(result[0]))
+    def createIndexMap(self, data, articleIds):
+        # indexWordsMap interns its tokens; see TokenTable. articleIds are the
+        # file numbers of the articles in data, see getArticleId
+        indexWordsMap = TokenTable()
         indexSentenceMap = collections.OrderedDict()
         for i in range(0, len(data)):
             for j in range(0, len(data[i])):
-                index = 'A' + str(i + 1) + 'S' + str(j + 1)
+                index = 'A' + str(articleIds[i]) + 'S' + str(j + 1)
                 indexSentenceMap[index] = data[i][j]
                 indexWordsMap[index] = list(set(word_tokenize(data[i][j])))
         return indexWordsMap, indexSentenceMap
 
-    def extractFeatures(self, indexWordsMap, indexSentenceMap):
-        wordsDFrame = pd.DataFrame(list(indexWordsMap.items()), columns=['id', 'words'])
-        indexLemmaMap = self.lemmatizeWords(indexWordsMap)
-        lemmaDFrame = pd.DataFrame(list(indexLemmaMap.items()), columns=['id', 'lemmas'])
-        indexStemMap = self.stemWords(indexWordsMap)
-        stemDFrame = pd.DataFrame(list(indexStemMap.items()), columns=['id', 'stems'])
-        indexPOSMap = self.tagPOSWords(indexWordsMap)
-        POSDFrame = pd.DataFrame(list(indexPOSMap.items()), columns=['id', 'POS'])
-        indexHeadMap = self.findHeadWord(indexSentenceMap)
-        HeadDFrame = pd.DataFrame(list(indexHeadMap.items()), columns=['id', 'head'])
-        indexHypernymMap = self.extractHypernyms(indexWordsMap)
-        HypernymDFrame = pd.DataFrame(list(indexHypernymMap.items()), columns=['id', 'hypernyms'])
-        indexHyponymMap = self.extractHyponyms(indexWordsMap)
-        HyponymDFrame = pd.DataFrame(list(indexHyponymMap.items()), columns=['id', 'hyponyms'])
-        indexMeronymMap = self.extractMeronyms(indexWordsMap)
-        MeronymDFrame = pd.DataFrame(list(indexMeronymMap.items()), columns=['id', 'meronyms'])
-        indexHolonymMap = self.extractHolonyms(indexWordsMap)
-        HolonymDFrame = pd.DataFrame(list(indexHolonymMap.items()), columns=['id', 'holonyms'])
-        dfList = [wordsDFrame, lemmaDFrame, stemDFrame, POSDFrame, HeadDFrame, HypernymDFrame, HyponymDFrame, MeronymDFrame, HolonymDFrame]
-        finalDFrame = reduce(lambda left, right: pd.merge(left, right, on='id'), dfList)
+    def iterArticles(self, path):
+        for f in self.listArticles(path):
+            yield self.getArticleId(f), self.readArticle(path, f)
+
+    def iterSentences(self, path):
+        for articleId, article in self.iterArticles(path):
+            for j, sentence in enumerate(self.stripArticleTitle(article)):
+                yield 'A' + str(articleId) + 'S' + str(j + 1), sentence
+
+    def iterIndexMapChunks(self, path, chunkSize=shardSize):
+        indexWordsMap = TokenTable()
+        indexSentenceMap = collections.OrderedDict()
+        for index, sentence in self.iterSentences(path):
+            indexSentenceMap[index] = sentence
+            indexWordsMap[index] = list(set(word_tokenize(sentence)))
+            if len(indexWordsMap) == chunkSize:
+                yield indexWordsMap, indexSentenceMap
+                indexWordsMap = TokenTable()
+                indexSentenceMap = collections.OrderedDict()
+        if len(indexWordsMap) > 0:
+            yield indexWordsMap, indexSentenceMap
+
+    @instrumented('stream features')
+    def streamFeatures(self, path, inputChoice, chunkSize=shardSize, sentenceStore=None):
+        print("Streaming features...")
+        jsonFileName = 'Task' + str(int(inputChoice) + 1) + '.jsonl'
+        columns = self.getTaskColumns(inputChoice)
+        featureStore = self.getFeatureStore(jsonFileName).write([], columns)
+        if sentenceStore is not None:
+            sentenceStore.startSave()
+        with io.open(jsonFileName, 'w', encoding='utf-8') as jsonFile:
+            # Only one chunk of sentences and its records is held at a time
+            for indexWordsMap, indexSentenceMap in self.iterIndexMapChunks(path, chunkSize):
+                records = list(self.iterTaskRecords(inputChoice, indexWordsMap, indexSentenceMap))
+                jsonFile.writelines([json.dumps(dict(zip(columns, record))) + '\n' for record in records])
+                jsonFile.flush()
+                featureStore.append(records)
+                if sentenceStore is not None:
+                    sentenceStore.saveChunk(indexSentenceMap)
+        if sentenceStore is not None:
+            sentenceStore.finishSave()
+        self.printExtractionStats()
+        self.pruneCheckpoints()
+        return jsonFileName
+
+    def getTaskColumns(self, inputChoice):
+        if inputChoice == "1":
+            return self.taskTwoColumns
+        elif inputChoice == "2":
+            return self.taskThreeColumns
+        return self.taskFourColumns
+
+    def iterTaskRecords(self, inputChoice, indexWordsMap, indexSentenceMap):
+        if inputChoice == "1":
+            return iter(indexWordsMap.items())
+        elif inputChoice == "2":
+            return self.iterFeatureRecords(indexWordsMap, indexSentenceMap)
+        return self.iterImprovisedFeatureRecords(indexWordsMap, indexSentenceMap)
+
+    taskTwoColumns = ['id', 'words']
+    taskThreeColumns = ['id', 'words', 'lemmas', 'stems', 'POS', 'head', 'hypernyms', 'hyponyms', 'meronyms', 'holonyms']
+    taskFourColumns = ['id', 'words', 'lemmas', 'stems', 'POSWithWords', 'head', 'hypernyms', 'hyponyms', 'meronyms', 'holonyms']
+
+    @instrumented('WordNet table')
+    def buildWordNetTable(self, indexWordsMap, tableFileName='WordNet.sst'):
+        words = set()
+        for v in indexWordsMap.values():
+            words.update(v)
+        return self.wordNetCache.buildTable(words, tableFileName)
+
+    @instrumented('Task3 features')
+    def extractFeatures(self, indexWordsMap, indexSentenceMap, workers=1):
+        if workers > 1:
+            records = self.extractFeatureRecordsInParallel(indexWordsMap, indexSentenceMap, workers)
+        else:
+            records = self.extractFeatureRecords(indexWordsMap, indexSentenceMap)
+        self.pruneCheckpoints()
 
         jsonFileName = 'Task3.json'
-        finalDFrame.to_json(jsonFileName, orient='records')
+        self.writeRecordsJson(records, self.taskThreeColumns, jsonFileName)
+        self.getFeatureStore(jsonFileName).write(records, self.taskThreeColumns)
         return jsonFileName
     
-    def extractImprovisedFeatures(self, indexWordsMap, indexSentenceMap):
-        wordsDFrame = pd.DataFrame(list(indexWordsMap.items()), columns=['id', 'words'])
-        indexPOSWithWordsMap = self.tagPOSWithWords(indexWordsMap)
-        POSDFrame = pd.DataFrame(list(indexPOSWithWordsMap.items()), columns=['id', 'POSWithWords'])
-        indexLemmaMap = self.improvedLemmatizeWords(indexPOSWithWordsMap)
-        lemmaDFrame = pd.DataFrame(list(indexLemmaMap.items()), columns=['id', 'lemmas'])
-        indexStemMap = self.stemWords(indexWordsMap)
-        stemDFrame = pd.DataFrame(list(indexStemMap.items()), columns=['id', 'stems'])
-        indexHeadMap = self.findImprovisedHeadWord(indexSentenceMap)
-        HeadDFrame = pd.DataFrame(list(indexHeadMap.items()), columns=['id', 'head'])
-#         indexWSDHeadWordMap = self.extractWSDForHeadWord(indexHeadMap, indexSentenceMap)
-#         WSDHeadWordDFrame = pd.DataFrame(list(indexWSDHeadWordMap.items()), columns=['id', 'head_wsds'])
-        indexHypernymMap = self.extractImprovisedHypernyms(indexWordsMap)
-        HypernymDFrame = pd.DataFrame(list(indexHypernymMap.items()), columns=['id', 'hypernyms'])
-        indexHyponymMap = self.extractImprovisedHyponyms(indexWordsMap)
-        HyponymDFrame = pd.DataFrame(list(indexHyponymMap.items()), columns=['id', 'hyponyms'])
-        indexMeronymMap = self.extractImprovisedMeronyms(indexWordsMap)
-        MeronymDFrame = pd.DataFrame(list(indexMeronymMap.items()), columns=['id', 'meronyms'])
-        indexHolonymMap = self.extractImprovisedHolonyms(indexWordsMap)
-        HolonymDFrame = pd.DataFrame(list(indexHolonymMap.items()), columns=['id', 'holonyms'])
-        dfList = [wordsDFrame, lemmaDFrame, stemDFrame, POSDFrame, HeadDFrame, HypernymDFrame, HyponymDFrame, MeronymDFrame, HolonymDFrame]
-        finalDFrame = reduce(lambda left, right: pd.merge(left, right, on='id'), dfList)
+    @instrumented('Task4 features')
+    def extractImprovisedFeatures(self, indexWordsMap, indexSentenceMap, workers=1):
+        if workers > 1:
+            records = self.extractImprovisedFeatureRecordsInParallel(indexWordsMap, indexSentenceMap, workers)
+        else:
+            records = self.extractImprovisedFeatureRecords(indexWordsMap, indexSentenceMap)
+        self.pruneCheckpoints()
 
         jsonFileName = 'Task4.json'
-        finalDFrame.to_json(jsonFileName, orient='records')
+        self.writeRecordsJson(records, self.taskFourColumns, jsonFileName)
+        self.getFeatureStore(jsonFileName).write(records, self.taskFourColumns)
+        return jsonFileName
+
+    def writeRecordsJson(self, records, columns, jsonFileName, chunkSize=5000):
+        # Same file as DataFrame.from_records(records).to_json(orient='records'),
+        # but only one chunk of records is materialized as a DataFrame at a time
+        recordIterator = iter(records)
+        first = True
+        with io.open(jsonFileName, 'w', encoding='utf-8') as jsonFile:
+            jsonFile.write('[')
+            while True:
+                chunk = list(itertools.islice(recordIterator, chunkSize))
+                if len(chunk) == 0:
+                    break
+                chunkJson = pd.DataFrame.from_records(chunk, columns=columns).to_json(orient='records')
+                jsonFile.write(('' if first else ',') + chunkJson[1:-1])
+                first = False
+            jsonFile.write(']')
         return jsonFileName
 
+    def getFeatureStore(self, jsonFileName):
+        return FeatureStore.forJsonFile(jsonFileName)
+
+    def iterIndexRecords(self, jsonFileName):
+        featureStore = self.getFeatureStore(jsonFileName)
+        if featureStore.isCurrentFor(jsonFileName):
+            return featureStore.iterRecordDicts()
+        return CompressedIndex.iterJsonRecords(jsonFileName)
+
+    def createTokenTable(self, indexMap, kind='list'):
+        # Feature maps share the vocabulary of the map they are derived from
+        return TokenTable(getattr(indexMap, 'vocabulary', None), kind)
+
+    @instrumented('feature records', len)
+    def extractFeatureRecords(self, indexWordsMap, indexSentenceMap, batchSize=shardSize):
+        print("Extracting features...")
+        records = FeatureTable(self.taskThreeColumns, getattr(indexWordsMap, 'vocabulary', None))
+        records.extend(self.iterFeatureRecords(indexWordsMap, indexSentenceMap, batchSize))
+        self.printExtractionStats()
+        return records
+
+    def iterFeatureRecords(self, indexWordsMap, indexSentenceMap, batchSize=shardSize):
+        wnl = self.resources.lemmatizer
+        stemmer = self.resources.stemmer
+        for batchKeys in self.batchIndexKeys(indexWordsMap, batchSize):
+            sentences = [indexSentenceMap[k] for k in batchKeys]
+            shardKey = self.getShardKey(batchKeys, sentences)
+            words = self.runStage('words', shardKey, batchKeys, lambda: [indexWordsMap[k] for k in batchKeys])
+            headWords = self.runStage('head', shardKey, batchKeys, lambda: self.findHeadWordBatch(sentences))
+            lemmas = self.runStage('lemmas', shardKey, batchKeys, lambda: [self.lemmatizeSentence(v, wnl) for v in words])
+            stems = self.runStage('stems', shardKey, batchKeys, lambda: [self.stemSentence(v, stemmer) for v in words])
+            posTags = self.runStage('POS', shardKey, batchKeys, lambda: [self.tagPOSSentence(v) for v in words])
+            relations = [self.runStage(relation + 's', shardKey, batchKeys,
+                                       lambda relation=relation: [self.extractSentenceRelations(v, relation) for v in words])
+                         for relation in self.relations]
+            for record in zip(batchKeys, words, lemmas, stems, posTags, headWords, *relations):
+                yield record
+
+    @instrumented('improvised feature records', len)
+    def extractImprovisedFeatureRecords(self, indexWordsMap, indexSentenceMap, batchSize=shardSize):
+        print("Extracting improvised features...")
+        records = FeatureTable(self.taskFourColumns, getattr(indexWordsMap, 'vocabulary', None))
+        records.extend(self.iterImprovisedFeatureRecords(indexWordsMap, indexSentenceMap, batchSize))
+        self.printExtractionStats()
+        return records
+
+    def iterImprovisedFeatureRecords(self, indexWordsMap, indexSentenceMap, batchSize=shardSize):
+        wnl = self.resources.lemmatizer
+        stemmer = self.resources.stemmer
+        for batchKeys in self.batchIndexKeys(indexWordsMap, batchSize):
+            sentences = [indexSentenceMap[k] for k in batchKeys]
+            shardKey = self.getShardKey(batchKeys, sentences)
+            words = self.runStage('words', shardKey, batchKeys, lambda: [indexWordsMap[k] for k in batchKeys])
+            posWithWordsList = self.runStage('POSWithWords', shardKey, batchKeys, lambda: self.tagPOSBatch(words))
+            headWords = self.runStage('head', shardKey, batchKeys, lambda: self.findHeadWordBatch(sentences))
+            improvisedHeadWords = self.runStage('improvisedHead', shardKey, batchKeys, lambda: [self.improviseHeadWord(headWord) for headWord in headWords])
+            lemmas = self.runStage('improvisedLemmas', shardKey, batchKeys,
+                                   lambda: [self.improvedLemmatizeSentence(posWithWords, wnl) for posWithWords in posWithWordsList])
+            stems = self.runStage('stems', shardKey, batchKeys, lambda: [self.stemSentence(v, stemmer) for v in words])
+            relations = [self.runStage('improvised' + relation.capitalize() + 's', shardKey, batchKeys,
+                                       lambda relation=relation: [self.extractImprovisedSentenceRelations(posWithWords, relation) for posWithWords in posWithWordsList])
+                         for relation in self.relations]
+            for record in zip(batchKeys, words, lemmas, stems, posWithWordsList, improvisedHeadWords, *relations):
+                yield record
+
+    relations = ['hypernym', 'hyponym', 'meronym', 'holonym']
+
+    # Every extraction stage with its version and the stages it reads. Bump a
+    # version when that stage's logic changes: its checkpoints, and those of
+    # the stages depending on it, are then recomputed while the rest are reused
+    featureVersions = {'words': 1, 'head': 1, 'lemmas': 1, 'stems': 1, 'POS': 1,
+                       'hypernyms': 1, 'hyponyms': 1, 'meronyms': 1, 'holonyms': 1,
+                       'POSWithWords': 1, 'improvisedHead': 1, 'improvisedLemmas': 1,
+                       'improvisedHypernyms': 1, 'improvisedHyponyms': 1, 'improvisedMeronyms': 1, 'improvisedHolonyms': 1}
+    featureDependencies = {'lemmas': ['words'], 'stems': ['words'], 'POS': ['words'],
+                           'hypernyms': ['words'], 'hyponyms': ['words'], 'meronyms': ['words'], 'holonyms': ['words'],
+                           'POSWithWords': ['words'], 'improvisedHead': ['head'], 'improvisedLemmas': ['POSWithWords'],
+                           'improvisedHypernyms': ['POSWithWords'], 'improvisedHyponyms': ['POSWithWords'],
+                           'improvisedMeronyms': ['POSWithWords'], 'improvisedHolonyms': ['POSWithWords']}
+
+    def getShardKey(self, batchKeys, sentences):
+        if self.buildCheckpoint is None:
+            return None
+        return self.buildCheckpoint.getShardKey(batchKeys, sentences)
+
+    def getStageKey(self, stage):
+        version = stage + ' ' + str(self.featureVersions[stage])
+        if stage == 'head':
+            # Head words differ between the CoreNLP and heuristic parsers
+            version += ' ' + type(self.headWordParser).__name__
+        for dependency in self.featureDependencies.get(stage, []):
+            version += ' ' + self.getStageKey(dependency)
+        return self.buildCheckpoint.getStageKey(stage, version)
+
+    def runStage(self, stage, shardKey, batchKeys, compute):
+        # The words stage is checkpointed too: the word order of a sentence
+        # comes from a set, so the stages built on it must see the same order
+        if shardKey is None:
+            return compute()
+        column = 'head' if stage == 'improvisedHead' else stage
+        return self.buildCheckpoint.run(self.getStageKey(stage), shardKey, column, batchKeys, compute)
+
+    def pruneCheckpoints(self):
+        # Only after a full build: an incremental update runs the changed
+        # articles alone, and every other shard would look stale
+        if self.buildCheckpoint is not None:
+            self.buildCheckpoint.prune()
+
+    def printExtractionStats(self):
+        self.wordNetCache.printStats()
+        if self.buildCheckpoint is not None:
+            self.buildCheckpoint.printStats()
+
+    @instrumented('feature records (parallel)', len)
+    def extractFeatureRecordsInParallel(self, indexWordsMap, indexSentenceMap, workers):
+        return self.extractRecordsInParallel("2", indexWordsMap, indexSentenceMap, workers)
+
+    @instrumented('improvised feature records (parallel)', len)
+    def extractImprovisedFeatureRecordsInParallel(self, indexWordsMap, indexSentenceMap, workers):
+        return self.extractRecordsInParallel("3", indexWordsMap, indexSentenceMap, workers)
+
+    def extractRecordsInParallel(self, inputChoice, indexWordsMap, indexSentenceMap, workers):
+        print("Extracting features with", str(workers), "workers...")
+        records = FeatureTable(self.getTaskColumns(inputChoice), getattr(indexWordsMap, 'vocabulary', None))
+        pending = collections.deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(self.resources,)) as executor:
+            # Chunks are copied only when submitted, at most twice the worker
+            # count at a time, and their results are taken in submission order
+            # so the merged records keep the serial A<i>S<j> ordering. Each
+            # chunk is one checkpoint shard, as in the serial build
+            for chunk in self.splitIndexMaps(indexWordsMap, indexSentenceMap, self.shardSize):
+                if len(pending) >= 2 * workers:
+                    self.mergeChunkResult(records, pending.popleft())
+                pending.append(executor.submit(extractChunkRecords, inputChoice, chunk))
+            while len(pending) > 0:
+                self.mergeChunkResult(records, pending.popleft())
+        self.printExtractionStats()
+        return records
+
+    def mergeChunkResult(self, records, future):
+        chunkRecords, counters = future.result()
+        records.extend(chunkRecords)
+        self.resources.instrumentation.mergeCounters(counters)
+
+    def splitIndexMaps(self, indexWordsMap, indexSentenceMap, chunkSize):
+        for batchKeys in self.batchIndexKeys(indexWordsMap, chunkSize):
+            chunkWordsMap = TokenTable()
+            chunkSentenceMap = collections.OrderedDict()
+            for k in batchKeys:
+                chunkWordsMap[k] = indexWordsMap[k]
+                chunkSentenceMap[k] = indexSentenceMap[k]
+            yield chunkWordsMap, chunkSentenceMap
+
+    @instrumented('lemmatize', len)
     def lemmatizeWords(self, indexWordsMap):
         print("Lemmatizing...")
-        indexLemmaMap = collections.OrderedDict()
-        wnl = WordNetLemmatizer()
+        indexLemmaMap = self.createTokenTable(indexWordsMap)
+        wnl = self.resources.lemmatizer
         for k, v in indexWordsMap.items():
-            indexLemmaMap[k] = [wnl.lemmatize(word) for word in v]
+            indexLemmaMap[k] = self.lemmatizeSentence(v, wnl)
         return indexLemmaMap
+
+    def lemmatizeSentence(self, words, wnl):
+        return [wnl.lemmatize(word) for word in words]
     
+    @instrumented('improvised lemmatize', len)
     def improvedLemmatizeWords(self, indexPOSWithWordsMap):
         print("Improvised Lemmatizing...")
-        indexLemmaMap = collections.OrderedDict()
-        wnl = WordNetLemmatizer()
+        indexLemmaMap = self.createTokenTable(indexPOSWithWordsMap)
+        wnl = self.resources.lemmatizer
         for k, v in indexPOSWithWordsMap.items():
-            lemmasList = []
-            for word, tag in v:
-                wnTag = self.getWordnetTag(tag)
-                if wnTag is None:
-                    lemmasList.append(wnl.lemmatize(word))
-                else:
-                    lemmasList.append(wnl.lemmatize(word, pos=wnTag))
-            indexLemmaMap[k] = lemmasList
+            indexLemmaMap[k] = self.improvedLemmatizeSentence(v, wnl)
         return indexLemmaMap
+
+    def improvedLemmatizeSentence(self, posWithWords, wnl):
+        lemmasList = []
+        for word, tag in posWithWords:
+            wnTag = self.getWordnetTag(tag)
+            if wnTag is None:
+                lemmasList.append(wnl.lemmatize(word))
+            else:
+                lemmasList.append(wnl.lemmatize(word, pos=wnTag))
+        return lemmasList
     
     def getWordnetTag(self, tag):
         if tag.startswith('J'):
-            return wn.ADJ
+            return ADJ
         elif tag.startswith('V'):
-            return wn.VERB
+            return VERB
         elif tag.startswith('N'):
-            return wn.NOUN
+            return NOUN
         elif tag.startswith('R'):
-            return wn.ADV
+            return ADV
         else:
             return None
 
+    @instrumented('stem', len)
     def stemWords(self, indexWordsMap):
         print("Stemming...")
-        indexStemMap = collections.OrderedDict()
-        stemmer = PorterStemmer()
+        indexStemMap = self.createTokenTable(indexWordsMap)
+        stemmer = self.resources.stemmer
         for k, v in indexWordsMap.items():
-            indexStemMap[k] = [stemmer.stem(word) for word in v]
+            indexStemMap[k] = self.stemSentence(v, stemmer)
         return indexStemMap
 
+    def stemSentence(self, words, stemmer):
+        return [stemmer.stem(word) for word in words]
+
+    @instrumented('POS tag', len)
     def tagPOSWords(self, indexWordsMap):
         print("POS Tagging...")
-        indexPOSMap = collections.OrderedDict()
+        indexPOSMap = self.createTokenTable(indexWordsMap)
         for k, v in indexWordsMap.items():
-            posTags = []
-            for taggedWord in pos_tag(v):
-                posTags.append(taggedWord[1])
-            indexPOSMap[k] = posTags
+            indexPOSMap[k] = self.tagPOSSentence(v)
         return indexPOSMap
+
+    def tagPOSSentence(self, words):
+        posTags = []
+        for taggedWord in pos_tag(words):
+            posTags.append(taggedWord[1])
+        return posTags
     
-    def tagPOSWithWords(self, indexWordsMap):
+    @instrumented('improvised POS tag', len)
+    def tagPOSWithWords(self, indexWordsMap, batchSize=1000):
         print("Improvised POS Tagging...")
-        indexPOSWithWordsMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            indexPOSWithWordsMap[k] = pos_tag(v)
-        return indexPOSWithWordsMap
+        return TokenTable.fromItems(self.tagPOSSentences(indexWordsMap, batchSize), getattr(indexWordsMap, 'vocabulary', None), 'pairs')
+
+    def tagPOSSentences(self, indexWordsMap, batchSize=1000):
+        for batchKeys in self.batchIndexKeys(indexWordsMap, batchSize):
+            for k, posWithWords in zip(batchKeys, self.tagPOSBatch([indexWordsMap[k] for k in batchKeys])):
+                yield k, posWithWords
+
+    @instrumented('POS tag batch', len)
+    def tagPOSBatch(self, sentences):
+        return pos_tag_sents(sentences)
+
+    @instrumented('head word batch', len)
+    def findHeadWordBatch(self, sentences):
+        return self.headWordParser.findHeadWords(sentences)
+
+    def batchIndexKeys(self, indexMap, batchSize):
+        keys = list(indexMap.keys())
+        for start in range(0, len(keys), batchSize):
+            yield keys[start:start + batchSize]
 
+    @instrumented('head word', len)
     def findHeadWord(self, indexSentenceMap):
         print("Head Word Extraction...")
-        indexHeadMap = collections.OrderedDict()
-        dependency_parser = CoreNLPDependencyParser('http://localhost:9000')
-        for k, v in indexSentenceMap.items():
-            parsedSentence = list(dependency_parser.raw_parse(v))[0]
-            rootValue = list(list(parsedSentence.nodes.values())[0]['deps']['ROOT'])[0]
-            for n in parsedSentence.nodes.values():
-                if n['address'] == rootValue:
-                    indexHeadMap[k] = n['word']
-                    break
-        return indexHeadMap
+        headWords = self.findHeadWordBatch(list(indexSentenceMap.values()))
+        return TokenTable.fromItems(zip(indexSentenceMap.keys(), headWords), kind='value')
     
+    @instrumented('improvised head word', len)
     def findImprovisedHeadWord(self, indexSentenceMap):
         print("Improvised Head Word Extraction...")
-        indexHeadMap = collections.OrderedDict()
-        dependency_parser = CoreNLPDependencyParser('http://localhost:9000')
-        for k, v in indexSentenceMap.items():
-            parsedSentence = list(dependency_parser.raw_parse(v))[0]
-            rootValue = list(list(parsedSentence.nodes.values())[0]['deps']['ROOT'])[0]
-            for n in parsedSentence.nodes.values():
-                if n['address'] == rootValue:
-                    headWord = n['word']
-                    if len(headWord) > 0:
-                        _, tag = pos_tag([headWord])[0]
-                        wnTag = IndexCreation().getWordnetTag(tag)
-                        if wnTag is not None:
-                            synset = wn.synsets(headWord, pos=wnTag)
-                            if len(synset) > 0:
-                                headWord = synset[0].name().split('.')[0]
-                    indexHeadMap[k] = headWord
-                    break
-        return indexHeadMap
+        headWords = self.findHeadWordBatch(list(indexSentenceMap.values()))
+        return TokenTable.fromItems(((k, self.improviseHeadWord(headWord)) for k, headWord in zip(indexSentenceMap.keys(), headWords)), kind='value')
+
+    def improviseHeadWord(self, headWord):
+        if headWord is not None and len(headWord) > 0:
+            _, tag = pos_tag([headWord])[0]
+            wnTag = self.getWordnetTag(tag)
+            if wnTag is not None:
+                synset = self.wordNetCache.lookup(headWord, wnTag).synset
+                if synset is not None:
+                    headWord = synset
+        return headWord
 
+    @instrumented('hypernyms', len)
     def extractHypernyms(self, indexWordsMap):
         print("Hypernyms Extraction...")
-        indexHypernymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            hypernymList = []
-            for word in v:
-                synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].hypernyms()) > 0:
-                        hypernymList.append(synset[0].hypernyms()[0].name().split('.')[0])
-                else:
-                    hypernymList.append(word)
-            indexHypernymMap[k] = hypernymList
-        return indexHypernymMap
+        return self.extractRelations(indexWordsMap, 'hypernym')
     
-    def extractImprovisedHypernyms(self, indexWordsMap):
+    @instrumented('improvised hypernyms', len)
+    def extractImprovisedHypernyms(self, indexPOSWithWordsMap):
         print("Improvised Hypernyms Extraction...")
-        indexHypernymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            hypernymList = []
-            for word in v:
-                _, tag = pos_tag([word])[0]
-                wnTag = IndexCreation().getWordnetTag(tag)
-                if wnTag is not None:
-                    synset = wn.synsets(word, pos=wnTag)
-                else:
-                    synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].hypernyms()) > 0:
-                        hypernymList.append(synset[0].hypernyms()[0].name().split('.')[0])
-            indexHypernymMap[k] = hypernymList
-        return indexHypernymMap
+        return self.extractImprovisedRelations(indexPOSWithWordsMap, 'hypernym')
 
+    @instrumented('hyponyms', len)
     def extractHyponyms(self, indexWordsMap):
         print("Hyponyms Extraction...")
-        indexHyponymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            hyponymList = []
-            for word in v:
-                synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].hyponyms()) > 0:
-                        hyponymList.append(synset[0].hyponyms()[0].name().split('.')[0])
-                else:
-                    hyponymList.append(word)
-            indexHyponymMap[k] = hyponymList
-        return indexHyponymMap
+        return self.extractRelations(indexWordsMap, 'hyponym')
     
-    def extractImprovisedHyponyms(self, indexWordsMap):
+    @instrumented('improvised hyponyms', len)
+    def extractImprovisedHyponyms(self, indexPOSWithWordsMap):
         print("Improvised Hyponyms Extraction...")
-        indexHyponymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            hyponymList = []
-            for word in v:
-                _, tag = pos_tag([word])[0]
-                wnTag = IndexCreation().getWordnetTag(tag)
-                if wnTag is not None:
-                    synset = wn.synsets(word, pos=wnTag)
-                else:
-                    synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].hyponyms()) > 0:
-                        hyponymList.append(synset[0].hyponyms()[0].name().split('.')[0])
-            indexHyponymMap[k] = hyponymList
-        return indexHyponymMap
+        return self.extractImprovisedRelations(indexPOSWithWordsMap, 'hyponym')
 
+    @instrumented('meronyms', len)
     def extractMeronyms(self, indexWordsMap):
         print("Meronyms Extraction...")
-        indexMeronymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            meronymList = []
-            for word in v:
-                synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].part_meronyms()) > 0:
-                        meronymList.append(synset[0].part_meronyms()[0].name().split('.')[0])
-                else:
-                    meronymList.append(word)
-            indexMeronymMap[k] = meronymList
-        return indexMeronymMap
+        return self.extractRelations(indexWordsMap, 'meronym')
     
-    def extractImprovisedMeronyms(self, indexWordsMap):
+    @instrumented('improvised meronyms', len)
+    def extractImprovisedMeronyms(self, indexPOSWithWordsMap):
         print("Improvised Meronyms Extraction...")
-        indexMeronymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            meronymList = []
-            for word in v:
-                _, tag = pos_tag([word])[0]
-                wnTag = IndexCreation().getWordnetTag(tag)
-                if wnTag is not None:
-                    synset = wn.synsets(word, pos=wnTag)
-                else:
-                    synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].part_meronyms()) > 0:
-                        meronymList.append(synset[0].part_meronyms()[0].name().split('.')[0])
-            indexMeronymMap[k] = meronymList
-        return indexMeronymMap
+        return self.extractImprovisedRelations(indexPOSWithWordsMap, 'meronym')
 
+    @instrumented('holonyms', len)
     def extractHolonyms(self, indexWordsMap):
         print("Holonyms Extraction...")
-        indexHolonymMap = collections.OrderedDict()
-        for k, v in indexWordsMap.items():
-            holonymList = []
-            for word in v:
-                synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].part_holonyms()) > 0:
-                        holonymList.append(synset[0].part_holonyms()[0].name().split('.')[0])
-                else:
-                    holonymList.append(word)
-            indexHolonymMap[k] = holonymList
-        return indexHolonymMap
+        return self.extractRelations(indexWordsMap, 'holonym')
     
-    def extractImprovisedHolonyms(self, indexWordsMap):
+    @instrumented('improvised holonyms', len)
+    def extractImprovisedHolonyms(self, indexPOSWithWordsMap):
         print("Improvised Holonyms Extraction...")
-        indexHolonymMap = collections.OrderedDict()
+        return self.extractImprovisedRelations(indexPOSWithWordsMap, 'holonym')
+
+    def extractRelations(self, indexWordsMap, relation):
+        indexRelationMap = self.createTokenTable(indexWordsMap)
         for k, v in indexWordsMap.items():
-            holonymList = []
-            for word in v:
-                _, tag = pos_tag([word])[0]
-                wnTag = IndexCreation().getWordnetTag(tag)
-                if wnTag is not None:
-                    synset = wn.synsets(word, pos=wnTag)
-                else:
-                    synset = wn.synsets(word)
-                if len(synset) > 0:
-                    if len(synset[0].part_holonyms()) > 0:
-                        holonymList.append(synset[0].part_holonyms()[0].name().split('.')[0])
-            indexHolonymMap[k] = holonymList
-        return indexHolonymMap
+            indexRelationMap[k] = self.extractSentenceRelations(v, relation)
+        return indexRelationMap
+
+    def extractImprovisedRelations(self, indexPOSWithWordsMap, relation):
+        indexRelationMap = self.createTokenTable(indexPOSWithWordsMap)
+        for k, v in indexPOSWithWordsMap.items():
+            indexRelationMap[k] = self.extractImprovisedSentenceRelations(v, relation)
+        return indexRelationMap
+
+    def extractSentenceRelations(self, words, relation):
+        relationList = []
+        for word in words:
+            entry = self.wordNetCache.lookup(word)
+            if entry.synset is not None:
+                related = getattr(entry, relation)
+                if related is not None:
+                    relationList.append(related)
+            else:
+                relationList.append(word)
+        return relationList
+
+    def extractImprovisedSentenceRelations(self, posWithWords, relation):
+        relationList = []
+        for word, tag in posWithWords:
+            related = getattr(self.wordNetCache.lookup(word, self.getWordnetTag(tag)), relation)
+            if related is not None:
+                relationList.append(related)
+        return relationList
     
     # New Features
     def getWordnetTagLesk(self, tag):
@@ -363,26 +599,59 @@ class IndexCreation():
 #             indexWSDMap[k] = wsd    
 #         return indexWSDMap
 
-    def indexFeaturesWithSolr(self, jsonFileName, inputChoice):
-        print("Indexing...")
-        solr = pysolr.Solr('http://localhost:8983/solr/task' + str(int(inputChoice) + 1))
-        solr.delete(q='*:*')
-        with open("/Users/deepaks/Documents/workspace/Semantic_Search_Engine/pkg/" + jsonFileName, 'rb') as jsonFile:
-            entry = json.load(jsonFile)
-        solr.add(entry)
+    @instrumented('index with Solr')
+    def indexFeaturesWithSolr(self, jsonFileName, inputChoice, batchSize=1000, workers=4):
+        # jsonFileName is the file the extraction wrote; the Solr URL comes
+        # from the resources. The bulk indexer reads the feature store when it
+        # is current, deletes and adds without committing and commits once at
+        # the end, so searches keep the previous index until the build is done
+        core = 'task' + str(int(inputChoice) + 1)
+        indexer = SolrBulkIndexer(self.resources.solrUrl + core, batchSize, workers, self.resources.timeout, self.resources.indexVersion)
+        return indexer.index(jsonFileName)
+
+    @instrumented('compressed index')
+    def writeCompressedIndex(self, jsonFileName, indexSentenceMap):
+        indexFileName = os.path.splitext(jsonFileName)[0] + '.idx'
+        records = self.iterIndexRecords(jsonFileName)
+        index = CompressedIndex.write(indexFileName, records, indexSentenceMap)
+        self.resources.indexVersion.bump(os.path.splitext(os.path.basename(jsonFileName))[0].lower())
+        return index
+
+    @instrumented('vector index')
+    def writeVectorIndex(self, sentenceItems, fileName='SentenceVectors'):
+        vectorIndex = VectorIndex(fileName).build(sentenceItems).buildIVF().write()
+        self.resources.indexVersion.bump('vectors')
+        return vectorIndex
 
 
 if __name__ == '__main__':
-    ic = IndexCreation()
     path = '/Users/deepaks/Documents/workspace/Semantic_Search_Engine/Data/'
     inputChoice = input("Enter the option to continue with\n 1. Task2 \n 2. Task3\n 3. Task4\n ") 
-    data, indexWordsMap, indexSentenceMap, wordsDFrame, jsonFileName = ic.preprocessCorpus(path)
-    if inputChoice == "1":
-        ic.indexFeaturesWithSolr(jsonFileName, inputChoice)
-    elif inputChoice == "2":
-        jsonFileName = ic.extractFeatures(indexWordsMap, indexSentenceMap)
+    modeChoice = input("Enter the indexing mode\n 1. Full rebuild\n 2. Incremental update\n 3. Streaming rebuild\n ")
+    profileChoice = input("Capture a cProfile of the run? (y/n) ")
+    # Interrupted builds pick up the finished shards from Checkpoints/
+    ic = IndexCreation(resources=NLPResources(instrumentation=Instrumentation(profile=profileChoice == "y"), buildCheckpoint=BuildCheckpoint()))
+    if modeChoice == "2":
+        IncrementalIndexer(ic, inputChoice).update(path)
+    elif modeChoice == "3":
+        jsonFileName = ic.streamFeatures(path, inputChoice, sentenceStore=SentenceStore())
         ic.indexFeaturesWithSolr(jsonFileName, inputChoice)
-    elif inputChoice == "3":
-        jsonFileName = ic.extractImprovisedFeatures(indexWordsMap, indexSentenceMap)
-        ic.indexFeaturesWithSolr(jsonFileName, inputChoice)
-    
+        ic.writeVectorIndex(SentenceStore().items())
+    else:
+        data, indexWordsMap, indexSentenceMap, wordsDFrame, jsonFileName = ic.preprocessCorpus(path)
+        SentenceStore().save(indexSentenceMap)
+        if inputChoice == "1":
+            ic.indexFeaturesWithSolr(jsonFileName, inputChoice)
+        elif inputChoice == "2":
+            ic.buildWordNetTable(indexWordsMap)
+            jsonFileName = ic.extractFeatures(indexWordsMap, indexSentenceMap, workers=os.cpu_count())
+            ic.indexFeaturesWithSolr(jsonFileName, inputChoice)
+        elif inputChoice == "3":
+            ic.buildWordNetTable(indexWordsMap)
+            jsonFileName = ic.extractImprovisedFeatures(indexWordsMap, indexSentenceMap, workers=os.cpu_count())
+            ic.indexFeaturesWithSolr(jsonFileName, inputChoice)
+        ic.writeCompressedIndex(jsonFileName, indexSentenceMap)
+        ic.writeVectorIndex(indexSentenceMap.items())
+        IncrementalIndexer(ic, inputChoice).saveManifest(path, data)
+    ic.resources.instrumentation.printReport()
+    ic.resources.instrumentation.writeReport('IndexingReport.json')
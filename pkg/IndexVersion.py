@@ -0,0 +1,46 @@
+import json
+import os
+import time
+
+
+class IndexVersion:
+
+    # A small JSON file mapping each core to the time it was last rebuilt or
+    # updated. Indexing bumps it, and search processes compare it with the
+    # version they cached results against
+    def __init__(self, fileName='IndexVersion.json', checkInterval=1.0):
+        self.fileName = fileName
+        self.checkInterval = checkInterval
+        self.versions = {}
+        self.modified = None
+        self.checked = 0.0
+
+    def load(self):
+        try:
+            modified = os.path.getmtime(self.fileName)
+        except OSError:
+            return {}
+        if modified != self.modified:
+            with open(self.fileName, 'r') as versionFile:
+                self.versions = json.load(versionFile)
+            self.modified = modified
+        return self.versions
+
+    def get(self, core):
+        # The file is stat'ed at most once per checkInterval seconds
+        now = time.monotonic()
+        if now - self.checked >= self.checkInterval:
+            self.load()
+            self.checked = now
+        return self.versions.get(core)
+
+    def bump(self, core):
+        versions = dict(self.load())
+        versions[core] = time.time()
+        temporaryFileName = self.fileName + '.tmp'
+        with open(temporaryFileName, 'w') as versionFile:
+            json.dump(versions, versionFile, indent=1, sort_keys=True)
+        os.replace(temporaryFileName, self.fileName)
+        self.versions = versions
+        self.modified = os.path.getmtime(self.fileName)
+        return versions[core]
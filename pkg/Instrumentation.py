@@ -0,0 +1,138 @@
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+
+
+def instrumented(stageName, countItems=None):
+    # Decorates a method of an object with a resources.instrumentation, timing
+    # every call as stageName. countItems maps the result to the number of
+    # items processed (sentences, words...), otherwise each call is one item
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.resources.instrumentation.stage(stageName) as stage:
+                result = method(self, *args, **kwargs)
+                stage.items = countItems(result) if countItems is not None else 1
+            return result
+        return wrapper
+    return decorator
+
+
+class Instrumentation:
+
+    class Stage:
+
+        def __init__(self):
+            self.items = 0
+
+    def __init__(self, profile=False, profileRows=30):
+        self.profileRows = profileRows
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.caches = {}
+        self.started = time.time()
+        self.profiler = cProfile.Profile() if profile else None
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def __getstate__(self):
+        # Process-pool workers get an empty, unprofiled copy watching the same
+        # caches; they send their counts back with takeCounters, and the
+        # parent adds them up with mergeCounters
+        return {'profileRows': self.profileRows, 'caches': self.caches}
+
+    def __setstate__(self, state):
+        self.__init__(False, state['profileRows'])
+        self.caches = state['caches']
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stage = self.Stage()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            self.record(name, time.perf_counter() - start, stage.items)
+
+    def record(self, name, seconds, items=1):
+        with self.lock:
+            stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'items': 0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['items'] += items
+
+    def getStageSeconds(self):
+        with self.lock:
+            return {name: stats['seconds'] for name, stats in self.stages.items()}
+
+    def addCache(self, name, cache):
+        # cache only needs a getStats() returning a JSON-serialisable dict;
+        # with takeCounters() and mergeCounters() too, the counts of
+        # process-pool workers are merged back
+        self.caches[name] = cache
+
+    def takeCounters(self):
+        # Stage timings and cache counters since the last call, which are reset
+        with self.lock:
+            stages = self.stages
+            self.stages = {}
+        return {'stages': stages,
+                'caches': {name: cache.takeCounters() for name, cache in self.caches.items() if hasattr(cache, 'takeCounters')}}
+
+    def mergeCounters(self, counters):
+        with self.lock:
+            for name, stats in counters['stages'].items():
+                merged = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'items': 0})
+                for key in merged:
+                    merged[key] += stats[key]
+        for name, cacheCounters in counters['caches'].items():
+            if name in self.caches:
+                self.caches[name].mergeCounters(cacheCounters)
+
+    def getProfile(self):
+        if self.profiler is None:
+            return None
+        self.profiler.disable()
+        stats = pstats.Stats(self.profiler, stream=io.StringIO()).sort_stats('cumulative')
+        rows = []
+        for (fileName, line, function) in stats.fcn_list[:self.profileRows]:
+            primitiveCalls, calls, totalSeconds, cumulativeSeconds, _ = stats.stats[(fileName, line, function)]
+            rows.append({'function': fileName + ':' + str(line) + '(' + function + ')', 'calls': calls,
+                         'totalSeconds': totalSeconds, 'cumulativeSeconds': cumulativeSeconds})
+        self.profiler.enable()
+        return rows
+
+    def report(self):
+        with self.lock:
+            stages = {}
+            for name, stats in self.stages.items():
+                stages[name] = dict(stats)
+                stages[name]['itemsPerSecond'] = stats['items'] / stats['seconds'] if stats['seconds'] > 0 else None
+        return {'started': self.started,
+                'wallSeconds': time.time() - self.started,
+                'stages': stages,
+                'caches': {name: cache.getStats() for name, cache in self.caches.items()},
+                'profile': self.getProfile()}
+
+    def writeReport(self, reportFileName):
+        report = self.report()
+        with open(reportFileName, 'w') as reportFile:
+            json.dump(report, reportFile, indent=1, sort_keys=True)
+        if self.profiler is not None:
+            self.profiler.dump_stats(reportFileName.rsplit('.', 1)[0] + '.prof')
+        print("Instrumentation report written to", reportFileName)
+        return report
+
+    def printReport(self):
+        report = self.report()
+        print("Stage".ljust(36), "calls".rjust(8), "seconds".rjust(10), "items".rjust(10), "items/s".rjust(12))
+        for name, stats in sorted(report['stages'].items(), key=lambda item: -item[1]['seconds']):
+            print(name.ljust(36), str(stats['calls']).rjust(8), ("%.3f" % stats['seconds']).rjust(10), str(stats['items']).rjust(10),
+                  ("%.1f" % stats['itemsPerSecond'] if stats['itemsPerSecond'] is not None else "-").rjust(12))
+        for name, stats in report['caches'].items():
+            print(name, "cache:", json.dumps(stats))
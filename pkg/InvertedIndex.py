@@ -0,0 +1,150 @@
+import collections
+import io
+import json
+import math
+import re
+
+import numpy as np
+
+
+class InvertedIndex:
+
+    tokenPattern = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, k1=1.2, b=0.75, denseFraction=0.125):
+        self.k1 = k1
+        self.b = b
+        self.denseFraction = denseFraction
+        self.docIds = []
+        # field -> term -> (int32 doc numbers, float32 BM25 term-frequency
+        # impacts, document frequency). Terms found in more than denseFraction
+        # of the documents keep a dense impact row instead (doc numbers None),
+        # which is cheaper to add than scattering a near-full posting list
+        self.postings = {}
+
+    @classmethod
+    def fromJson(cls, jsonFileName, **kwargs):
+        index = cls(**kwargs)
+        index.build(index.iterJsonRecords(jsonFileName))
+        return index
+
+    @staticmethod
+    def iterJsonRecords(jsonFileName):
+        with io.open(jsonFileName, 'r', encoding='utf-8') as jsonFile:
+            if jsonFileName.endswith('.jsonl'):
+                for line in jsonFile:
+                    if len(line.strip()) > 0:
+                        yield json.loads(line)
+            else:
+                for record in json.load(jsonFile):
+                    yield record
+
+    def tokenize(self, value):
+        # Flattens lists such as POSWithWords pairs and lowercases, roughly
+        # what Solr's standard text analysis does to the same JSON fields
+        if value is None:
+            return []
+        if isinstance(value, (list, tuple)):
+            tokens = []
+            for item in value:
+                tokens.extend(self.tokenize(item))
+            return tokens
+        return [token.lower() for token in self.tokenPattern.findall(str(value))]
+
+    def countTerms(self, records):
+        # Returns the document ids, field -> term -> [(doc number, term count)]
+        # and field -> per-document field lengths
+        docIds = []
+        fieldPostings = collections.defaultdict(lambda: collections.defaultdict(list))
+        fieldLengths = collections.defaultdict(list)
+        for docNumber, record in enumerate(records):
+            docIds.append(record['id'])
+            for field, value in record.items():
+                if field == 'id':
+                    continue
+                termCounts = collections.Counter(self.tokenize(value))
+                lengths = fieldLengths[field]
+                lengths.extend([0] * (docNumber + 1 - len(lengths)))
+                lengths[docNumber] = sum(termCounts.values())
+                for term, count in termCounts.items():
+                    fieldPostings[field][term].append((docNumber, count))
+        for lengths in fieldLengths.values():
+            lengths.extend([0] * (len(docIds) - len(lengths)))
+        return docIds, fieldPostings, fieldLengths
+
+    def getNorms(self, lengths):
+        lengths = np.asarray(lengths, dtype=np.float32)
+        averageLength = max(float(lengths.mean()), 1e-9) if len(lengths) > 0 else 1e-9
+        return self.k1 * (1 - self.b + self.b * lengths / averageLength)
+
+    def getImpacts(self, counts, norms):
+        return counts * (self.k1 + 1) / (counts + norms)
+
+    def build(self, records):
+        print("Building in-process index...")
+        self.docIds, fieldPostings, fieldLengths = self.countTerms(records)
+        documents = len(self.docIds)
+        for field, termPostings in fieldPostings.items():
+            norms = self.getNorms(fieldLengths[field])
+            for term, docs in termPostings.items():
+                docNumbers = np.array([doc for doc, _ in docs], dtype=np.int32)
+                counts = np.array([count for _, count in docs], dtype=np.float32)
+                self.addPostings(field, term, docNumbers, self.getImpacts(counts, norms[docNumbers]))
+        print("Indexed", str(documents), "documents")
+        return self
+
+    def addPostings(self, field, term, docNumbers, impacts):
+        documents = self.getDocumentCount()
+        if len(docNumbers) > self.denseFraction * documents:
+            denseImpacts = np.zeros(documents, dtype=np.float32)
+            denseImpacts[docNumbers] = impacts
+            self.postings.setdefault(field, {})[term] = (None, denseImpacts, len(docNumbers))
+        else:
+            self.postings.setdefault(field, {})[term] = (docNumbers, impacts, len(docNumbers))
+
+    def getDocumentCount(self):
+        return len(self.docIds)
+
+    def getDocId(self, docNumber):
+        return self.docIds[docNumber]
+
+    def getIdf(self, documentFrequency):
+        return math.log(1 + (self.getDocumentCount() - documentFrequency + 0.5) / (documentFrequency + 0.5))
+
+    def getPostings(self, field, term):
+        fieldPostings = self.postings.get(field)
+        if fieldPostings is None:
+            return None
+        return fieldPostings.get(term)
+
+    def search(self, clauses, rows=10):
+        # clauses are (field, terms, boost) triples OR-ed together, matching the
+        # field:(t1 t2)^boost || ... queries sent to Solr. Repeated terms are
+        # folded into one weight so every posting list is scanned once
+        weights = collections.Counter()
+        for field, terms, boost in clauses:
+            for term in self.tokenize(terms):
+                weights[(field, term)] += boost if boost is not None else 1.0
+        scores = np.zeros(self.getDocumentCount(), dtype=np.float32)
+        for (field, term), weight in weights.items():
+            postings = self.getPostings(field, term)
+            if postings is None:
+                continue
+            docNumbers, impacts, documentFrequency = postings
+            termWeight = np.float32(weight * self.getIdf(documentFrequency))
+            if docNumbers is None:
+                scores += termWeight * impacts
+            else:
+                scores[docNumbers] += termWeight * impacts
+        # Partitioning the whole score array is cheaper than first finding the
+        # matching documents: with a dense term nearly every document matches.
+        # Every document tied with the last one kept is a candidate, so ties
+        # always go to the lowest document numbers. BM25 idf and impacts are
+        # always positive, so any match scores above zero
+        if len(scores) > rows:
+            threshold = max(scores[np.argpartition(scores, len(scores) - rows)[len(scores) - rows:]].min(), np.float32(1e-30))
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.flatnonzero(scores)
+        ranked = sorted(candidates, key=lambda doc: (-scores[doc], doc))[:rows]
+        return [(self.getDocId(doc), float(scores[doc])) for doc in ranked]
@@ -0,0 +1,73 @@
+import threading
+
+from nltk.stem import WordNetLemmatizer
+from nltk.stem.porter import PorterStemmer
+import pysolr
+import requests
+
+from pkg.HeadWordParser import CoreNLPHeadWordParser
+from pkg.IndexVersion import IndexVersion
+from pkg.Instrumentation import Instrumentation
+from pkg.WordNetCache import WordNetCache
+
+
+class NLPResources:
+
+    def __init__(self, wordNetCache=None, headWordParser=None, solrUrl='http://localhost:8983/solr/', poolSize=10, timeout=60,
+                 instrumentation=None, indexVersion=None, buildCheckpoint=None):
+        self.wordNetCache = wordNetCache if wordNetCache is not None else WordNetCache()
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.instrumentation.addCache('WordNet', self.wordNetCache)
+        # The CoreNLP parser keeps its own CoreNLPDependencyParser and session
+        self.headWordParser = headWordParser if headWordParser is not None else CoreNLPHeadWordParser()
+        self.lemmatizer = WordNetLemmatizer()
+        self.stemmer = PorterStemmer()
+        self.indexVersion = indexVersion if indexVersion is not None else IndexVersion()
+        # Feature extraction only checkpoints its stages when given a BuildCheckpoint
+        self.buildCheckpoint = buildCheckpoint
+        if buildCheckpoint is not None:
+            self.instrumentation.addCache('Build checkpoints', buildCheckpoint)
+        self.solrUrl = solrUrl
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.session = None
+        self.solrClients = {}
+
+    def __getstate__(self):
+        # Sessions and locks stay with the process that created them;
+        # process-pool workers open their own on first use
+        state = self.__dict__.copy()
+        del state['lock']
+        state['session'] = None
+        state['solrClients'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def getSession(self):
+        with self.lock:
+            if self.session is None:
+                self.session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.poolSize)
+                self.session.mount('http://', adapter)
+                self.session.mount('https://', adapter)
+            return self.session
+
+    def getSolrClient(self, core):
+        # One keep-alive session is shared by every core so repeated queries
+        # and index updates reuse their connections
+        session = self.getSession()
+        with self.lock:
+            if core not in self.solrClients:
+                self.solrClients[core] = pysolr.Solr(self.solrUrl + core, timeout=self.timeout, session=session)
+            return self.solrClients[core]
+
+    def close(self):
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
+            self.session = None
+            self.solrClients = {}
@@ -0,0 +1,79 @@
+import collections
+import threading
+import time
+
+
+class QueryCache:
+
+    def __init__(self, maxSize=10000, ttl=3600):
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # key -> (expiry time, value), least recently used first
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __getstate__(self):
+        return {'maxSize': self.maxSize, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxSize'], state['ttl'])
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.maxSize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl if self.ttl is not None else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, matches=None):
+        # Drops every entry, or only those whose key satisfies matches
+        with self.lock:
+            if matches is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if matches(key)]:
+                    del self.entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.expirations = self.evictions = self.invalidations = 0
+
+    def getStats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'expirations': self.expirations,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'size': len(self.entries),
+                    'hitRate': self.hits / lookups if lookups > 0 else 0.0}
+
+    def printStats(self, name="Query"):
+        stats = self.getStats()
+        print(name, "cache: hits", str(stats['hits']), "misses", str(stats['misses']),
+              "size", str(stats['size']), "hit rate %.2f%%" % (100 * stats['hitRate']))
@@ -0,0 +1,140 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+import time
+
+from pkg.HeadWordParser import HeadWordParser
+from pkg.SemanticSearchEngine import SemanticSearchEngine
+from pkg.WordNetCache import WordNetCache
+
+# Engine owned by each feature extraction worker process, built once by
+# initWorker so the tagger, WordNet and the head word parser stay warm
+workerEngine = None
+workerWarmUpBarrier = None
+
+
+def initWorker(headWordBackend, headWordTimeout, warmUpBarrier):
+    global workerEngine, workerWarmUpBarrier
+    # Workers keep no query cache of their own: the server process caches
+    # the features and drops them when an index is rebuilt
+    workerEngine = SemanticSearchEngine(WordNetCache(tableFileName='WordNet.sst'), HeadWordParser.create(headWordBackend),
+                                        concurrentFeatures=True, headWordTimeout=headWordTimeout, queryCacheSize=0)
+    # One query down the whole Task 4 path loads the tagger, WordNet and the
+    # head word parser, CoreNLP session included
+    workerEngine.computeQueryFeatures("3", 'Warm up the feature extraction worker.')
+    workerWarmUpBarrier = warmUpBarrier
+
+
+def waitForWorkers(timeout):
+    # Holds the worker until every worker is in this call, so each process
+    # takes exactly one and has finished its initializer
+    workerWarmUpBarrier.wait(timeout)
+    return os.getpid()
+
+
+def extractQueryFeatures(inputChoice, query):
+    return workerEngine.computeQueryFeatures(inputChoice, query)
+
+
+class QueryServer:
+
+    # Line protocol: every request is one JSON object per line,
+    #   {"task": "1" | "2" | "3", "query": "...", "rows": 10}
+    # answered by one JSON line with the ids, sentences and server-side time
+    def __init__(self, path, host='localhost', port=8990, workers=None, backend='solr', headWordBackend='corenlp', headWordTimeout=2.0,
+                 warmUpTimeout=300):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.headWordBackend = headWordBackend
+        self.headWordTimeout = headWordTimeout
+        self.warmUpTimeout = warmUpTimeout
+        self.sse = SemanticSearchEngine(headWordParser=HeadWordParser.create(headWordBackend), backend=backend)
+        self.sentenceMap = None
+        self.featurePool = None
+        self.searchPool = None
+
+    def start(self):
+        print("Loading sentence map...")
+        self.sentenceMap = self.sse.loadSentenceMap(self.path, 'task4')
+        if self.sse.backend == 'native':
+            self.sse.loadNativeIndexes()
+        print("Starting", str(self.workers), "feature extraction workers...")
+        warmUpBarrier = multiprocessing.Barrier(self.workers)
+        self.featurePool = ProcessPoolExecutor(self.workers, initializer=initWorker,
+                                               initargs=(self.headWordBackend, self.headWordTimeout, warmUpBarrier))
+        # Returns once every worker process has run its initializer, warm-up
+        # query included, and reported its pid, before the first query arrives
+        workerIds = set(self.featurePool.map(waitForWorkers, [self.warmUpTimeout] * self.workers))
+        print(str(len(workerIds)), "feature extraction workers warmed up")
+        self.searchPool = ThreadPoolExecutor(self.workers)
+
+    def stop(self):
+        if self.featurePool is not None:
+            self.featurePool.shutdown()
+        if self.searchPool is not None:
+            self.searchPool.shutdown()
+
+    def getSentence(self, core, docId):
+        if self.sentenceMap is not None:
+            return self.sentenceMap.get(docId)
+        return self.sse.getNativeIndex(core).getSentence(docId)
+
+    async def handleRequest(self, request):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        inputChoice = str(request.get('task', "3"))
+        # Repeated queries skip the worker round-trip entirely
+        features = self.sse.lookupQueryFeatures(inputChoice, request['query'])
+        if features is None:
+            features, complete = await loop.run_in_executor(self.featurePool, extractQueryFeatures, inputChoice, request['query'])
+            if complete:
+                self.sse.storeQueryFeatures(inputChoice, request['query'], features)
+        core, clauses, joinedQuery = self.sse.buildQuery(inputChoice, features)
+        ids = await loop.run_in_executor(self.searchPool, self.sse.search, core, clauses, joinedQuery, int(request.get('rows', 10)))
+        return {'ids': ids,
+                'sentences': [self.getSentence(core, docId) for docId in ids],
+                'ms': 1000 * (time.perf_counter() - start)}
+
+    async def handleClient(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if len(line.strip()) == 0:
+                    continue
+                try:
+                    response = await self.handleRequest(json.loads(line))
+                except Exception as e:
+                    response = {'error': type(e).__name__ + ": " + str(e)}
+                writer.write((json.dumps(response) + '\n').encode('utf-8'))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handleClient, self.host, self.port)
+        print("Serving queries on", self.host + ":" + str(self.port))
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        self.start()
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            self.sse.featureCache.printStats("Query features")
+            self.sse.resultCache.printStats("Query results")
+
+
+if __name__ == '__main__':
+    path = '/Users/deepaks/Documents/workspace/Semantic_Search_Engine/Data/'
+    backendChoice = input("Enter the search backend\n 1. Solr\n 2. In-process index\n ")
+    QueryServer(path, backend='native' if backendChoice == "2" else 'solr').run()
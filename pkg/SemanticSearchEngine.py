@@ -1,111 +1,137 @@
 import collections
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import io
+import json
 import os
+import threading
+import time
 
 from nltk import pos_tag
+from nltk import pos_tag_sents
 from nltk.corpus import wordnet as wn
-from nltk.parse.corenlp import CoreNLPDependencyParser
-from nltk.stem import WordNetLemmatizer
-from nltk.stem.porter import PorterStemmer
 from nltk.tokenize import word_tokenize
-import pysolr
 
+from pkg.CompressedIndex import CompressedIndex
 from pkg.IndexCreation import IndexCreation
+from pkg.Instrumentation import instrumented
+from pkg.InvertedIndex import InvertedIndex
+from pkg.NLPResources import NLPResources
+from pkg.QueryCache import QueryCache
+from pkg.SentenceStore import SentenceStore
+from pkg.VectorIndex import VectorIndex
+from pkg.WordNetCache import WordNetCache
 
 
 class SemanticSearchEngine:
+
+    taskThreeFields = ['words', 'lemmas', 'stems', 'POS', 'head', 'hypernyms', 'hyponyms', 'meronyms', 'holonyms']
+    taskFourFields = ['words', 'lemmas', 'stems', 'POSWithWords', 'head', 'hypernyms', 'hyponyms', 'meronyms', 'holonyms']
+    taskFourBoosts = [1.0, 10.0, 6.0, 1.0, 1.0, 7.0, 1.0, 1.0, 1.0]
+    nativeIndexFiles = {'task2': 'Task2.json', 'task3': 'Task3.json', 'task4': 'Task4.json'}
+    vectorIndexFile = 'SentenceVectors'
+
+    def __init__(self, wordNetCache=None, headWordParser=None, backend='solr', sentenceStore=None, resources=None,
+                 concurrentFeatures=False, headWordTimeout=None, queryCacheSize=10000, queryCacheTTL=3600):
+        self.backend = backend
+        self.concurrentFeatures = concurrentFeatures
+        self.headWordTimeout = headWordTimeout
+        self.featureExecutor = None
+        self.nltkLoaded = False
+        self.nltkLoadLock = threading.Lock()
+        self.sentenceStore = sentenceStore if sentenceStore is not None else SentenceStore()
+        self.nativeIndexes = {}
+        self.nativeIndexLock = threading.Lock()
+        if resources is None:
+            resources = NLPResources(wordNetCache if wordNetCache is not None else WordNetCache(tableFileName='WordNet.sst'), headWordParser)
+        self.resources = resources
+        self.wordNetCache = self.resources.wordNetCache
+        self.headWordParser = self.resources.headWordParser
+        self.indexCreation = IndexCreation(resources=self.resources)
+        # Two levels: normalized query -> featuresList, and generated query ->
+        # top ids. Both are dropped when the index version of a core changes
+        self.featureCache = QueryCache(queryCacheSize, queryCacheTTL)
+        self.resultCache = QueryCache(queryCacheSize, queryCacheTTL)
+        self.cachedIndexVersions = {}
+        self.resources.instrumentation.addCache('query features', self.featureCache)
+        self.resources.instrumentation.addCache('query results', self.resultCache)
     
+    @instrumented('article and word count', len)
     def getArticleAndWordCount(self, path):
         print("Number of articles:", str(len(os.listdir(path))))
         indexSentenceMap = collections.OrderedDict()
         wordCount = 0
-        ic = IndexCreation()
-        data = ic.readArticles(path)
-        data = ic.removeArticleTitle(data)
+        data = self.indexCreation.readArticles(path)
+        data = self.indexCreation.removeArticleTitle(data)
+        articleIds = self.indexCreation.listArticleIds(path)
         for i in range(0, len(data)):
             for j in range(0, len(data[i])):
                 tokenizedWords = word_tokenize(data[i][j])
-                index = 'A' + str(i + 1) + 'S' + str(j + 1)
+                index = 'A' + str(articleIds[i]) + 'S' + str(j + 1)
                 indexSentenceMap[index] = data[i][j]
                 wordCount += len(tokenizedWords)
         print("Number of words in the corpus:", str(wordCount))
         return indexSentenceMap
+    
+    @instrumented('load sentence map')
+    def loadSentenceMap(self, path, core):
+        # The sentence store and the compressed index are written at indexing
+        # time, so the corpus is only re-read and tokenized when neither exists
+        if self.sentenceStore.exists():
+            self.sentenceStore.printStats()
+            return self.sentenceStore
+        if self.backend == 'native' and self.hasCompressedIndex(core):
+            return None
+        return self.getArticleAndWordCount(path)
 
+    @instrumented('query tokenize')
     def processQueryToExtractWords(self, query):
         return list(set(word_tokenize(query)))
     
     def searchInSolr(self, query, indexSentenceMap):
-        solr = pysolr.Solr('http://localhost:8983/solr/task2')
-        query = "words:" + " || words:".join(query)
-        print("Joined Query: ", query)
-        results = solr.search(query)
-        print()
-        print("Top 10 documents that closely match the query")
-        for result in results:
-            print(result['id'].ljust(10), indexSentenceMap[result['id']])
+        core, clauses, joinedQuery = self.buildQuery("1", query)
+        print("Joined Query: ", joinedQuery)
+        return self.searchAndPrint(core, clauses, joinedQuery, indexSentenceMap)
     
+    @instrumented('query lemmatize')
     def processQueryToDoLemmatization(self, words):
         lemmas = []
-        wnl = WordNetLemmatizer()
         for word in words:
-            lemmas.append(wnl.lemmatize(word))
+            lemmas.append(self.wordNetCache.lemmatize(word))
         return lemmas
     
+    @instrumented('query improvised lemmatize')
     def processQueryToDoImprovedLemmatization(self, posTags):
         lemmas = []
-        wnl = WordNetLemmatizer()
-        ic = IndexCreation()
         for word, tag in posTags:
-            wnTag = ic.getWordnetTag(tag)
-            if wnTag is None:
-                lemmas.append(wnl.lemmatize(word))
-            else:
-                lemmas.append(wnl.lemmatize(word, pos=wnTag))
+            lemmas.append(self.wordNetCache.lemmatize(word, self.indexCreation.getWordnetTag(tag)))
         return lemmas
     
+    @instrumented('query stem')
     def processQueryToDoStemming(self, words):
         stems = []
-        stemmer = PorterStemmer()
+        stemmer = self.resources.stemmer
         for word in words:
             stems.append(stemmer.stem(word))
         return stems
     
+    @instrumented('query POS tag')
     def processQueryToDoPOSTagging(self, words):
         posTags = []
         for taggedWord in pos_tag(words):
             posTags.append(taggedWord[1])
         return posTags
     
+    @instrumented('query POS tag')
     def processQueryToDoPOSTaggingWithWords(self, words):
         return pos_tag(words)
     
+    @instrumented('query head word')
     def processQueryToExtractHeadWord(self, query):
-        dependency_parser = CoreNLPDependencyParser('http://localhost:9000')
-        headWord = None
-        parsedSentence = list(dependency_parser.raw_parse(query))[0]
-        rootValue = list(list(parsedSentence.nodes.values())[0]['deps']['ROOT'])[0]
-        for n in parsedSentence.nodes.values():
-            if n['address'] == rootValue:
-                headWord = n['word']
-                break
-        return headWord 
+        return self.headWordParser.findHeadWord(query)
     
+    @instrumented('query improvised head word')
     def processQueryToExtractImprovisedHeadWord(self, query):
-        dependency_parser = CoreNLPDependencyParser('http://localhost:9000')
-        headWord = None
-        parsedSentence = list(dependency_parser.raw_parse(query))[0]
-        rootValue = list(list(parsedSentence.nodes.values())[0]['deps']['ROOT'])[0]
-        for n in parsedSentence.nodes.values():
-            if n['address'] == rootValue:
-                headWord = n['word']
-                if len(headWord):
-                    _, tag = pos_tag([headWord])[0]
-                    wnTag = IndexCreation().getWordnetTag(tag)
-                    if wnTag is not None:
-                        synset = wn.synsets(headWord, pos=wnTag)
-                        if len(synset) > 0:
-                            headWord = synset[0].name().split('.')[0]
-                break
-        return headWord
+        return self.indexCreation.improviseHeadWord(self.headWordParser.findHeadWord(query))
     
 #     def processQueryToExtractHeadWordWSD(self, query, headWord):
 #         _, tag = pos_tag([headWord])[0]
@@ -116,100 +142,50 @@ class SemanticSearchEngine:
 #         return wsd
     
     def processQueryToExtractHypernyms(self, words):
-        hypernyms = []
-        for word in words:
-            synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].hypernyms()) > 0:
-                    hypernyms.append(synset[0].hypernyms()[0].name().split('.')[0])
-                else:
-                    hypernyms.append(word)
-        return hypernyms
+        return self.processQueryToExtractRelations(words, 'hypernym')
     
     def processQueryToExtractImprovisedHypernyms(self, posTags):
-        hypernyms = []
-        for word, tag in posTags:
-            wnTag = IndexCreation().getWordnetTag(tag)
-            if wnTag is not None:
-                synset = wn.synsets(word, pos=wnTag)
-            else:
-                synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].hypernyms()) > 0:
-                    hypernyms.append(synset[0].hypernyms()[0].name().split('.')[0])
-        return hypernyms
+        return self.processQueryToExtractImprovisedRelations(posTags, 'hypernym')
     
     def processQueryToExtractHyponyms(self, words):
-        hyponyms = []
-        for word in words:
-            synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].hyponyms()) > 0:
-                    hyponyms.append(synset[0].hyponyms()[0].name().split('.')[0])
-                else:
-                    hyponyms.append(word)
-        return hyponyms
+        return self.processQueryToExtractRelations(words, 'hyponym')
     
     def processQueryToExtractImprovisedHyponyms(self, posTags):
-        hyponyms = []
-        for word, tag in posTags:
-            wnTag = IndexCreation().getWordnetTag(tag)
-            if wnTag is not None:
-                synset = wn.synsets(word, pos=wnTag)
-            else:
-                synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].hyponyms()) > 0:
-                    hyponyms.append(synset[0].hyponyms()[0].name().split('.')[0])
-        return hyponyms
+        return self.processQueryToExtractImprovisedRelations(posTags, 'hyponym')
     
     def processQueryToExtractMeronyms(self, words):
-        meronyms = []
-        for word in words:
-            synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].part_meronyms()) > 0:
-                    meronyms.append(synset[0].part_meronyms()[0].name().split('.')[0])
-                else:
-                    meronyms.append(word)
-        return meronyms
+        return self.processQueryToExtractRelations(words, 'meronym')
     
     def processQueryToExtractImprovisedMeronyms(self, posTags):
-        meronyms = []
-        for word, tag in posTags:
-            wnTag = IndexCreation().getWordnetTag(tag)
-            if wnTag is not None:
-                synset = wn.synsets(word, pos=wnTag)
-            else:
-                synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].part_meronyms()) > 0:
-                    meronyms.append(synset[0].part_meronyms()[0].name().split('.')[0])
-        return meronyms
+        return self.processQueryToExtractImprovisedRelations(posTags, 'meronym')
     
     def processQueryToExtractHolonyms(self, words):
-        holonyms = []
+        return self.processQueryToExtractRelations(words, 'holonym')
+    
+    def processQueryToExtractImprovisedHolonyms(self, posTags):
+        return self.processQueryToExtractImprovisedRelations(posTags, 'holonym')
+    
+    @instrumented('query WordNet relations')
+    def processQueryToExtractRelations(self, words, relation):
+        relationList = []
         for word in words:
-            synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].part_holonyms()) > 0:
-                    holonyms.append(synset[0].part_holonyms()[0].name().split('.')[0])
+            entry = self.wordNetCache.lookup(word)
+            if entry.synset is not None:
+                related = getattr(entry, relation)
+                if related is not None:
+                    relationList.append(related)
                 else:
-                    holonyms.append(word)
-        return holonyms
+                    relationList.append(word)
+        return relationList
     
-    def processQueryToExtractImprovisedHolonyms(self, posTags):
-        holonyms = []
+    @instrumented('query improvised WordNet relations')
+    def processQueryToExtractImprovisedRelations(self, posTags, relation):
+        relationList = []
         for word, tag in posTags:
-            wnTag = IndexCreation().getWordnetTag(tag)
-            if wnTag is not None:
-                synset = wn.synsets(word, pos=wnTag)
-            else:
-                synset = wn.synsets(word)
-            if len(synset) > 0:
-                if len(synset[0].part_holonyms()) > 0:
-                    holonyms.append(synset[0].part_holonyms()[0].name().split('.')[0])
-        return holonyms
+            related = getattr(self.wordNetCache.lookup(word, self.indexCreation.getWordnetTag(tag)), relation)
+            if related is not None:
+                relationList.append(related)
+        return relationList
     
     def processQueryToExtractAllFeatures(self, query):
         words = self.processQueryToExtractWords(query)
@@ -224,6 +200,8 @@ class SemanticSearchEngine:
         return [words, lemmas, stems, posTags, headWord, hypernyms, hyponyms, meronyms, holonyms]
     
     def improvisationTask(self, query):
+        if self.concurrentFeatures:
+            return self.improvisationTaskConcurrently(query, self.headWordTimeout)
         words = self.processQueryToExtractWords(query)
         posTags = self.processQueryToDoPOSTaggingWithWords(words)
         lemmas = self.processQueryToDoImprovedLemmatization(posTags)
@@ -236,81 +214,368 @@ class SemanticSearchEngine:
         holonyms = self.processQueryToExtractImprovisedHolonyms(posTags)
         return [words, lemmas, stems, posTags, headWord, hypernyms, hyponyms, meronyms, holonyms]
     
+    def improvisationTaskConcurrently(self, query, headWordTimeout=None):
+        features, _ = self.improvisationTaskConcurrentlyWithStatus(query, headWordTimeout)
+        return features
+    
+    def improvisationTaskConcurrentlyWithStatus(self, query, headWordTimeout=None):
+        # The head word is a CoreNLP round-trip, so it runs in the background
+        # while this thread does the CPU-bound tagging, lemmatizing, stemming
+        # and WordNet lookups. If it does not arrive within headWordTimeout
+        # seconds of submission, or fails, the head: clause is dropped and
+        # the features are returned as incomplete
+        self.loadNLTKResources()
+        headWordFuture = self.getFeatureExecutor().submit(self.processQueryToExtractImprovisedHeadWord, query)
+        deadline = time.perf_counter() + headWordTimeout if headWordTimeout is not None else None
+        words = self.processQueryToExtractWords(query)
+        posTags = self.processQueryToDoPOSTaggingWithWords(words)
+        lemmas = self.processQueryToDoImprovedLemmatization(posTags)
+        stems = self.processQueryToDoStemming(words)
+        hypernyms = self.processQueryToExtractImprovisedHypernyms(posTags)
+        hyponyms = self.processQueryToExtractImprovisedHyponyms(posTags)
+        meronyms = self.processQueryToExtractImprovisedMeronyms(posTags)
+        holonyms = self.processQueryToExtractImprovisedHolonyms(posTags)
+        complete = False
+        try:
+            headWord = headWordFuture.result(timeout=max(deadline - time.perf_counter(), 0) if deadline is not None else None)
+            complete = True
+        except TimeoutError:
+            print("Head word timed out, searching without it")
+            headWord = None
+        except Exception as e:
+            print("Head word failed (" + type(e).__name__ + ": " + str(e) + "), searching without it")
+            headWord = None
+        return [words, lemmas, stems, posTags, headWord, hypernyms, hyponyms, meronyms, holonyms], complete
+    
+    def loadNLTKResources(self):
+        # NLTK loads WordNet and the tagger lazily and without a lock, so both
+        # are loaded before the head-word thread can race this one to them
+        with self.nltkLoadLock:
+            if not self.nltkLoaded:
+                wn.ensure_loaded()
+                pos_tag(['warm', 'up'])
+                self.nltkLoaded = True
+    
+    def getFeatureExecutor(self, workers=4):
+        if self.featureExecutor is None:
+            self.featureExecutor = ThreadPoolExecutor(max_workers=workers)
+        return self.featureExecutor
+    
     def searchInSolrWithMultipleFeatures(self, featuresList, indexSentenceMap):
-        solr = pysolr.Solr('http://localhost:8983/solr/task3')
-        query = []
-        if len(featuresList[0]) > 0:
-            query.append("words:(" + " ".join(featuresList[0]) + ")")
-        if len(featuresList[1]) > 0:
-            query.append("lemmas:(" + " ".join(featuresList[1]) + ")")
-        if len(featuresList[2]) > 0:
-            query.append("stems:(" + " ".join(featuresList[2]) + ")")
-        if len(featuresList[3]) > 0:
-            query.append("POS:(" + " ".join(featuresList[3]) + ")")
-        if len(featuresList[4]) > 0:
-            query.append("head:(" + featuresList[4] + ")")
-        if len(featuresList[5]) > 0:
-            query.append("hypernyms:(" + " ".join(featuresList[5]) + ")")
-        if len(featuresList[6]) > 0:
-            query.append("hyponyms:(" + " ".join(featuresList[6]) + ")")
-        if len(featuresList[7]) > 0:
-            query.append("meronyms:(" + " ".join(featuresList[7]) + ")")
-        if len(featuresList[8]) > 0:
-            query.append("holonyms:(" + " ".join(featuresList[8]) + ")")
-        joinedQuery = ' || '.join(item for item in query)
+        core, clauses, joinedQuery = self.buildQuery("2", featuresList)
         print("Joined Query: ", joinedQuery)
-        results = solr.search(joinedQuery)
-        print()
-        print("Top 10 documents that closely match the query")
-        for result in results:
-            print(result['id'].ljust(10), indexSentenceMap[result['id']])
+        return self.searchAndPrint(core, clauses, joinedQuery, indexSentenceMap)
             
     def searchInSolrWithMultipleImprovisedFeatures(self, featuresList, indexSentenceMap):
-        solr = pysolr.Solr('http://localhost:8983/solr/task4')
-        query = []
-        if len(featuresList[0]) > 0:
-            query.append("words:(" + " ".join(featuresList[0]) + ")^1.0")
-        if len(featuresList[1]) > 0:
-            query.append("lemmas:(" + " ".join(featuresList[1]) + ")^10.0")
-        if len(featuresList[2]) > 0:
-            query.append("stems:(" + " ".join(featuresList[2]) + ")^6.0")
-        if len(featuresList[3]) > 0:
-            query.append("POSWithWords:(" + " ".join(str(term) for term in featuresList[3]) + ")^1.0")
-        if len(featuresList[4]) > 0:
-            query.append("head:(" + featuresList[4] + ")^1.0")
-        if len(featuresList[5]) > 0:
-            query.append("hypernyms:(" + " ".join(featuresList[5]) + ")^7.0")
-        if len(featuresList[6]) > 0:
-            query.append("hyponyms:(" + " ".join(featuresList[6]) + ")^1.0")
-        if len(featuresList[7]) > 0:
-            query.append("meronyms:(" + " ".join(featuresList[7]) + ")^1.0")
-        if len(featuresList[8]) > 0:
-            query.append("holonyms:(" + " ".join(featuresList[8]) + ")^1.0")
-        joinedQuery = ' || '.join(item for item in query)
+        core, clauses, joinedQuery = self.buildQuery("3", featuresList)
         print("Joined Query: ", joinedQuery)
-        results = solr.search(joinedQuery)
+        return self.searchAndPrint(core, clauses, joinedQuery, indexSentenceMap)
+    
+    def searchWithVectors(self, query, indexSentenceMap):
+        ids = self.searchVectors(query)
+        return self.printResults(ids, indexSentenceMap, 'task4')
+    
+    def searchWithHybridFeatures(self, featuresList, query, indexSentenceMap):
+        ids = self.searchHybrid(featuresList, query)
+        return self.printResults(ids, indexSentenceMap, 'task4')
+    
+    def extractQueryFeatures(self, inputChoice, query):
+        features = self.lookupQueryFeatures(inputChoice, query)
+        if features is not None:
+            return features
+        features, complete = self.computeQueryFeatures(inputChoice, query)
+        if complete:
+            self.storeQueryFeatures(inputChoice, query, features)
+        return features
+    
+    def computeQueryFeatures(self, inputChoice, query):
+        # Returns the features and whether they are complete. Only a head
+        # word that timed out or failed in the concurrent mode leaves them
+        # incomplete, and incomplete features are not cached, so the next
+        # identical query gets another chance at the full feature set
+        if inputChoice == "1":
+            return self.processQueryToExtractWords(query), True
+        elif inputChoice == "2":
+            return self.processQueryToExtractAllFeatures(query), True
+        elif self.concurrentFeatures:
+            return self.improvisationTaskConcurrentlyWithStatus(query, self.headWordTimeout)
+        return self.improvisationTask(query), True
+    
+    def normalizeQuery(self, query):
+        # Only whitespace is folded: case and punctuation change the tags, the
+        # head word and so the features
+        return ' '.join(query.split())
+    
+    def lookupQueryFeatures(self, inputChoice, query):
+        return self.featureCache.get((inputChoice, self.normalizeQuery(query)))
+    
+    def storeQueryFeatures(self, inputChoice, query, features):
+        self.featureCache.put((inputChoice, self.normalizeQuery(query)), features)
+    
+    def buildQuery(self, inputChoice, features):
+        if inputChoice == "1":
+            return 'task2', [('words', features, None)], "words:" + " || words:".join(features)
+        elif inputChoice == "2":
+            clauses = self.buildQueryClauses(features, self.taskThreeFields)
+            return 'task3', clauses, self.joinQueryClauses(clauses)
+        clauses = self.buildQueryClauses(features, self.taskFourFields, self.taskFourBoosts)
+        return 'task4', clauses, self.joinQueryClauses(clauses)
+    
+    def buildQueryClauses(self, featuresList, fields, boosts=None):
+        clauses = []
+        for i, field in enumerate(fields):
+            terms = featuresList[i]
+            if not terms:
+                continue
+            if isinstance(terms, str):
+                terms = [terms]
+            clauses.append((field, [str(term) for term in terms], boosts[i] if boosts is not None else None))
+        return clauses
+    
+    def joinQueryClauses(self, clauses):
+        query = []
+        for field, terms, boost in clauses:
+            clause = field + ":(" + " ".join(terms) + ")"
+            if boost is not None:
+                clause += "^" + str(boost)
+            query.append(clause)
+        return ' || '.join(query)
+    
+    @instrumented('search')
+    def search(self, core, clauses, joinedQuery, rows=10):
+        self.checkIndexVersion(core)
+        key = (core, joinedQuery, rows)
+        ids = self.resultCache.get(key)
+        if ids is None:
+            if self.backend == 'native':
+                ids = [docId for docId, _ in self.getNativeIndex(core).search(clauses, rows)]
+            else:
+                ids = [result['id'] for result in self.getSolrClient(core).search(joinedQuery, rows=rows)]
+            self.resultCache.put(key, ids)
+        return list(ids)
+    
+    def checkIndexVersion(self, core):
+        # indexFeaturesWithSolr, the bulk and incremental indexers and the
+        # compressed index writer all bump the version of the core they rebuilt
+        version = self.resources.indexVersion.get(core)
+        if core in self.cachedIndexVersions and self.cachedIndexVersions[core] != version:
+            print("Index", core, "was rebuilt, invalidating cached queries")
+            self.resultCache.invalidate(lambda key: key[0] == core)
+            self.featureCache.invalidate()
+            with self.nativeIndexLock:
+                self.nativeIndexes.pop(core, None)
+        self.cachedIndexVersions[core] = version
+    
+    @instrumented('vector search')
+    def searchVectors(self, query, rows=10):
+        self.checkIndexVersion('vectors')
+        key = ('vectors', self.normalizeQuery(query), rows)
+        ids = self.resultCache.get(key)
+        if ids is None:
+            ids = [docId for docId, _ in self.getVectorIndex().search(query, rows)]
+            self.resultCache.put(key, ids)
+        return list(ids)
+    
+    def searchHybrid(self, featuresList, query, rows=10, candidates=100, lexicalWeight=0.5):
+        # Fuses the Task 4 feature ranking with the sentence vector ranking;
+        # both are cut to their top candidates before fusing
+        core, clauses, joinedQuery = self.buildQuery("3", featuresList)
+        lexicalIds = self.search(core, clauses, joinedQuery, candidates)
+        vectorIds = self.searchVectors(query, candidates)
+        return self.fuseRankings([lexicalIds, vectorIds], [lexicalWeight, 1 - lexicalWeight])[:rows]
+    
+    def fuseRankings(self, rankings, weights, k=60):
+        # Reciprocal rank fusion: Solr only returns the ranked ids, and ranks
+        # do not need BM25 and cosine scores to be put on one scale
+        scores = collections.defaultdict(float)
+        for ids, weight in zip(rankings, weights):
+            for rank, docId in enumerate(ids, 1):
+                scores[docId] += weight / (k + rank)
+        return sorted(scores, key=lambda docId: (-scores[docId], docId))
+    
+    def getVectorIndex(self):
+        # Kept with the native indexes so checkIndexVersion drops it too
+        with self.nativeIndexLock:
+            if 'vectors' not in self.nativeIndexes:
+                self.nativeIndexes['vectors'] = VectorIndex(self.vectorIndexFile).load()
+            return self.nativeIndexes['vectors']
+    
+    def getSolrClient(self, core):
+        return self.resources.getSolrClient(core)
+    
+    def getNativeIndex(self, core):
+        # Locked so concurrent first queries do not each load the index
+        with self.nativeIndexLock:
+            if core not in self.nativeIndexes:
+                if self.hasCompressedIndex(core):
+                    self.nativeIndexes[core] = CompressedIndex(self.getCompressedIndexFile(core))
+                else:
+                    self.nativeIndexes[core] = InvertedIndex().build(self.indexCreation.iterIndexRecords(self.nativeIndexFiles[core]))
+            return self.nativeIndexes[core]
+    
+    def loadNativeIndexes(self):
+        # Used by long-running processes: loads every available index up
+        # front, with compressed postings decoded into memory
+        for core in self.nativeIndexFiles:
+            self.loadNativeIndex(core)
+    
+    @instrumented('load native index')
+    def loadNativeIndex(self, core):
+        if not self.hasCompressedIndex(core) and not os.path.exists(self.nativeIndexFiles[core]) and not self.getFeatureStore(core).exists():
+            print("No index for", core)
+            return None
+        index = self.getNativeIndex(core)
+        if isinstance(index, CompressedIndex) and not index.loaded:
+            index.loadPostings()
+        return index
+    
+    def getCompressedIndexFile(self, core):
+        return os.path.splitext(self.nativeIndexFiles[core])[0] + '.idx'
+    
+    def getFeatureStore(self, core):
+        return self.indexCreation.getFeatureStore(self.nativeIndexFiles[core])
+    
+    def hasCompressedIndex(self, core):
+        # An incremental update rewrites the JSON or appends to the feature
+        # store but leaves the .idx file, so a compressed index older than
+        # either is ignored
+        indexFileName = self.getCompressedIndexFile(core)
+        jsonFileName = self.nativeIndexFiles[core]
+        featureStore = self.getFeatureStore(core)
+        if not os.path.exists(indexFileName):
+            return False
+        if featureStore.exists() and featureStore.getModifiedTime() > os.path.getmtime(indexFileName):
+            return False
+        return not os.path.exists(jsonFileName) or os.path.getmtime(indexFileName) >= os.path.getmtime(jsonFileName)
+    
+    def searchAndPrint(self, core, clauses, joinedQuery, indexSentenceMap):
+        ids = self.search(core, clauses, joinedQuery)
+        return self.printResults(ids, indexSentenceMap, core)
+    
+    def printResults(self, ids, indexSentenceMap, core):
         print()
         print("Top 10 documents that closely match the query")
-        for result in results:
-            print(result['id'].ljust(10), indexSentenceMap[result['id']])
+        for docId in ids:
+            sentence = indexSentenceMap[docId] if indexSentenceMap is not None else self.getNativeIndex(core).getSentence(docId)
+            print(docId.ljust(10), sentence)
+        return ids
+    
+    def readQueries(self, queryFileName):
+        with io.open(queryFileName, 'r', encoding='utf-8') as queryFile:
+            return [line.strip() for line in queryFile if len(line.strip()) > 0]
+    
+    @instrumented('batch query features', len)
+    def extractQueryFeaturesInBatch(self, inputChoice, queries, batchSize=1000):
+        # Same features as extractQueryFeatures, but every batch of uncached
+        # queries is tagged with one pos_tag_sents call and parsed with one
+        # findHeadWords call
+        features = [self.lookupQueryFeatures(inputChoice, query) for query in queries]
+        missing = [i for i, queryFeatures in enumerate(features) if queryFeatures is None]
+        for start in range(0, len(missing), batchSize):
+            batchIndexes = missing[start:start + batchSize]
+            batchFeatures = self.extractQueryFeaturesForBatch(inputChoice, [queries[i] for i in batchIndexes])
+            for i, queryFeatures in zip(batchIndexes, batchFeatures):
+                features[i] = queryFeatures
+                self.storeQueryFeatures(inputChoice, queries[i], queryFeatures)
+        return features
+    
+    def extractQueryFeaturesForBatch(self, inputChoice, batch):
+        features = []
+        if len(batch) > 0:
+            wordsList = [self.processQueryToExtractWords(query) for query in batch]
+            if inputChoice == "1":
+                return wordsList
+            posTagsList = pos_tag_sents(wordsList)
+            headWords = self.headWordParser.findHeadWords(batch)
+            for words, posTags, headWord in zip(wordsList, posTagsList, headWords):
+                if inputChoice == "2":
+                    features.append([words,
+                                     self.processQueryToDoLemmatization(words),
+                                     self.processQueryToDoStemming(words),
+                                     [tag for _, tag in posTags],
+                                     headWord,
+                                     self.processQueryToExtractHypernyms(words),
+                                     self.processQueryToExtractHyponyms(words),
+                                     self.processQueryToExtractMeronyms(words),
+                                     self.processQueryToExtractHolonyms(words)])
+                else:
+                    features.append([words,
+                                     self.processQueryToDoImprovedLemmatization(posTags),
+                                     self.processQueryToDoStemming(words),
+                                     posTags,
+                                     self.indexCreation.improviseHeadWord(headWord),
+                                     self.processQueryToExtractImprovisedHypernyms(posTags),
+                                     self.processQueryToExtractImprovisedHyponyms(posTags),
+                                     self.processQueryToExtractImprovisedMeronyms(posTags),
+                                     self.processQueryToExtractImprovisedHolonyms(posTags)])
+        return features
+    
+    def searchOrError(self, query, rows):
+        # One failing query should not abort a batch of thousands
+        try:
+            return {'ids': self.search(*query, rows=rows)}
+        except Exception as e:
+            return {'error': type(e).__name__ + ": " + str(e)}
+    
+    def searchBatch(self, queryFileName, inputChoice, resultsFileName=None, rows=10, workers=8):
+        queries = self.readQueries(queryFileName)
+        resultsFileName = resultsFileName if resultsFileName is not None else os.path.splitext(queryFileName)[0] + 'Results.jsonl'
+        print("Extracting features for", str(len(queries)), "queries...")
+        start = time.perf_counter()
+        features = self.extractQueryFeaturesInBatch(inputChoice, queries)
+        featureTime = time.perf_counter() - start
+        print("Searching...")
+        builtQueries = [self.buildQuery(inputChoice, queryFeatures) for queryFeatures in features]
+        if self.backend == 'native' and len(builtQueries) > 0:
+            self.loadNativeIndex(builtQueries[0][0])
+        # Solr searches wait on the network, so several are kept in flight over
+        # the pooled session; map keeps the results in query order
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda query: self.searchOrError(query, rows), builtQueries))
+        elapsed = time.perf_counter() - start
+        with io.open(resultsFileName, 'w', encoding='utf-8') as resultsFile:
+            for query, result in zip(queries, results):
+                result['query'] = query
+                resultsFile.write(json.dumps(result) + '\n')
+        errors = sum(1 for result in results if 'error' in result)
+        print("Searched", str(len(queries)), "queries in %.2f s (features %.2f s, search %.2f s): %.1f queries/s, %d errors"
+              % (elapsed, featureTime, elapsed - featureTime, len(queries) / elapsed if elapsed > 0 else 0.0, errors))
+        print("Results written to", resultsFileName)
+        return results
     
     
 if __name__ == '__main__':
-    sse = SemanticSearchEngine()
     path = '/Users/deepaks/Documents/workspace/Semantic_Search_Engine/Data/'
     inputChoice = input("Enter the option to continue with\n 1. Task2 \n 2. Task3\n 3. Task4\n ") 
-    indexSentenceMap = sse.getArticleAndWordCount(path)
-    query = input("Enter the input query: ")
-    # Task 2
-    if inputChoice == "1":
-        processedQuery = sse.processQueryToExtractWords(query)
-        sse.searchInSolr(processedQuery, indexSentenceMap) 
-    # Task 3
-    elif inputChoice == "2":
-        featuresList = sse.processQueryToExtractAllFeatures(query)
-        sse.searchInSolrWithMultipleFeatures(featuresList, indexSentenceMap)
-    # Task 4    
-    elif inputChoice == "3":
-        featuresList = sse.improvisationTask(query)
-        sse.searchInSolrWithMultipleImprovisedFeatures(featuresList, indexSentenceMap)
+    backendChoice = input("Enter the search backend\n 1. Solr\n 2. In-process index\n ")
+    sse = SemanticSearchEngine(backend='native' if backendChoice == "2" else 'solr', concurrentFeatures=True, headWordTimeout=2.0)
+    queryChoice = input("Enter the query mode\n 1. Single query\n 2. Query file\n ")
+    if queryChoice == "2":
+        sse.searchBatch(input("Enter the query file: "), inputChoice)
+    else:
+        indexSentenceMap = sse.loadSentenceMap(path, 'task' + str(int(inputChoice) + 1))
+        query = input("Enter the input query: ")
+        # Task 2
+        if inputChoice == "1":
+            processedQuery = sse.processQueryToExtractWords(query)
+            sse.searchInSolr(processedQuery, indexSentenceMap) 
+        # Task 3
+        elif inputChoice == "2":
+            featuresList = sse.processQueryToExtractAllFeatures(query)
+            sse.searchInSolrWithMultipleFeatures(featuresList, indexSentenceMap)
+        # Task 4    
+        elif inputChoice == "3":
+            retrievalChoice = input("Enter the retrieval mode\n 1. Features\n 2. Sentence vectors\n 3. Hybrid\n ")
+            if retrievalChoice == "2":
+                sse.searchWithVectors(query, indexSentenceMap)
+            else:
+                featuresList = sse.improvisationTask(query)
+                if retrievalChoice == "3":
+                    sse.searchWithHybridFeatures(featuresList, query, indexSentenceMap)
+                else:
+                    sse.searchInSolrWithMultipleImprovisedFeatures(featuresList, indexSentenceMap)
+    sse.wordNetCache.printStats()
+    sse.featureCache.printStats("Query features")
+    sse.resultCache.printStats("Query results")
+    sse.resources.instrumentation.writeReport('QueryReport.json')
         
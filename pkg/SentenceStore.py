@@ -0,0 +1,146 @@
+import collections
+import json
+import os
+import re
+
+from nltk.tokenize import word_tokenize
+
+from pkg.SortedStringTable import SortedStringTable
+
+
+class SentenceStore:
+
+    sentenceIdPattern = re.compile(r'A(\d+)S\d+')
+
+    def __init__(self, fileName='SentenceMap.sst', statsFileName='CorpusStats.json', runSize=100000):
+        self.fileName = fileName
+        self.statsFileName = statsFileName
+        self.runSize = runSize
+        self.table = None
+        self.stats = None
+        self.runFileNames = None
+        self.runItems = None
+        self.sentences = 0
+        self.articleWords = None
+
+    def exists(self):
+        return os.path.exists(self.fileName) and os.path.exists(self.statsFileName)
+
+    def getTable(self):
+        # Opened on first use: an mmap plus the fixed-size header is all that
+        # is read, sentences are fetched only for the result ids
+        if self.table is None:
+            self.table = SortedStringTable(self.fileName)
+        return self.table
+
+    def getStats(self):
+        if self.stats is None:
+            with open(self.statsFileName, 'r') as statsFile:
+                self.stats = json.load(statsFile)
+        return self.stats
+
+    def __getitem__(self, sentenceId):
+        sentence = self.get(sentenceId)
+        if sentence is None:
+            raise KeyError(sentenceId)
+        return sentence
+
+    def __contains__(self, sentenceId):
+        return self.get(sentenceId) is not None
+
+    def __len__(self):
+        return len(self.getTable())
+
+    def get(self, sentenceId, default=None):
+        value = self.getTable().get(sentenceId)
+        return value.decode('utf-8') if value is not None else default
+
+    def items(self):
+        for sentenceId, value in self.getTable().items():
+            yield sentenceId, value.decode('utf-8')
+
+    def getArticleId(self, sentenceId):
+        return self.sentenceIdPattern.match(sentenceId).group(1)
+
+    def countWords(self, sentenceItems):
+        articleWords = collections.OrderedDict()
+        for sentenceId, sentence in sentenceItems:
+            articleId = self.getArticleId(sentenceId)
+            articleWords[articleId] = articleWords.get(articleId, 0) + len(word_tokenize(sentence))
+        return articleWords
+
+    def write(self, sentenceItems, articleWords):
+        self.close()
+        SortedStringTable.write(self.fileName, ((sentenceId, sentence.encode('utf-8')) for sentenceId, sentence in sentenceItems))
+        self.writeStats(len(sentenceItems), articleWords)
+
+    def writeStats(self, sentences, articleWords):
+        self.stats = {'articles': len(articleWords), 'sentences': sentences, 'words': sum(articleWords.values()), 'articleWords': articleWords}
+        with open(self.statsFileName, 'w') as statsFile:
+            json.dump(self.stats, statsFile)
+
+    def save(self, indexSentenceMap):
+        print("Saving sentence map...")
+        sentenceItems = list(indexSentenceMap.items())
+        self.write(sentenceItems, self.countWords(sentenceItems))
+        return self.fileName
+
+    def startSave(self):
+        # Chunked save for the streaming rebuild: every runSize sentences are
+        # sorted into a run table, and finishSave merges the runs, so only
+        # one run of sentences is in memory at a time
+        print("Saving sentence map...")
+        self.close()
+        self.runFileNames = []
+        self.runItems = []
+        self.sentences = 0
+        self.articleWords = collections.OrderedDict()
+
+    def saveChunk(self, indexSentenceMap):
+        self.runItems.extend(indexSentenceMap.items())
+        self.sentences += len(indexSentenceMap)
+        for articleId, words in self.countWords(indexSentenceMap.items()).items():
+            self.articleWords[articleId] = self.articleWords.get(articleId, 0) + words
+        if len(self.runItems) >= self.runSize:
+            self.writeRun()
+
+    def writeRun(self):
+        runFileName = self.fileName + '.run' + str(len(self.runFileNames))
+        SortedStringTable.write(runFileName, ((sentenceId, sentence.encode('utf-8')) for sentenceId, sentence in self.runItems))
+        self.runFileNames.append(runFileName)
+        self.runItems = []
+
+    def finishSave(self):
+        if len(self.runItems) > 0 or len(self.runFileNames) == 0:
+            self.writeRun()
+        if len(self.runFileNames) == 1:
+            os.replace(self.runFileNames[0], self.fileName)
+        else:
+            SortedStringTable.merge(self.fileName, self.runFileNames)
+            for runFileName in self.runFileNames:
+                os.remove(runFileName)
+        self.writeStats(self.sentences, self.articleWords)
+        self.runFileNames = None
+        self.articleWords = None
+        return self.fileName
+
+    def update(self, indexSentenceMap, articleIds):
+        # Replaces every sentence of the given articles (changed or removed)
+        # with those in indexSentenceMap
+        articleIds = set(str(articleId) for articleId in articleIds)
+        sentenceItems = [(sentenceId, sentence) for sentenceId, sentence in self.items() if self.getArticleId(sentenceId) not in articleIds]
+        articleWords = collections.OrderedDict((articleId, words) for articleId, words in self.getStats()['articleWords'].items() if articleId not in articleIds)
+        articleWords.update(self.countWords(indexSentenceMap.items()))
+        self.write(sentenceItems + list(indexSentenceMap.items()), articleWords)
+        return self.fileName
+
+    def printStats(self):
+        stats = self.getStats()
+        print("Number of articles:", str(stats['articles']))
+        print("Number of words in the corpus:", str(stats['words']))
+
+    def close(self):
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+        self.stats = None
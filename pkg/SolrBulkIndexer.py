@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+
+import pysolr
+import requests
+
+from pkg.FeatureStore import FeatureStore
+from pkg.IndexVersion import IndexVersion
+from pkg.InvertedIndex import InvertedIndex
+
+
+class SolrBulkIndexer:
+
+    def __init__(self, solrUrl, batchSize=1000, workers=1, timeout=60, indexVersion=None):
+        self.solrUrl = solrUrl
+        self.core = solrUrl.rstrip('/').rsplit('/', 1)[-1]
+        self.indexVersion = indexVersion if indexVersion is not None else IndexVersion()
+        self.batchSize = batchSize
+        self.workers = workers
+        # One session for every request; the pool holds a connection per worker
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.solr = pysolr.Solr(solrUrl, timeout=timeout, session=self.session)
+
+    def iterRecords(self, jsonFileName):
+        # The feature store holds the same records and is read column by
+        # column, so the JSON is only parsed when the store is stale
+        featureStore = FeatureStore.forJsonFile(jsonFileName)
+        if featureStore.isCurrentFor(jsonFileName):
+            yield from featureStore.iterRecordDicts()
+            return
+        # Task<n>.jsonl holds JSON lines, Task<n>.json one JSON array
+        yield from InvertedIndex.iterJsonRecords(jsonFileName)
+
+    def iterBatches(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.batchSize:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+    def postBatch(self, batch):
+        self.solr.add(batch, commit=False)
+        return len(batch)
+
+    def postBatches(self, batches):
+        if self.workers <= 1:
+            return sum(self.postBatch(batch) for batch in batches)
+        documents = 0
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for batch in batches:
+                # Bound the batches held in memory to twice the worker count
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    documents += sum(future.result() for future in done)
+                pending.add(executor.submit(self.postBatch, batch))
+            documents += sum(future.result() for future in pending)
+        return documents
+
+    def index(self, jsonFileName, deleteAll=True):
+        print("Bulk indexing", jsonFileName, "...")
+        start = time.perf_counter()
+        # Nothing is committed until every batch has been posted, so searches
+        # keep seeing the previous index until the final commit
+        if deleteAll:
+            self.solr.delete(q='*:*', commit=False)
+        documents = self.postBatches(self.iterBatches(self.iterRecords(jsonFileName)))
+        self.solr.commit()
+        self.indexVersion.bump(self.core)
+        elapsed = time.perf_counter() - start
+        print("Indexed", str(documents), "documents in %.2f s (%.1f docs/s)" % (elapsed, documents / elapsed if elapsed > 0 else 0.0))
+        return documents
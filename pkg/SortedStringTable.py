@@ -0,0 +1,106 @@
+import heapq
+import mmap
+import os
+import shutil
+import struct
+
+
+class SortedStringTable:
+
+    magic = b'SST1'
+    headerFormat = '<4sQ'
+    offsetFormat = '<Q'
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.file = open(fileName, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = struct.unpack_from(self.headerFormat, self.buffer, 0)
+        if magic != self.magic:
+            raise ValueError("Not a sorted string table: " + fileName)
+        self.offsetsStart = struct.calcsize(self.headerFormat)
+        self.dataStart = self.offsetsStart + (self.count + 1) * struct.calcsize(self.offsetFormat)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.readRecord(i)[0].decode('utf-8')
+
+    def items(self):
+        for i in range(self.count):
+            key, value = self.readRecord(i)
+            yield key.decode('utf-8'), value
+
+    def readOffset(self, i):
+        return self.dataStart + struct.unpack_from(self.offsetFormat, self.buffer, self.offsetsStart + 8 * i)[0]
+
+    def readRecord(self, i):
+        record = self.buffer[self.readOffset(i):self.readOffset(i + 1)]
+        separator = record.index(b'\x00')
+        return record[:separator], record[separator + 1:]
+
+    def get(self, key, default=None):
+        key = key.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            middleKey, value = self.readRecord(middle)
+            if middleKey < key:
+                low = middle + 1
+            elif middleKey > key:
+                high = middle
+            else:
+                return value
+        return default
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def iterRecords(self):
+        for i in range(self.count):
+            yield self.readRecord(i)
+
+    @classmethod
+    def write(cls, fileName, items):
+        return cls.writeSorted(fileName, sorted((key.encode('utf-8'), value) for key, value in items))
+
+    @classmethod
+    def writeSorted(cls, fileName, records):
+        # records are (key bytes, value) pairs already in key order. Offsets
+        # and data go to temporary files that are joined behind the header
+        # at the end, so the records can come from a generator
+        count = 0
+        offset = 0
+        with open(fileName + '.offsets', 'wb') as offsetsFile, open(fileName + '.data', 'wb') as dataFile:
+            offsetsFile.write(struct.pack(cls.offsetFormat, 0))
+            for key, value in records:
+                dataFile.write(key)
+                dataFile.write(b'\x00')
+                dataFile.write(value)
+                offset += len(key) + 1 + len(value)
+                offsetsFile.write(struct.pack(cls.offsetFormat, offset))
+                count += 1
+        with open(fileName, 'wb') as f:
+            f.write(struct.pack(cls.headerFormat, cls.magic, count))
+            for partFileName in [fileName + '.offsets', fileName + '.data']:
+                with open(partFileName, 'rb') as partFile:
+                    shutil.copyfileobj(partFile, f)
+                os.remove(partFileName)
+        return fileName
+
+    @classmethod
+    def merge(cls, fileName, runFileNames):
+        # Merges tables with distinct keys into one without loading them
+        runs = [cls(runFileName) for runFileName in runFileNames]
+        try:
+            cls.writeSorted(fileName, heapq.merge(*[run.iterRecords() for run in runs], key=lambda record: record[0]))
+        finally:
+            for run in runs:
+                run.close()
+        return fileName
@@ -0,0 +1,57 @@
+from array import array
+import collections.abc
+
+from pkg.Vocabulary import Vocabulary
+
+
+class TokenTable(collections.abc.Mapping):
+
+    # Ordered sentence id -> token list map, such as indexWordsMap or the
+    # per-feature maps. Every value is stored as interned ids in one shared
+    # array('I') with array('Q') offsets, instead of a list of str objects per
+    # sentence; values are decoded on access. Entries can only be appended
+    def __init__(self, vocabulary=None, kind='list'):
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.kind = kind
+        self.sentenceIds = []
+        self.rows = {}
+        self.tokenIds = array('I')
+        self.offsets = array('Q', [0])
+
+    @classmethod
+    def fromItems(cls, items, vocabulary=None, kind='list'):
+        table = cls(vocabulary, kind)
+        for key, value in items:
+            table[key] = value
+        return table
+
+    def __setitem__(self, key, value):
+        if key in self.rows:
+            raise KeyError("TokenTable entries cannot be replaced: " + key)
+        self.rows[key] = len(self.sentenceIds)
+        self.sentenceIds.append(key)
+        self.vocabulary.encode(value, self.kind, self.tokenIds)
+        self.offsets.append(len(self.tokenIds))
+
+    def __getitem__(self, key):
+        return self.getRow(self.rows[key])
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.sentenceIds)
+
+    def __len__(self):
+        return len(self.sentenceIds)
+
+    def getRow(self, row):
+        return self.vocabulary.decode(self.tokenIds, self.offsets[row], self.offsets[row + 1], self.kind)
+
+    def items(self):
+        for row, key in enumerate(self.sentenceIds):
+            yield key, self.getRow(row)
+
+    def values(self):
+        for row in range(len(self.sentenceIds)):
+            yield self.getRow(row)
@@ -0,0 +1,210 @@
+import collections
+import io
+import json
+import os
+import re
+
+import numpy as np
+
+from pkg.IVFIndex import IVFIndex
+
+
+class VectorIndex:
+
+    # Latent semantic index of every sentence: TF-IDF vectors reduced with a
+    # randomized truncated SVD, all computed locally with numpy. Three files
+    # share fileName as prefix:
+    #   .npy       float32 documents x dimensions matrix of unit sentence
+    #              vectors, loaded with mmap
+    #   Terms.npy  float32 terms x dimensions projection used to fold queries
+    #              into the same space
+    #   .json      sentence ids (None once removed), vocabulary and idf
+    #   IVF.npz    optional IVFIndex used instead of scoring every sentence
+    tokenPattern = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, fileName='SentenceVectors', dimensions=128, minDocumentFrequency=2, powerIterations=4, seed=0, lists=None, probes=32):
+        self.fileName = fileName
+        self.dimensions = dimensions
+        self.minDocumentFrequency = minDocumentFrequency
+        self.powerIterations = powerIterations
+        self.seed = seed
+        self.docIds = []
+        self.termNumbers = {}
+        self.idf = None
+        self.vectors = None
+        self.termVectors = None
+        self.lists = lists
+        self.probes = probes
+        self.ivf = None
+        self.removed = np.zeros(0, dtype=np.int64)
+
+    def getFileNames(self):
+        return self.fileName + '.npy', self.fileName + 'Terms.npy', self.fileName + '.json'
+
+    def exists(self):
+        return all(os.path.exists(fileName) for fileName in self.getFileNames())
+
+    def tokenize(self, sentence):
+        return [token.lower() for token in self.tokenPattern.findall(sentence)]
+
+    def load(self):
+        vectorsFileName, termsFileName, metadataFileName = self.getFileNames()
+        with io.open(metadataFileName, 'r', encoding='utf-8') as metadataFile:
+            metadata = json.load(metadataFile)
+        self.docIds = metadata['ids']
+        self.removed = np.array([docNumber for docNumber, docId in enumerate(self.docIds) if docId is None], dtype=np.int64)
+        self.termNumbers = {term: termNumber for termNumber, term in enumerate(metadata['terms'])}
+        self.idf = np.array(metadata['idf'], dtype=np.float32)
+        self.vectors = np.load(vectorsFileName, mmap_mode='r')
+        self.termVectors = np.load(termsFileName, mmap_mode='r')
+        ivf = IVFIndex(self.fileName + 'IVF', self.lists, self.probes)
+        self.ivf = ivf.load() if ivf.exists() else None
+        return self
+
+    def countTerms(self, sentenceItems):
+        # Returns the sentence ids, the vocabulary and the term counts as CSR
+        # arrays (row pointers, term numbers, counts). Terms in fewer than
+        # minDocumentFrequency sentences carry no latent signal and are dropped
+        docIds = []
+        sentenceCounts = []
+        documentFrequencies = collections.Counter()
+        for sentenceId, sentence in sentenceItems:
+            termCounts = collections.Counter(self.tokenize(sentence))
+            docIds.append(sentenceId)
+            sentenceCounts.append(termCounts)
+            documentFrequencies.update(termCounts.keys())
+        terms = sorted(term for term, frequency in documentFrequencies.items() if frequency >= self.minDocumentFrequency)
+        self.termNumbers = {term: termNumber for termNumber, term in enumerate(terms)}
+        rowPointers = [0]
+        termNumbers = []
+        counts = []
+        for termCounts in sentenceCounts:
+            for term, count in termCounts.items():
+                termNumber = self.termNumbers.get(term)
+                if termNumber is not None:
+                    termNumbers.append(termNumber)
+                    counts.append(count)
+            rowPointers.append(len(termNumbers))
+        documentFrequency = np.array([documentFrequencies[term] for term in terms], dtype=np.float64)
+        self.idf = np.log((1 + len(docIds)) / (1 + documentFrequency)).astype(np.float32) + 1
+        return docIds, terms, np.array(rowPointers, dtype=np.int64), np.array(termNumbers, dtype=np.int32), np.array(counts, dtype=np.float64)
+
+    def getWeights(self, rows, termNumbers, counts, documents):
+        # Sublinear tf times idf, each sentence scaled to unit length
+        weights = (1 + np.log(counts)) * self.idf[termNumbers]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=documents))
+        return weights / np.maximum(norms, 1e-12)[rows]
+
+    def multiply(self, outputs, inputs, weights, matrix, size):
+        # Sparse (given as COO triples) times dense, one bincount per column
+        result = np.empty((size, matrix.shape[1]), dtype=np.float64)
+        for column in range(matrix.shape[1]):
+            result[:, column] = np.bincount(outputs, weights=weights * matrix[inputs, column], minlength=size)
+        return result
+
+    def build(self, sentenceItems, oversampling=10):
+        print("Building sentence vectors...")
+        self.docIds, terms, rowPointers, termNumbers, counts = self.countTerms(sentenceItems)
+        documents = len(self.docIds)
+        rows = np.repeat(np.arange(documents), np.diff(rowPointers))
+        weights = self.getWeights(rows, termNumbers, counts, documents)
+        dimensions = max(min(self.dimensions, documents - 1, len(terms) - 1), 1)
+        samples = min(dimensions + oversampling, documents, len(terms))
+        # Randomized range finder with power iterations (Halko et al.), so only
+        # products with the sparse TF-IDF matrix are needed
+        random = np.random.RandomState(self.seed)
+        basis = np.linalg.qr(self.multiply(rows, termNumbers, weights, random.standard_normal((len(terms), samples)), documents))[0]
+        for _ in range(self.powerIterations):
+            termBasis = np.linalg.qr(self.multiply(termNumbers, rows, weights, basis, len(terms)))[0]
+            basis = np.linalg.qr(self.multiply(rows, termNumbers, weights, termBasis, documents))[0]
+        projected = self.multiply(termNumbers, rows, weights, basis, len(terms)).T
+        _, singularValues, rightVectors = np.linalg.svd(projected, full_matrices=False)
+        self.termVectors = np.ascontiguousarray(rightVectors[:dimensions].T, dtype=np.float32)
+        vectors = self.multiply(rows, termNumbers, weights, self.termVectors, documents)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)[:, None]
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        explained = float((singularValues[:dimensions] ** 2).sum() / max((weights * weights).sum(), 1e-12))
+        print("Embedded", str(documents), "sentences and", str(len(terms)), "terms in", str(dimensions), "dimensions (%.1f%% of the TF-IDF energy)" % (100 * explained))
+        return self
+
+    def buildIVF(self):
+        self.ivf = IVFIndex(self.fileName + 'IVF', self.lists, self.probes).build(self.vectors)
+        return self
+
+    def write(self):
+        # Every file is written aside and renamed, so processes that still
+        # have the old matrix mapped keep reading the old file
+        vectorsFileName, termsFileName, metadataFileName = self.getFileNames()
+        terms = sorted(self.termNumbers, key=self.termNumbers.get)
+        for fileName, array in [(vectorsFileName, self.vectors), (termsFileName, self.termVectors)]:
+            with io.open(fileName + '.tmp', 'wb') as arrayFile:
+                np.save(arrayFile, array)
+            os.replace(fileName + '.tmp', fileName)
+        with io.open(metadataFileName + '.tmp', 'w', encoding='utf-8') as metadataFile:
+            json.dump({'ids': self.docIds, 'terms': terms, 'idf': [float(idf) for idf in self.idf]}, metadataFile)
+        os.replace(metadataFileName + '.tmp', metadataFileName)
+        if self.ivf is not None:
+            self.ivf.write()
+        print("Wrote sentence vectors to", vectorsFileName)
+        return self
+
+    def update(self, sentenceItems, removedIds=()):
+        # New articles are folded into the existing latent space, and changed
+        # sentences are re-embedded in place; neither retrains the SVD or the
+        # IVF centroids, so a full rebuild is still worth doing now and then
+        docNumbers = {docId: docNumber for docNumber, docId in enumerate(self.docIds) if docId is not None}
+        sentenceItems = list(sentenceItems)
+        newIds = [sentenceId for sentenceId, _ in sentenceItems if sentenceId not in docNumbers]
+        vectors = np.concatenate([np.asarray(self.vectors), np.zeros((len(newIds), self.vectors.shape[1]), dtype=np.float32)])
+        for sentenceId in newIds:
+            docNumbers[sentenceId] = len(self.docIds)
+            self.docIds.append(sentenceId)
+        updated = np.array([docNumbers[sentenceId] for sentenceId, _ in sentenceItems], dtype=np.int64)
+        for docNumber, (_, sentence) in zip(updated, sentenceItems):
+            vector = self.embed(sentence)
+            vectors[docNumber] = vector if vector is not None else 0
+        removed = [docNumbers[sentenceId] for sentenceId in removedIds if sentenceId in docNumbers]
+        for docNumber in removed:
+            self.docIds[docNumber] = None
+        self.removed = np.union1d(np.setdiff1d(self.removed, updated), np.array(removed, dtype=np.int64))
+        self.vectors = vectors
+        if self.ivf is not None and len(updated) > 0:
+            self.ivf.add(vectors[updated], updated)
+        print("Embedded", str(len(newIds)), "new and", str(len(updated) - len(newIds)), "changed sentences, removed", str(len(removed)))
+        return self
+
+    def embed(self, query):
+        # Folds the query's TF-IDF vector into the latent space; None when no
+        # query term is in the vocabulary
+        termCounts = collections.Counter(term for term in self.tokenize(query) if term in self.termNumbers)
+        if len(termCounts) == 0:
+            return None
+        termNumbers = np.array([self.termNumbers[term] for term in termCounts], dtype=np.int64)
+        weights = (1 + np.log(np.array(list(termCounts.values()), dtype=np.float32))) * self.idf[termNumbers]
+        vector = weights @ self.termVectors[termNumbers]
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def search(self, query, rows=10, probes=None, exact=False):
+        vector = self.embed(query)
+        if vector is None:
+            return []
+        return self.searchVector(vector, rows, probes, exact)
+
+    def searchVector(self, vector, rows=10, probes=None, exact=False):
+        # One matrix-vector product scores every sentence by cosine similarity,
+        # or only those in the probed IVF lists. More probes trade latency for
+        # recall; exact ignores the IVF index
+        if exact or self.ivf is None:
+            docNumbers = np.arange(len(self.vectors))
+            scores = self.vectors @ vector
+        else:
+            docNumbers = self.ivf.getCandidates(vector, probes)
+            scores = self.vectors[docNumbers] @ vector
+        if len(self.removed) > 0:
+            scores[np.isin(docNumbers, self.removed)] = -np.inf
+        candidates = np.arange(len(scores))
+        if len(scores) > rows:
+            candidates = np.argpartition(-scores, rows - 1)[:rows]
+        ranked = sorted((candidate for candidate in candidates if scores[candidate] > -np.inf), key=lambda candidate: (-scores[candidate], docNumbers[candidate]))
+        return [(self.docIds[docNumbers[candidate]], float(scores[candidate])) for candidate in ranked]
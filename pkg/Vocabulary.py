@@ -0,0 +1,57 @@
+class Vocabulary:
+
+    # Interns tokens to int ids so token lists can be stored as arrays of ids.
+    # Values are encoded by kind:
+    #   list   list of tokens
+    #   pairs  list of (token, token) tuples, such as POS-tagged words
+    #   value  one token or None
+    def __init__(self):
+        self.ids = {}
+        self.tokens = []
+
+    @classmethod
+    def fromTokens(cls, tokens):
+        vocabulary = cls()
+        vocabulary.tokens = tokens
+        vocabulary.ids = {token: tokenId for tokenId, token in enumerate(tokens)}
+        return vocabulary
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, tokenId):
+        return self.tokens[tokenId]
+
+    def intern(self, token):
+        tokenId = self.ids.get(token)
+        if tokenId is None:
+            tokenId = len(self.tokens)
+            self.ids[token] = tokenId
+            self.tokens.append(token)
+        return tokenId
+
+    def encode(self, value, kind, tokenIds):
+        # Appends the ids of value to the array tokenIds
+        if kind == 'value':
+            if value is not None:
+                tokenIds.append(self.intern(value))
+        elif kind == 'pairs':
+            for first, second in value:
+                tokenIds.append(self.intern(first))
+                tokenIds.append(self.intern(second))
+        else:
+            # Most tokens are already interned, so look them all up first
+            get = self.ids.get
+            valueIds = [get(token) for token in value]
+            if None in valueIds:
+                valueIds = [self.intern(token) for token in value]
+            tokenIds.extend(valueIds)
+
+    def decode(self, tokenIds, start, end, kind):
+        # Decoded values share the interned str objects
+        tokens = self.tokens
+        if kind == 'value':
+            return tokens[tokenIds[start]] if end > start else None
+        if kind == 'pairs':
+            return [(tokens[tokenIds[i]], tokens[tokenIds[i + 1]]) for i in range(start, end, 2)]
+        return [tokens[tokenId] for tokenId in tokenIds[start:end]]
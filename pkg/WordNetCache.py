@@ -0,0 +1,145 @@
+import collections
+import os
+import threading
+
+from nltk.corpus import wordnet as wn
+from nltk.corpus.reader.wordnet import ADJ, ADV, NOUN, VERB
+from nltk.stem import WordNetLemmatizer
+
+from pkg.SortedStringTable import SortedStringTable
+
+WordNetEntry = collections.namedtuple('WordNetEntry', ['synset', 'hypernym', 'hyponym', 'meronym', 'holonym', 'lemma'])
+
+
+class WordNetCache:
+
+    wordnetTags = [None, NOUN, VERB, ADJ, ADV]
+
+    def __init__(self, maxSize=200000, tableFileName=None):
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.tableHits = 0
+        self.table = None
+        self.lemmatizer = WordNetLemmatizer()
+        if tableFileName is not None and os.path.exists(tableFileName):
+            self.openTable(tableFileName)
+
+    def __getstate__(self):
+        # Locks and memory maps cannot be pickled; process-pool workers get an
+        # empty cache that reopens the same table
+        return {'maxSize': self.maxSize, 'tableFileName': self.table.fileName if self.table is not None else None}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxSize'], state['tableFileName'])
+
+    def openTable(self, tableFileName):
+        if self.table is not None:
+            self.table.close()
+        self.table = SortedStringTable(tableFileName)
+
+    def lookup(self, word, wnTag=None):
+        key = (word, wnTag)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self.lookupTable(word, wnTag)
+        if entry is None:
+            entry = self.lookupWordNet(word, wnTag)
+        with self.lock:
+            self.entries[key] = entry
+            if len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+        return entry
+
+    def lookupTable(self, word, wnTag):
+        if self.table is None:
+            return None
+        value = self.table.get(self.getTableKey(word, wnTag))
+        if value is None:
+            return None
+        fields = value.decode('utf-8').split('\t')
+        # Tables written before lemmas were stored are read as misses
+        if len(fields) != len(WordNetEntry._fields):
+            return None
+        self.tableHits += 1
+        return WordNetEntry(*[field if len(field) > 0 else None for field in fields])
+
+    def lookupWordNet(self, word, wnTag):
+        # No tag lemmatizes as a noun, like WordNetLemmatizer.lemmatize(word)
+        lemma = self.lemmatizer.lemmatize(word, pos=wnTag if wnTag is not None else NOUN)
+        synset = wn.synsets(word, pos=wnTag)
+        if len(synset) == 0:
+            return WordNetEntry(None, None, None, None, None, lemma)
+        return WordNetEntry(self.firstName(synset),
+                            self.firstName(synset[0].hypernyms()),
+                            self.firstName(synset[0].hyponyms()),
+                            self.firstName(synset[0].part_meronyms()),
+                            self.firstName(synset[0].part_holonyms()),
+                            lemma)
+
+    def lemmatize(self, word, wnTag=None):
+        # Served from the cache or the table; live WordNet only on a miss
+        lemma = self.lookup(word, wnTag).lemma
+        return lemma if lemma is not None else word
+
+    def firstName(self, synsets):
+        if len(synsets) > 0:
+            return synsets[0].name().split('.')[0]
+        return None
+
+    def getTableKey(self, word, wnTag):
+        return word + '\t' + (wnTag if wnTag is not None else '')
+
+    def buildTable(self, words, tableFileName):
+        print("Building WordNet table...")
+        items = []
+        for word in set(words):
+            for wnTag in self.wordnetTags:
+                entry = self.lookupWordNet(word, wnTag)
+                value = '\t'.join(field if field is not None else '' for field in entry)
+                items.append((self.getTableKey(word, wnTag), value.encode('utf-8')))
+        SortedStringTable.write(tableFileName, items)
+        self.openTable(tableFileName)
+        return tableFileName
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.tableHits = 0
+
+    def takeCounters(self):
+        with self.lock:
+            counters = {'hits': self.hits, 'misses': self.misses, 'tableHits': self.tableHits}
+            self.hits = 0
+            self.misses = 0
+            self.tableHits = 0
+        return counters
+
+    def mergeCounters(self, counters):
+        with self.lock:
+            self.hits += counters['hits']
+            self.misses += counters['misses']
+            self.tableHits += counters['tableHits']
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'tableHits': self.tableHits,
+                'size': len(self.entries),
+                'hitRate': self.hits / lookups if lookups > 0 else 0.0}
+
+    def printStats(self):
+        stats = self.getStats()
+        print("WordNet cache: hits", str(stats['hits']), "misses", str(stats['misses']),
+              "table hits", str(stats['tableHits']), "size", str(stats['size']),
+              "hit rate %.2f%%" % (100 * stats['hitRate']))
@@ -0,0 +1,48 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import contextlib
+import threading
+
+
+class StubServer(ThreadingHTTPServer):
+
+    # Threaded HTTP server on a free local port, serving in the background
+    # until stop(). Handlers wrap each request in trackRequest, so tests can
+    # check how many requests a client had in flight at once
+    def __init__(self, handlerClass):
+        super().__init__(('127.0.0.1', 0), handlerClass)
+        self.lock = threading.Lock()
+        self.inFlight = 0
+        self.maxInFlight = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def getUrl(self, path=''):
+        return 'http://127.0.0.1:' + str(self.server_address[1]) + path
+
+    @contextlib.contextmanager
+    def trackRequest(self):
+        with self.lock:
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def sendBody(self, status, contentType, body):
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pkg.BuildCheckpoint import BuildCheckpoint
+from pkg.HeadWordParser import HeuristicHeadWordParser
+from pkg.IndexCreation import IndexCreation
+from pkg.NLPResources import NLPResources
+
+
+class BuildCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.computed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def createCheckpoint(self):
+        return BuildCheckpoint(os.path.join(self.directory, 'Checkpoints'))
+
+    def createShards(self, sentences):
+        # Shards of two sentences, ids A1S1, A1S2...
+        items = [('A1S' + str(i + 1), sentence) for i, sentence in enumerate(sentences)]
+        return [items[start:start + 2] for start in range(0, len(items), 2)]
+
+    def runBuild(self, buildCheckpoint, shards, version='1', failAt=None):
+        stageKey = buildCheckpoint.getStageKey('words', version)
+        values = []
+        for shard in shards:
+            ids = [sentenceId for sentenceId, _ in shard]
+            sentences = [sentence for _, sentence in shard]
+
+            def compute():
+                if ids[0] == failAt:
+                    raise RuntimeError("Parser went away")
+                self.computed.append(ids[0])
+                return [sentence.split() for sentence in sentences]
+
+            values.extend(buildCheckpoint.run(stageKey, buildCheckpoint.getShardKey(ids, sentences), 'words', ids, compute))
+        return values
+
+    def listFiles(self):
+        files = []
+        for root, _, fileNames in os.walk(os.path.join(self.directory, 'Checkpoints')):
+            files.extend(os.path.relpath(os.path.join(root, fileName), self.directory) for fileName in fileNames)
+        return sorted(files)
+
+    def testResume(self):
+        shards = self.createShards(['a b c', 'c b', 'a', 'b', 'a c'])
+        with self.assertRaises(RuntimeError):
+            self.runBuild(self.createCheckpoint(), shards, failAt='A1S3')
+        self.assertEqual(self.computed, ['A1S1'])
+        # The rerun picks up the finished shard and computes the rest
+        buildCheckpoint = self.createCheckpoint()
+        self.assertEqual(self.runBuild(buildCheckpoint, shards), [['a', 'b', 'c'], ['c', 'b'], ['a'], ['b'], ['a', 'c']])
+        self.assertEqual(self.computed, ['A1S1', 'A1S3', 'A1S5'])
+        self.assertEqual(buildCheckpoint.getStats()['hits'], 1)
+        self.assertEqual(buildCheckpoint.getStats()['misses'], 2)
+
+    def testInvalidationWhenInputsChange(self):
+        self.runBuild(self.createCheckpoint(), self.createShards(['a b', 'b', 'c', 'a c']))
+        before = self.listFiles()
+        self.assertEqual(len(before), 4)
+        # The second shard's text changes and a shard is added
+        self.computed = []
+        buildCheckpoint = self.createCheckpoint()
+        self.assertEqual(self.runBuild(buildCheckpoint, self.createShards(['a b', 'b', 'c', 'a b c', 'b'])), [['a', 'b'], ['b'], ['c'], ['a', 'b', 'c'], ['b']])
+        self.assertEqual(self.computed, ['A1S3', 'A1S5'])
+        self.assertEqual(len(self.listFiles()), 8)
+        # Pruning drops the old second shard only
+        self.assertEqual(buildCheckpoint.prune(), 2)
+        after = self.listFiles()
+        self.assertEqual(len(after), 6)
+        self.assertEqual(len(set(before) & set(after)), 2)
+        self.computed = []
+        self.runBuild(self.createCheckpoint(), self.createShards(['a b', 'b', 'c', 'a b c', 'b']))
+        self.assertEqual(self.computed, [])
+
+    def testInvalidationWhenVersionChanges(self):
+        shards = self.createShards(['a', 'b'])
+        self.runBuild(self.createCheckpoint(), shards)
+        # Another stage, not run by the next build, and an interrupted save
+        otherCheckpoint = self.createCheckpoint()
+        otherCheckpoint.run(otherCheckpoint.getStageKey('stems', '1'), 'shard', 'stems', ['A1S1'], lambda: [['a']])
+        stageDirectory = os.path.join(self.directory, 'Checkpoints', otherCheckpoint.getStageKey('words', '2'))
+        os.makedirs(stageDirectory)
+        open(os.path.join(stageDirectory, 'shard.features.tmp'), 'w').close()
+        buildCheckpoint = self.createCheckpoint()
+        self.runBuild(buildCheckpoint, shards, version='2')
+        self.assertEqual(self.computed, ['A1S1', 'A1S1'])
+        self.assertEqual(buildCheckpoint.prune(), 3)
+        stageKeys = sorted(os.listdir(os.path.join(self.directory, 'Checkpoints')))
+        self.assertEqual(stageKeys, sorted([buildCheckpoint.getStageKey('words', '2'), buildCheckpoint.getStageKey('stems', '1')]))
+        self.assertEqual(len(self.listFiles()), 4)
+
+    def testStageKeysFollowDependencies(self):
+        indexCreation = IndexCreation(resources=NLPResources(headWordParser=HeuristicHeadWordParser(), buildCheckpoint=self.createCheckpoint()))
+        before = {stage: indexCreation.getStageKey(stage) for stage in IndexCreation.featureVersions}
+        indexCreation.featureVersions = dict(IndexCreation.featureVersions, POSWithWords=2)
+        changed = sorted(stage for stage in before if indexCreation.getStageKey(stage) != before[stage])
+        self.assertEqual(changed, ['POSWithWords', 'improvisedHolonyms', 'improvisedHypernyms', 'improvisedHyponyms', 'improvisedLemmas', 'improvisedMeronyms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pkg.CompressedIndex import CompressedIndex
+from pkg.InvertedIndex import InvertedIndex
+
+
+class CompressedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.indexes = []
+
+    def tearDown(self):
+        for index in self.indexes:
+            index.close()
+        shutil.rmtree(self.directory)
+
+    def writeIndex(self, records, indexSentenceMap):
+        fileName = CompressedIndex.write(os.path.join(self.directory, 'Task4.idx'), records, indexSentenceMap)
+        index = CompressedIndex(fileName)
+        self.indexes.append(index)
+        return index
+
+    def createRecords(self, count):
+        # Rare terms far apart and a term repeated past 127 times, so doc gaps
+        # and term counts need more than one varint byte
+        records = []
+        for i in range(count):
+            words = ['common', 'word' + str(i % 7)]
+            if i % 150 == 0:
+                words.append('rare')
+            if i == 200:
+                words.extend(['repeated'] * 130)
+            records.append({'id': 'A' + str(i // 10 + 1) + 'S' + str(i % 10 + 1), 'words': words, 'head': ['word' + str(i % 3)]})
+        return records
+
+    def testVarintRoundTrip(self):
+        values = [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 21 + 5, 2 ** 31 - 1, 2 ** 40]
+        encoded = CompressedIndex.encodeVarints(values)
+        self.assertEqual(len(encoded), 1 + 1 + 1 + 2 + 2 + 2 + 2 + 3 + 4 + 5 + 6)
+        self.assertEqual(list(CompressedIndex.decodeVarints(bytes(encoded), 0, len(encoded), len(values))), values)
+        # Decoded in place from the middle of a larger buffer
+        buffer = b'\xff\xff' + bytes(encoded) + bytes(CompressedIndex.encodeVarints([5, 6]))
+        self.assertEqual(list(CompressedIndex.decodeVarints(buffer, 2, 2 + len(encoded), len(values))), values)
+        self.assertEqual(list(CompressedIndex.decodeVarints(buffer, 2 + len(encoded), len(buffer), 2)), [5, 6])
+
+    def testEmptyIndex(self):
+        index = self.writeIndex([], {})
+        self.assertEqual(index.getDocumentCount(), 0)
+        self.assertEqual(index.search([('words', ['common'], None)]), [])
+        self.assertIsNone(index.getSentence('A1S1'))
+        self.assertEqual(index.loadPostings().search([('words', ['common'], None)]), [])
+
+    def testSentences(self):
+        records = self.createRecords(30)
+        index = self.writeIndex(records, {record['id']: 'Sentence ' + record['id'] + ' £' for record in records})
+        self.assertEqual(index.getDocId(12), 'A2S3')
+        self.assertEqual(index.getSentence('A3S10'), 'Sentence A3S10 £')
+        self.assertEqual(index.getSentence('A9S1', 'missing'), 'missing')
+
+    def testSearchParity(self):
+        records = self.createRecords(400)
+        inMemory = InvertedIndex().build(records)
+        mapped = self.writeIndex(records, {})
+        loaded = CompressedIndex(mapped.fileName).loadPostings()
+        self.indexes.append(loaded)
+        queries = [[('words', ['rare'], None)],
+                   [('words', ['repeated', 'rare'], 3.0), ('head', ['word1'], None)],
+                   [('words', ['common', 'word3'], None), ('head', ['word2'], 7.0)],
+                   [('words', ['unknown'], None), ('lemmas', ['rare'], None)]]
+        for clauses in queries:
+            expected = inMemory.search(clauses)
+            for index in [mapped, loaded]:
+                results = index.search(clauses)
+                self.assertEqual([docId for docId, _ in results], [docId for docId, _ in expected])
+                for (_, score), (_, expectedScore) in zip(results, expected):
+                    self.assertAlmostEqual(score, expectedScore, places=4)
+        self.assertEqual([docId for docId, _ in mapped.search(queries[0])], ['A1S1', 'A16S1', 'A31S1'])
+        self.assertEqual(mapped.search(queries[1])[0][0], 'A21S1')
+
+
+if __name__ == '__main__':
+    unittest.main()
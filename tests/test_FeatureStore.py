@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pkg.FeatureStore import FeatureStore
+
+
+class FeatureStoreTest(unittest.TestCase):
+
+    columns = ['id', 'words', 'POSWithWords', 'head']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'Task4.features')
+        self.stores = []
+
+    def tearDown(self):
+        for featureStore in self.stores:
+            featureStore.close()
+        shutil.rmtree(self.directory)
+
+    def openStore(self):
+        featureStore = FeatureStore(self.fileName)
+        self.stores.append(featureStore)
+        return featureStore
+
+    def createRecord(self, sentenceId, *words):
+        # A list, a pairs and a value column; the head is None without words
+        return (sentenceId, list(words), [(word, 'NN') for word in words], words[0] if len(words) > 0 else None)
+
+    def readIds(self):
+        return [record[0] for record in self.openStore().iterRecords()]
+
+    def testWriteAndRead(self):
+        records = [self.createRecord('A1S' + str(i + 1), 'word' + str(i), 'shared', 'énd') for i in range(5)] + [self.createRecord('A2S1')]
+        self.openStore().write(records, self.columns, chunkSize=2)
+        featureStore = self.openStore()
+        self.assertEqual(len(featureStore.getMetadata()['chunks']), 3)
+        self.assertEqual(list(featureStore.iterRecords()), records)
+
+    def testEmptyStore(self):
+        self.openStore().write([], self.columns)
+        featureStore = self.openStore()
+        self.assertEqual(featureStore.getColumns(), self.columns)
+        self.assertEqual(list(featureStore.iterRecords()), [])
+
+    def testAppend(self):
+        self.openStore().write([self.createRecord('A1S1', 'one'), self.createRecord('A1S2', 'two')], self.columns)
+        self.openStore().append([self.createRecord('A2S1', 'three')])
+        self.assertEqual(list(self.openStore().iterRecords()),
+                         [self.createRecord('A1S1', 'one'), self.createRecord('A1S2', 'two'), self.createRecord('A2S1', 'three')])
+
+    def testAppendWhileOpen(self):
+        # A reader holding the mapping sees rows appended through it
+        featureStore = self.openStore().write([self.createRecord('A1S1', 'one')], self.columns)
+        self.assertEqual(len(list(featureStore.iterRecords())), 1)
+        featureStore.append([self.createRecord('A1S2', 'two')])
+        self.assertEqual(list(featureStore.iterRecords())[-1], self.createRecord('A1S2', 'two'))
+
+    def testSupersede(self):
+        self.openStore().write([self.createRecord('A1S1', 'one'), self.createRecord('A1S2', 'two'), self.createRecord('A2S1', 'three')],
+                               self.columns, chunkSize=2)
+        # A later chunk with the same id replaces the row, which moves to the end
+        self.openStore().append([self.createRecord('A1S2', 'changed')])
+        records = list(self.openStore().iterRecords())
+        self.assertEqual([record[0] for record in records], ['A1S1', 'A2S1', 'A1S2'])
+        self.assertEqual(records[-1], self.createRecord('A1S2', 'changed'))
+
+    def testDelete(self):
+        self.openStore().write([self.createRecord('A1S1', 'one'), self.createRecord('A1S2', 'two'), self.createRecord('A2S1', 'three')], self.columns)
+        # Deletions alone are carried by an empty chunk
+        self.openStore().append([], deletedIds=['A1S2', 'A9S9'])
+        self.assertEqual(len(self.openStore().getMetadata()['chunks']), 2)
+        self.assertEqual(self.readIds(), ['A1S1', 'A2S1'])
+        # Deleted ids only hide earlier chunks, so an article can be removed
+        # and re-added in one append
+        self.openStore().append([self.createRecord('A2S1', 'new'), self.createRecord('A2S2', 'new')], deletedIds=['A2S1', 'A2S2', 'A2S3'])
+        self.assertEqual(self.readIds(), ['A1S1', 'A2S1', 'A2S2'])
+        self.openStore().append([], deletedIds=['A1S1', 'A2S1', 'A2S2'])
+        self.assertEqual(self.readIds(), [])
+
+    def testColumns(self):
+        self.openStore().write([self.createRecord('A1S1', 'one', 'two'), self.createRecord('A1S2')], self.columns)
+        featureStore = self.openStore()
+        self.assertEqual(list(featureStore.iterRecords(['head'])), [('A1S1', 'one'), ('A1S2', None)])
+        self.assertEqual(list(featureStore.iterRecords(['POSWithWords', 'words'])),
+                         [('A1S1', [('one', 'NN'), ('two', 'NN')], ['one', 'two']), ('A1S2', [], [])])
+        # 'id' may be asked for too, and is always first
+        self.assertEqual(list(featureStore.iterRecordDicts(['words', 'id'])), [{'id': 'A1S1', 'words': ['one', 'two']}, {'id': 'A1S2', 'words': []}])
+        self.assertEqual(list(featureStore.iterRecordDicts())[0], dict(zip(self.columns, self.createRecord('A1S1', 'one', 'two'))))
+
+    def testRewriteReplacesStore(self):
+        featureStore = self.openStore().write([self.createRecord('A1S1', 'one')], self.columns)
+        featureStore.write([self.createRecord('A3S1', 'three')], ['id', 'words'])
+        self.assertEqual(list(self.openStore().iterRecords()), [('A3S1', ['three'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
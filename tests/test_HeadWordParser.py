@@ -0,0 +1,111 @@
+import json
+import time
+import unittest
+
+import requests
+
+from pkg.HeadWordParser import CoreNLPHeadWordParser
+from tests.stubServer import StubHandler, StubServer
+
+
+class StubCoreNLPServer(StubServer):
+
+    # Answers every POST like a CoreNLP server running depparse with
+    # ssplit.eolonly: one sentence per line, rooted at its first word
+    def __init__(self):
+        super().__init__(StubCoreNLPHandler)
+        self.requests = []
+        self.failures = 0
+        self.dropSentences = 0
+        self.delay = None
+
+
+class StubCoreNLPHandler(StubHandler):
+
+    def do_POST(self):
+        server = self.server
+        lines = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8').split('\n')
+        with server.trackRequest():
+            with server.lock:
+                server.requests.append(lines)
+                failing = server.failures > 0
+                if failing:
+                    server.failures -= 1
+            if server.delay is not None:
+                time.sleep(server.delay(lines))
+            if failing:
+                self.send_error(503)
+                return
+            sentences = [self.parseLine(line) for line in lines]
+            body = json.dumps({'sentences': sentences[:len(sentences) - server.dropSentences]}).encode('utf-8')
+            self.sendBody(200, 'application/json', body)
+
+    def parseLine(self, line):
+        words = line.split()
+        tokens = [{'index': i + 1, 'word': word, 'lemma': word, 'pos': 'NN'} for i, word in enumerate(words)]
+        dependencies = [{'dep': 'ROOT', 'governor': 0, 'dependent': 1}]
+        dependencies += [{'dep': 'dep', 'governor': 1, 'dependent': i + 1} for i in range(1, len(words))]
+        return {'tokens': tokens, 'basicDependencies': dependencies}
+
+
+class CoreNLPHeadWordParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubCoreNLPServer()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def createParser(self, **kwargs):
+        return CoreNLPHeadWordParser(url=self.server.getUrl(), **kwargs)
+
+    def createSentences(self, count):
+        return ['head' + str(i) + ' of sentence ' + str(i) for i in range(count)]
+
+    def testBatching(self):
+        sentences = self.createSentences(23)
+        headWords = self.createParser(batchSize=5, maxInFlight=1).findHeadWords(sentences)
+        self.assertEqual(headWords, ['head' + str(i) for i in range(23)])
+        # ceil(23 / 5) requests, each one sentence per line
+        self.assertEqual([len(lines) for lines in self.server.requests], [5, 5, 5, 5, 3])
+
+    def testOrderWithRequestsInFlight(self):
+        # Earlier batches answer last, so responses arrive out of order
+        self.server.delay = lambda lines: 0.2 / (1 + int(lines[0].split()[0][len('head'):]))
+        sentences = self.createSentences(40)
+        headWords = self.createParser(batchSize=4, maxInFlight=3).findHeadWords(sentences)
+        self.assertEqual(headWords, ['head' + str(i) for i in range(40)])
+        self.assertEqual(len(self.server.requests), 10)
+        self.assertLessEqual(self.server.maxInFlight, 3)
+        self.assertGreater(self.server.maxInFlight, 1)
+
+    def testEmptySentencesAreNotSent(self):
+        headWords = self.createParser(batchSize=10).findHeadWords(['first one', '  \n ', '\n\nsecond one\nthird'])
+        self.assertEqual(headWords, ['first', None, 'second'])
+        self.assertEqual(self.server.requests, [['first one', 'second one']])
+
+    def testRetryWithBackoff(self):
+        self.server.failures = 2
+        start = time.monotonic()
+        headWords = self.createParser(batchSize=10, retries=3, backoff=0.1).findHeadWords(self.createSentences(3))
+        self.assertEqual(headWords, ['head0', 'head1', 'head2'])
+        self.assertEqual(len(self.server.requests), 3)
+        # Waits backoff, then twice backoff, before the third attempt
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    def testRetriesExhausted(self):
+        self.server.failures = 3
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.createParser(batchSize=10, retries=2, backoff=0.01).findHeadWords(self.createSentences(3))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def testParseCountMismatch(self):
+        self.server.dropSentences = 1
+        with self.assertRaisesRegex(ValueError, "CoreNLP returned 2 parses for 3 sentences"):
+            self.createParser(batchSize=10, retries=1, backoff=0.01).findHeadWords(self.createSentences(3))
+        # A mismatch is retried like a failed request
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
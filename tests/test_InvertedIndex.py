@@ -0,0 +1,74 @@
+import math
+import unittest
+
+from pkg.InvertedIndex import InvertedIndex
+
+
+class InvertedIndexTest(unittest.TestCase):
+
+    records = [{'id': 'A1S1', 'words': ['Cat', 'dog'], 'lemmas': ['cat', 'dog']},
+               {'id': 'A1S2', 'words': ['cat'], 'lemmas': ['cat']},
+               {'id': 'A2S1', 'words': ['bird', 'fish', 'bird'], 'lemmas': ['bird', 'fish', 'bird']},
+               {'id': 'A2S2', 'words': ['dog', 'dog', 'fish', 'cow'], 'lemmas': ['dog', 'dog', 'fish', 'cow']}]
+
+    def createIndexes(self):
+        # Every term kept as a posting list, and every term as a dense row
+        return [InvertedIndex(denseFraction=1.0).build(self.records), InvertedIndex(denseFraction=0.0).build(self.records)]
+
+    def bm25(self, term, field, docNumber, k1=1.2, b=0.75):
+        # Okapi BM25 as Lucene computes it, straight from the records
+        fieldTerms = [[word.lower() for word in record[field]] for record in self.records]
+        documentFrequency = sum(1 for terms in fieldTerms if term in terms)
+        idf = math.log(1 + (len(fieldTerms) - documentFrequency + 0.5) / (documentFrequency + 0.5))
+        averageLength = sum(len(terms) for terms in fieldTerms) / len(fieldTerms)
+        termFrequency = fieldTerms[docNumber].count(term)
+        length = len(fieldTerms[docNumber])
+        return idf * termFrequency * (k1 + 1) / (termFrequency + k1 * (1 - b + b * length / averageLength))
+
+    def assertResults(self, results, expected):
+        self.assertEqual([docId for docId, _ in results], [docId for docId, _ in expected])
+        for (_, score), (_, expectedScore) in zip(results, expected):
+            self.assertAlmostEqual(score, expectedScore, places=5)
+
+    def testSingleTerm(self):
+        # idf ln(1 + 2.5 / 2.5) for 'dog'; the shorter sentence and the one
+        # repeating the term rank first
+        expected = sorted([(self.records[doc]['id'], self.bm25('dog', 'words', doc)) for doc in [0, 3]], key=lambda result: -result[1])
+        self.assertEqual(expected[0][0], 'A2S2')
+        self.assertAlmostEqual(self.bm25('dog', 'words', 0), math.log(2) * 2.2 / (1 + 1.2 * (0.25 + 0.75 * 2 / 2.5)))
+        for index in self.createIndexes():
+            self.assertResults(index.search([('words', ['dog'], None)]), expected)
+
+    def testBoostedFieldsAndRepeatedTerms(self):
+        clauses = [('words', ['cat', 'fish'], None), ('lemmas', ['cat'], 10.0), ('lemmas', ['CAT'], 2.0)]
+        scores = {}
+        for doc, record in enumerate(self.records):
+            score = self.bm25('cat', 'words', doc) + self.bm25('fish', 'words', doc) + 12.0 * self.bm25('cat', 'lemmas', doc)
+            if score > 0:
+                scores[record['id']] = score
+        expected = sorted(scores.items(), key=lambda result: -result[1])
+        self.assertEqual([docId for docId, _ in expected], ['A1S2', 'A1S1', 'A2S1', 'A2S2'])
+        for index in self.createIndexes():
+            self.assertResults(index.search(clauses), expected)
+
+    def testRowsAndTies(self):
+        for index in self.createIndexes():
+            # A2S1 and A2S2 both hold 'fish' once but A2S1 is shorter
+            self.assertEqual([docId for docId, _ in index.search([('words', ['fish'], None)], rows=1)], ['A2S1'])
+        # Equal scores are ordered by document number
+        records = [{'id': 'A' + str(i + 1) + 'S1', 'words': ['cat'] if i % 2 == 0 else ['dog']} for i in range(6)]
+        for index in [InvertedIndex(denseFraction=1.0).build(records), InvertedIndex(denseFraction=0.0).build(records)]:
+            results = index.search([('words', ['cat'], None)])
+            self.assertEqual([docId for docId, _ in results], ['A1S1', 'A3S1', 'A5S1'])
+            self.assertEqual(len(set(score for _, score in results)), 1)
+            # Including at the rows cut-off
+            self.assertEqual([docId for docId, _ in index.search([('words', ['cat'], None)], rows=2)], ['A1S1', 'A3S1'])
+
+    def testNoMatches(self):
+        for index in self.createIndexes():
+            self.assertEqual(index.search([('words', ['unicorn'], None), ('head', ['cat'], 5.0)]), [])
+            self.assertEqual(index.search([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
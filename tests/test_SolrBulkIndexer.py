@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+import pysolr
+
+from pkg.FeatureStore import FeatureStore
+from pkg.HeadWordParser import HeuristicHeadWordParser
+from pkg.IndexCreation import IndexCreation
+from pkg.IndexVersion import IndexVersion
+from pkg.NLPResources import NLPResources
+from pkg.SolrBulkIndexer import SolrBulkIndexer
+from tests.stubServer import StubHandler, StubServer
+
+
+class StubSolrServer(StubServer):
+
+    # Records every message posted to <core>/update: ('add', ids),
+    # ('delete', query) or ('commit', None). Adds holding a document with
+    # an id in failIds are answered with a 500
+    def __init__(self):
+        super().__init__(StubSolrHandler)
+        self.messages = []
+        self.failIds = set()
+        self.delay = 0.0
+
+    def getUrl(self, core='task4'):
+        return StubServer.getUrl(self, '/solr/' + core)
+
+    def getMessages(self, kind):
+        return [value for messageKind, value in self.messages if messageKind == kind]
+
+
+class StubSolrHandler(StubHandler):
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.trackRequest():
+            time.sleep(server.delay)
+            # pysolr posts documents as a JSON list and deletes and commits as XML
+            if self.headers['Content-Type'].startswith('application/json'):
+                ids = [document['id'] for document in json.loads(body)]
+                if len(server.failIds.intersection(ids)) > 0:
+                    self.sendResponse(500)
+                    return
+                entries = [('add', ids)]
+            else:
+                message = ElementTree.fromstring(body)
+                if message.tag == 'delete':
+                    entries = [('delete', message.find('query').text)]
+                else:
+                    entries = [(message.tag, None)]
+            if 'commit=true' in self.path and entries[-1][0] != 'commit':
+                entries.append(('commit', None))
+            with server.lock:
+                server.messages.extend(entries)
+            self.sendResponse(200)
+
+    def sendResponse(self, status):
+        body = b'<response><lst name="responseHeader"><int name="status">' + (b'0' if status == 200 else b'1') + b'</int></lst></response>'
+        self.sendBody(status, 'application/xml', body)
+
+
+class SolrBulkIndexerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSolrServer()
+        self.directory = tempfile.mkdtemp()
+        self.indexVersion = IndexVersion(os.path.join(self.directory, 'IndexVersion.json'))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def createIndexer(self, **kwargs):
+        return SolrBulkIndexer(self.server.getUrl(), indexVersion=self.indexVersion, **kwargs)
+
+    def writeRecords(self, count):
+        jsonFileName = os.path.join(self.directory, 'Task4.jsonl')
+        with open(jsonFileName, 'w') as jsonFile:
+            for i in range(count):
+                jsonFile.write(json.dumps({'id': 'A' + str(i + 1) + 'S1', 'words': ['word' + str(i)]}) + '\n')
+            # Blank lines are skipped
+            jsonFile.write('\n')
+        return jsonFileName
+
+    def getIds(self, count):
+        return ['A' + str(i + 1) + 'S1' for i in range(count)]
+
+    def testBatchSizes(self):
+        documents = self.createIndexer(batchSize=10).index(self.writeRecords(25))
+        self.assertEqual(documents, 25)
+        adds = self.server.getMessages('add')
+        self.assertEqual([len(ids) for ids in adds], [10, 10, 5])
+        self.assertEqual(sum(adds, []), self.getIds(25))
+
+    def testDeleteAllThenOneCommit(self):
+        self.createIndexer(batchSize=10).index(self.writeRecords(25))
+        kinds = [kind for kind, _ in self.server.messages]
+        self.assertEqual(kinds, ['delete', 'add', 'add', 'add', 'commit'])
+        self.assertEqual(self.server.getMessages('delete'), ['*:*'])
+        self.assertIsNotNone(self.indexVersion.get('task4'))
+
+    def testKeepExistingDocuments(self):
+        self.createIndexer(batchSize=10).index(self.writeRecords(5), deleteAll=False)
+        self.assertEqual([kind for kind, _ in self.server.messages], ['add', 'commit'])
+
+    def testParallelBatches(self):
+        self.server.delay = 0.05
+        indexer = self.createIndexer(batchSize=3, workers=2)
+        documents = indexer.index(self.writeRecords(40))
+        self.assertEqual(documents, 40)
+        adds = self.server.getMessages('add')
+        self.assertEqual(len(adds), 14)
+        self.assertEqual(sorted(sum(adds, [])), sorted(self.getIds(40)))
+        self.assertEqual(self.server.maxInFlight, 2)
+        # The only commit comes after every batch
+        self.assertEqual([kind for kind, _ in self.server.messages].count('commit'), 1)
+        self.assertEqual(self.server.messages[-1], ('commit', None))
+
+    def testPendingBatchesAreBounded(self):
+        self.server.delay = 0.02
+        indexer = self.createIndexer(batchSize=1, workers=2)
+        pending = []
+
+        def iterBatches():
+            for i in range(30):
+                # Batches taken from the iterator but not yet stored by Solr
+                pending.append(i + 1 - len(self.server.getMessages('add')))
+                yield [{'id': 'A' + str(i + 1) + 'S1'}]
+
+        self.assertEqual(indexer.postBatches(iterBatches()), 30)
+        self.assertLessEqual(max(pending), 2 * 2 + 1)
+
+    def testReadsCurrentFeatureStore(self):
+        jsonFileName = self.writeRecords(5)
+        featureStore = FeatureStore(os.path.join(self.directory, 'Task4.features'))
+        featureStore.write([('A' + str(i + 1) + 'S2', ['stored' + str(i)]) for i in range(7)], ['id', 'words'])
+        featureStore.close()
+        records = list(self.createIndexer().iterRecords(jsonFileName))
+        self.assertEqual(records[0], {'id': 'A1S2', 'words': ['stored0']})
+        self.assertEqual(len(records), 7)
+        # A JSON file written after the store is read instead
+        modified = featureStore.getModifiedTime() + 10
+        os.utime(jsonFileName, (modified, modified))
+        self.assertEqual([record['id'] for record in self.createIndexer().iterRecords(jsonFileName)], self.getIds(5))
+
+    def testIndexCreationUsesBulkIndexer(self):
+        # A Task<n>.json array, as written by extractFeatures
+        jsonFileName = os.path.join(self.directory, 'Task3.json')
+        with open(jsonFileName, 'w') as jsonFile:
+            json.dump([{'id': 'A' + str(i + 1) + 'S1', 'words': ['word' + str(i)]} for i in range(5)], jsonFile)
+        resources = NLPResources(headWordParser=HeuristicHeadWordParser(), solrUrl=self.server.getUrl(''), indexVersion=self.indexVersion)
+        documents = IndexCreation(resources=resources).indexFeaturesWithSolr(jsonFileName, "2", batchSize=2)
+        self.assertEqual(documents, 5)
+        self.assertEqual([kind for kind, _ in self.server.messages], ['delete', 'add', 'add', 'add', 'commit'])
+        self.assertEqual(sorted(sum(self.server.getMessages('add'), [])), self.getIds(5))
+        self.assertIsNotNone(self.indexVersion.get('task3'))
+
+    def testFailingBatch(self):
+        self.server.failIds = {'A12S1'}
+        for workers in [1, 3]:
+            self.server.messages = []
+            with self.assertRaises(pysolr.SolrError):
+                self.createIndexer(batchSize=5, workers=workers).index(self.writeRecords(30))
+            # Nothing is committed, so searches keep the previous index
+            self.assertNotIn('commit', [kind for kind, _ in self.server.messages])
+        self.assertIsNone(self.indexVersion.get('task4'))
+
+
+if __name__ == '__main__':
+    unittest.main()